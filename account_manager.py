@@ -1,11 +1,39 @@
 """
 Account management utility to save and load accounts from config file
 """
+import functools
 import json
 import os
+import threading
 from typing import List, Dict, Optional
+from metrics import ACCOUNT_STORE_DURATION
 
+# Email requests are processed in parallel, so read-modify-write updates of
+# accounts_config.json have to be serialized
+_accounts_lock = threading.RLock()
 
+
+def _with_accounts_lock(func):
+    """Run func while holding the accounts file lock"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _accounts_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _timed_store(operation):
+    """Record how long func takes in the account store metrics ('read' or 'write')"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with ACCOUNT_STORE_DURATION.time(operation=operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@_timed_store('read')
 def load_accounts() -> List[Dict]:
     """Load accounts from config file"""
     config_file = os.path.join(os.path.dirname(__file__), 'accounts_config.json')
@@ -22,6 +50,7 @@ def load_accounts() -> List[Dict]:
         return []
 
 
+@_timed_store('read')
 def load_archived_accounts() -> List[Dict]:
     """Load archived accounts from config file"""
     config_file = os.path.join(os.path.dirname(__file__), 'accounts_config.json')
@@ -38,6 +67,8 @@ def load_archived_accounts() -> List[Dict]:
         return []
 
 
+@_with_accounts_lock
+@_timed_store('write')
 def save_accounts(accounts: List[Dict], archived_accounts: List[Dict] = None) -> bool:
     """Save accounts to config file"""
     config_file = os.path.join(os.path.dirname(__file__), 'accounts_config.json')
@@ -70,6 +101,7 @@ def save_accounts(accounts: List[Dict], archived_accounts: List[Dict] = None) ->
         return False
 
 
+@_with_accounts_lock
 def archive_account(account: Dict, reason: str = None) -> bool:
     """Move an account to the archived list"""
     try:
@@ -94,6 +126,7 @@ def archive_account(account: Dict, reason: str = None) -> bool:
         return False
 
 
+@_with_accounts_lock
 def add_account(account_number: str = None, plate_number: str = None, email: Optional[str] = None,
                 violation_number: str = None, source: str = 'NY') -> bool:
     """
@@ -0,0 +1,209 @@
+"""
+Adaptive (AIMD) concurrency limit per toll site
+
+A fixed number of parallel lookups is either too timid while a site answers quickly or
+too aggressive once it starts throttling. Each site gets a limiter that lets `limit`
+lookups run at once and adjusts it from their results:
+
+    - Additive increase: after `limit` healthy lookups in a row the limit grows by
+      AIMD_INCREASE (up to AIMD_MAX_LIMIT)
+    - Multiplicative decrease: a site-caused failure (timeout, block, site error or
+      network error, see circuit_breaker.is_site_failure) or a latency spike multiplies
+      the limit by AIMD_DECREASE (down to AIMD_MIN_LIMIT). Local errors (no browser slot,
+      low memory) and a raised fetch leave it alone. Lookups that were already running
+      when the limit was cut don't cut it again
+
+A latency spike is a lookup slower than AIMD_LATENCY_SPIKE times (and at least a second
+over) the site's average for the same fetch method - HTTP and browser lookups have very
+different latencies.
+
+extract_toll_info and extract_toll_info_nj run inside their site's limiter, so every
+caller in a process (batch endpoint, email worker, auto_fetch) shares it. Time a lookup
+waits for a place counts towards its FETCH_DEADLINE (see fetch_supervisor). The current
+limit is exported as tolls_fetch_concurrency_limit{site}.
+
+Settings (environment):
+    AIMD_INITIAL_LIMIT   Starting limit (default: 1)
+    AIMD_MIN_LIMIT       Lowest limit (default: 1)
+    AIMD_MAX_LIMIT       Highest limit (default: BROWSER_CONCURRENCY x BROWSER_TABS)
+    AIMD_INCREASE        Added per healthy window (default: 1)
+    AIMD_DECREASE        Factor applied on trouble (default: 0.5)
+    AIMD_LATENCY_SPIKE   Latency multiple that counts as a spike (default: 2.0)
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from runtime_config import lookup_concurrency
+from circuit_breaker import is_site_failure, local_error_result
+from fetch_supervisor import FETCH_DEADLINE, DeadlineExceeded, deadline_counted_from
+from metrics import gauge
+
+load_dotenv()
+
+AIMD_INITIAL_LIMIT = float(os.getenv('AIMD_INITIAL_LIMIT', '1'))
+AIMD_MIN_LIMIT = float(os.getenv('AIMD_MIN_LIMIT', '1'))
+AIMD_MAX_LIMIT = float(os.getenv('AIMD_MAX_LIMIT', lookup_concurrency()))
+AIMD_INCREASE = float(os.getenv('AIMD_INCREASE', '1'))
+AIMD_DECREASE = float(os.getenv('AIMD_DECREASE', '0.5'))
+AIMD_LATENCY_SPIKE = float(os.getenv('AIMD_LATENCY_SPIKE', '2.0'))
+
+# Weight of the newest lookup in the average latency
+_LATENCY_WEIGHT = 0.2
+# A spike must also be at least this much slower than the average (ignores jitter on fast HTTP lookups)
+_MIN_SPIKE_SECONDS = 1.0
+
+
+class AIMDLimiter:
+    """Concurrency limit for one site, adjusted from lookup results"""
+
+    def __init__(self, site: str, initial: float = None, min_limit: float = None, max_limit: float = None,
+                 increase: float = None, decrease: float = None, latency_spike: float = None):
+        self.site = site
+        self.min_limit = min_limit if min_limit is not None else AIMD_MIN_LIMIT
+        self.max_limit = max(self.min_limit, max_limit if max_limit is not None else AIMD_MAX_LIMIT)
+        self.limit = min(self.max_limit, max(self.min_limit, initial if initial is not None else AIMD_INITIAL_LIMIT))
+        self.increase = increase if increase is not None else AIMD_INCREASE
+        self.decrease = decrease if decrease is not None else AIMD_DECREASE
+        self.latency_spike = latency_spike if latency_spike is not None else AIMD_LATENCY_SPIKE
+        self.in_flight = 0
+        self.average_latency = {}
+        self._healthy = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float = None) -> float:
+        """
+        Wait until a lookup may start
+
+        Args:
+            timeout: Seconds to wait (None = until a place frees up)
+
+        Returns:
+            The lookup's start time (pass it to release)
+
+        Raises:
+            DeadlineExceeded: If no place freed up within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineExceeded(f"No {self.site} lookup place freed up within {timeout:.0f}s "
+                                           f"(concurrency limit {int(self.limit)})")
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, result: Optional[Dict]):
+        """
+        Finish a lookup and adjust the limit from its result
+
+        Args:
+            started: Value returned by acquire()
+            result: Fetch result (None if the fetch raised)
+        """
+        latency = time.monotonic() - started
+        with self._condition:
+            self.in_flight -= 1
+            trouble = self._trouble(result, latency)
+            if trouble:
+                if started >= self._last_decrease:
+                    previous = self.limit
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_decrease = time.monotonic()
+                    self._healthy = 0
+                    print(f"📉 {self.site} concurrency {int(previous)} → {int(self.limit)} ({trouble})")
+            elif result and result.get('success'):
+                self._healthy += 1
+                if self._healthy >= int(self.limit) and self.limit < self.max_limit:
+                    previous = self.limit
+                    self.limit = min(self.max_limit, self.limit + self.increase)
+                    self._healthy = 0
+                    if int(self.limit) != int(previous):
+                        print(f"📈 {self.site} concurrency {int(previous)} → {int(self.limit)}")
+            self._condition.notify_all()
+
+    def _trouble(self, result: Optional[Dict], latency: float) -> Optional[str]:
+        """Reason to cut the limit, or None if the lookup was healthy or failed for local reasons"""
+        if is_site_failure(result):
+            return result.get('outcome') or 'network error'
+        if not result or not result.get('success'):
+            return None
+
+        method = result.get('fetch_method', 'browser')
+        average = self.average_latency.get(method)
+        self.average_latency[method] = latency if average is None else \
+            (1 - _LATENCY_WEIGHT) * average + _LATENCY_WEIGHT * latency
+        if average is not None and latency > average * self.latency_spike and latency - average >= _MIN_SPIKE_SECONDS:
+            return f"latency spike {latency:.1f}s vs {average:.1f}s average"
+        return None
+
+    @contextmanager
+    def slot(self):
+        """
+        Run one lookup inside the limit
+
+        Yields a dict; store the fetch result under 'result' so it can adjust the limit.
+        """
+        outcome = {'result': None}
+        started = self.acquire()
+        try:
+            yield outcome
+        finally:
+            self.release(started, outcome['result'])
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def site_limiter(site: str) -> AIMDLimiter:
+    """The process-wide limiter for a site"""
+    with _limiters_lock:
+        if site not in _limiters:
+            _limiters[site] = AIMDLimiter(site)
+        return _limiters[site]
+
+
+def limited_fetch(site: str, fetch) -> Dict:
+    """
+    Run a fetch (callable returning a result dictionary) inside the site's limiter
+
+    Time spent queued for a place counts towards the fetch's FETCH_DEADLINE; if no place
+    frees up before it, a `local_error` result is returned without fetching.
+    """
+    limiter = site_limiter(site)
+    queued = time.monotonic()
+    try:
+        started = limiter.acquire(FETCH_DEADLINE)
+    except DeadlineExceeded as e:
+        print(f"⏳ {e} - giving up")
+        return local_error_result(site, e)
+    result = None
+    try:
+        with deadline_counted_from(queued):
+            result = fetch()
+        return result
+    finally:
+        limiter.release(started, result)
+
+
+def current_limits() -> Dict[str, int]:
+    """Current concurrency limit per site"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.site: int(limiter.limit) for limiter in limiters}
+
+
+def total_limit(sites=('NY', 'NJ')) -> int:
+    """Largest number of lookups the limiters could allow at once (sizes worker pools)"""
+    return sum(int(site_limiter(site).max_limit) for site in sites)
+
+
+gauge('tolls_fetch_concurrency_limit', 'Adaptive concurrency limit per site', ('site',), func=current_limits)
+gauge('tolls_fetch_in_flight', 'Lookups running per site', ('site',),
+      func=lambda: {site: limiter.in_flight for site, limiter in list(_limiters.items())})
@@ -1,13 +1,19 @@
 """
 Flask backend for E-ZPass NY Toll Dashboard
 """
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
 from automation_selenium import extract_toll_info
 from automation_selenium_nj import extract_toll_info_nj
-from email_service import send_toll_info_email
+from email_service import get_smtp_connection
+from email_outbox import EMAIL_QUEUED, queue_toll_info_email
 from email_reader import EmailReader, check_emails_and_extract
 from account_manager import add_account
+from fetch_executor import process_requests
+from request_dedup import RequestDeduplicator
+from runtime_config import lookup_concurrency
+from metrics import render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from fetch_supervisor import start_watchdog
 import time
 import json
 import threading
@@ -18,6 +24,15 @@ CORS(app)
 # Store last fetched data
 last_data = None
 
+# Answers repeated email requests for the same account/plate from the first run's result
+email_request_deduplicator = RequestDeduplicator(reusable=lambda result: bool(result and result.get('processed')))
+
+# Caps how many lookups a batch request runs at once (BROWSER_CONCURRENCY x BROWSER_TABS)
+batch_browser_slots = threading.BoundedSemaphore(lookup_concurrency())
+
+# Enforces fetch deadlines and reaps Chrome left behind by abandoned requests or killed workers
+start_watchdog()
+
 
 @app.route('/')
 def index():
@@ -25,6 +40,12 @@ def index():
     return render_template('dashboard.html')
 
 
+@app.route('/metrics')
+def metrics():
+    """Metrics for this server process in the Prometheus text format (one page per gunicorn worker)"""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route('/api/fetch-toll-info', methods=['POST'])
 def fetch_toll_info():
     """API endpoint to trigger automation and fetch toll information"""
@@ -39,8 +60,8 @@ def fetch_toll_info():
                 'error': 'Account number and plate number are required'
             }), 400
         
-        # Get headless option from request (default False - always show browser)
-        headless = data.get('headless', False)
+        # Optional per-request override of the configured browser mode (visible only for debugging)
+        headless = data.get('headless')
         
         # Get email address if provided
         email = data.get('email', '').strip()
@@ -52,42 +73,12 @@ def fetch_toll_info():
         global last_data
         last_data = result
         
-        # Send email if provided and data was successfully fetched
+        # Queue email if provided and data was successfully fetched (sent in the background)
         if email and result.get('success'):
-            # Send email in background thread to not block response
-            email_sent_success = [False]  # Use list to allow modification in nested function
-            email_error = [None]
-            
-            def send_email_async():
-                try:
-                    # Ensure we're in the right directory and load env
-                    import os
-                    os.chdir('/Users/ghuman/tolls')
-                    from dotenv import load_dotenv
-                    load_dotenv()
-                    
-                    success = send_toll_info_email(email, result)
-                    email_sent_success[0] = success
-                    if success:
-                        print(f"✅ Email sent successfully to {email}")
-                    else:
-                        print(f"❌ Email failed to send to {email}")
-                except Exception as e:
-                    error_msg = str(e)
-                    email_error[0] = error_msg
-                    print(f"❌ Exception sending email: {error_msg}")
-                    email_sent_success[0] = False
-            
-            email_thread = threading.Thread(target=send_email_async)
-            email_thread.daemon = True
-            email_thread.start()
-            
-            # Give the thread more time to complete (email can take a few seconds)
-            email_thread.join(timeout=10)  # Wait up to 10 seconds
-            
-            result['email_sent'] = email_sent_success[0]
-            if email_error[0]:
-                result['email_error'] = email_error[0]
+            result['email_status'] = queue_toll_info_email(email, result)
+            result['email_queued'] = result['email_status'] == EMAIL_QUEUED
+            result['email_sent'] = False
+            print(f"📤 Email to {email}: {result['email_status']}")
         else:
             result['email_sent'] = False
             if not email:
@@ -137,26 +128,16 @@ def fetch_batch_toll_info():
             email = account_data.get('email', '').strip()
             
             try:
-                # Run automation
-                result = extract_toll_info(account_number, plate_number, headless=False)
+                # Run automation (waits for a free browser slot)
+                with batch_browser_slots:
+                    result = extract_toll_info(account_number, plate_number)
                 
-                # Send email if provided
+                # Queue email if provided (sent in the background)
+                result['email_sent'] = False
                 if email and result.get('success'):
-                    try:
-                        import os
-                        os.chdir('/Users/ghuman/tolls')
-                        from dotenv import load_dotenv
-                        load_dotenv()
-                        
-                        email_success = send_toll_info_email(email, result)
-                        result['email_sent'] = email_success
-                        if email_success:
-                            print(f"✅ Email sent to {email} for account {account_number}")
-                    except Exception as e:
-                        print(f"❌ Error sending email to {email}: {str(e)}")
-                        result['email_sent'] = False
-                else:
-                    result['email_sent'] = False
+                    result['email_status'] = queue_toll_info_email(email, result)
+                    result['email_queued'] = result['email_status'] == EMAIL_QUEUED
+                    print(f"📤 Email to {email} for account {account_number}: {result['email_status']}")
                 
                 with results_lock:
                     results.append(result)
@@ -179,7 +160,8 @@ def fetch_batch_toll_info():
             thread.start()
             threads.append(thread)
         
-        # Wait for all threads to complete (with timeout)
+        # Wait for all threads to complete (with timeout); a scrape that runs past
+        # FETCH_DEADLINE is cancelled by the fetch supervisor, so none are left running
         for thread in threads:
             thread.join(timeout=300)  # 5 minutes per account
         
@@ -380,10 +362,10 @@ def check_emails():
                     'results': []
                 })
             
-            results = []
+            attempted_ids = set()
             
-            # Process each email sequentially (one by one)
-            for email_data in emails:
+            def process_email(email_data):
+                """Fetch NY/NJ data for one parsed email and send the results back"""
                 account_number = email_data.get('account_number')
                 violation_number = email_data.get('violation_number')
                 plate_number = email_data.get('plate_number')
@@ -412,6 +394,7 @@ def check_emails():
                     combined_violations = 0
                     combined_result = None
                     sources_processed = []
+                    deferred_sources = []
                     
                     # Process NY account first (if exists)
                     if account_number and plate_number:
@@ -421,13 +404,15 @@ def check_emails():
                         
                         try:
                             # Run NY automation
-                            ny_result = extract_toll_info(account_number, plate_number, headless=False)
+                            ny_result = extract_toll_info(account_number, plate_number)
                             if ny_result.get('success'):
                                 combined_balance += ny_result.get('balance_amount', 0)
                                 combined_bill_numbers.extend(ny_result.get('toll_bill_numbers', []))
                                 combined_violations += ny_result.get('violation_count', 0)
                                 combined_result = ny_result
                                 sources_processed.append('NY')
+                            elif ny_result.get('deferred'):
+                                deferred_sources.append('NY')
                         except Exception as e:
                             result['ny_error'] = str(e)
                     
@@ -438,7 +423,7 @@ def check_emails():
                         
                         try:
                             # Run NJ automation
-                            nj_result = extract_toll_info_nj(violation_number, nj_plate_number, headless=False)
+                            nj_result = extract_toll_info_nj(violation_number, nj_plate_number)
                             if nj_result.get('success'):
                                 combined_balance += nj_result.get('balance_amount', 0)
                                 combined_bill_numbers.extend(nj_result.get('toll_bill_numbers', []))
@@ -452,9 +437,17 @@ def check_emails():
                                 else:
                                     combined_result = nj_result
                                 sources_processed.append('NJ')
+                            elif nj_result.get('deferred'):
+                                deferred_sources.append('NJ')
                         except Exception as e:
                             result['nj_error'] = str(e)
                     
+                    # A site is refusing lookups: leave the email unread and answer it in full on a later check
+                    if deferred_sources:
+                        result['deferred'] = True
+                        result['deferred_sources'] = deferred_sources
+                        return result
+                    
                     if combined_result:
                         result['toll_data'] = combined_result
                         result['processed'] = True
@@ -462,19 +455,55 @@ def check_emails():
                         
                         # Send email back with results if email address is provided
                         if email_address and combined_result.get('success'):
-                            send_toll_info_email(email_address, combined_result)
-                            result['email_sent'] = True
+                            result['email_status'] = queue_toll_info_email(email_address, combined_result)
+                            result['email_queued'] = result['email_status'] == EMAIL_QUEUED
                     
-                    # Mark email as read if requested
-                    if mark_read and email_id:
-                        reader.mark_as_read(email_id)
+                    attempted_ids.add(email_id)
+                
+                return result
+            
+            def process_unique_email(email_data):
+                result, first_request = email_request_deduplicator.run(email_data, process_email)
+                if first_request is None:
+                    return result
                 
+                # Identical request already answered - reuse its result without another fetch or email
+                attempted_ids.add(email_data.get('email_id'))
+                duplicate = dict(result)
+                duplicate.update({
+                    'email_id': email_data.get('email_id'),
+                    'sender': email_data.get('sender_email'),
+                    'subject': email_data.get('subject'),
+                    'email_queued': False,
+                    'duplicate_of': first_request.get('email_id')
+                })
+                return duplicate
+            
+            def mark_processed(email_data, result, error):
+                # Mark email as read once it has been processed, if requested
+                email_id = email_data.get('email_id')
+                if mark_read and not error and email_id in attempted_ids:
+                    reader.mark_as_read(email_id)
+            
+            # Process emails in parallel (same sender stays in order)
+            results = []
+            for email_data, result, error in process_requests(emails, process_unique_email, on_done=mark_processed):
+                if error:
+                    result = {
+                        'email_id': email_data.get('email_id'),
+                        'sender': email_data.get('sender_email'),
+                        'subject': email_data.get('subject'),
+                        'processed': False,
+                        'error': str(error)
+                    }
                 results.append(result)
             
             return jsonify({
                 'success': True,
                 'message': f'Processed {len(emails)} email(s)',
                 'emails_processed': len(emails),
+                'emails_deferred': sum(1 for r in results if r.get('deferred')),
+                'duplicates_suppressed': sum(1 for r in results if r.get('duplicate_of')),
                 'results': results
             })
         
@@ -541,8 +570,7 @@ def fetch_single_account():
             result = extract_toll_info_nj(
                 violation_number=violation_number,
                 plate_number=plate_number,
-                account_number=account_number,
-                headless=False
+                account_number=account_number
             )
         else:
             # NY E-ZPass
@@ -551,7 +579,7 @@ def fetch_single_account():
                     'success': False,
                     'error': 'Account number is required for NY E-ZPass'
                 }), 400
-            result = extract_toll_info(account_number, plate_number, headless=False)
+            result = extract_toll_info(account_number, plate_number)
             
             # For NY accounts, set ny_balance_amount from balance_amount
             if result.get('success') and 'balance_amount' in result:
@@ -585,8 +613,7 @@ def fetch_nj_violation():
         # Run the NJ automation
         result = extract_toll_info_nj(
             violation_number=violation_number,
-            plate_number=plate_number,
-            headless=False
+            plate_number=plate_number
         )
         
         return jsonify(result)
@@ -618,20 +645,24 @@ def send_account_email():
                 'error': 'Toll data is required'
             }), 400
         
-        # Send email
-        email_success = send_toll_info_email(recipient_email, toll_data)
-        
-        if email_success:
-            return jsonify({
-                'success': True,
-                'message': f'Email sent successfully to {recipient_email}'
-            })
-        else:
+        if not get_smtp_connection().is_configured():
             return jsonify({
                 'success': False,
                 'error': 'Failed to send email. Check SMTP configuration and logs.'
             }), 500
         
+        # Queue email (sent in the background) - an explicit send goes out even if the same
+        # results were emailed recently
+        status = queue_toll_info_email(recipient_email, toll_data, force=True)
+        
+        return jsonify({
+            'success': True,
+            'queued': status == EMAIL_QUEUED,
+            'email_status': status,
+            'message': f'Email queued for {recipient_email}' if status == EMAIL_QUEUED
+                       else f'Identical email to {recipient_email} was already sent recently'
+        })
+        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+asyncio orchestration layer around the blocking scrapers, IMAP client and email outbox
+
+One event loop coordinates any number of in-flight jobs. Blocking work runs in bounded
+executors so the number of OS threads doesn't grow with the number of jobs:
+
+    - Selenium scrapes run on ASYNC_BROWSER_WORKERS threads (one browser each)
+    - IMAP calls run on a single thread that owns the mailbox connection
+    - Account saves and email outbox writes run on a single thread
+    - Email requests wait for duplicate-request checks on ASYNC_BROWSER_WORKERS threads
+
+Every job has a timeout. A job that times out (or is cancelled) returns a failed
+result right away and frees its place in the queue; the browser thread it was using
+finishes in the background and is then reused.
+
+No asyncio-native IMAP client is installed, so the existing imaplib client is driven
+through its dedicated executor thread instead. Replies go through the durable email
+outbox (see email_outbox) like everywhere else, and email requests share the email
+worker's duplicate-request window (see request_dedup).
+
+Usage:
+    python async_orchestrator.py fetch   # fetch all saved accounts and queue digest emails
+    python async_orchestrator.py mail    # answer unread email requests once
+"""
+import asyncio
+import functools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from automation_selenium import extract_toll_info
+from automation_selenium_nj import extract_toll_info_nj
+from email_reader import EmailReader
+from email_outbox import EMAIL_QUEUED, queue_toll_digest_email, queue_toll_info_email
+from account_manager import add_account
+from email_checker_worker import request_deduplicator
+from runtime_config import lookup_concurrency
+
+load_dotenv()
+
+# Lookups running at the same time (default: BROWSER_CONCURRENCY x BROWSER_TABS from the runtime config)
+ASYNC_BROWSER_WORKERS = int(os.getenv('ASYNC_BROWSER_WORKERS', lookup_concurrency()))
+
+# Jobs allowed in flight at once (queued jobs beyond the browser workers just wait)
+ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', '200'))
+
+# Per-site scrape timeout (seconds)
+ASYNC_FETCH_TIMEOUT = int(os.getenv('ASYNC_FETCH_TIMEOUT', '300'))
+
+# IMAP and outbox operation timeout (seconds)
+ASYNC_MAIL_TIMEOUT = int(os.getenv('ASYNC_MAIL_TIMEOUT', '120'))
+
+IMAP_FOLDER = os.getenv('IMAP_FOLDER', 'INBOX')
+
+_executors = {}
+_mail_reader = None
+
+
+def _executor(name: str) -> ThreadPoolExecutor:
+    """Return one of the shared bounded executors ('browser', 'requests', 'imap' or 'mail')"""
+    if name not in _executors:
+        workers = ASYNC_BROWSER_WORKERS if name in ('browser', 'requests') else 1
+        _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'async-{name}')
+    return _executors[name]
+
+
+async def _run_blocking(executor_name: str, timeout: float, func: Callable, *args, **kwargs):
+    """Run a blocking call on one of the bounded executors with a timeout"""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor(executor_name), functools.partial(func, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout=timeout)
+
+
+async def fetch_site(source: str, account_data: Dict, timeout: float = None) -> Dict:
+    """
+    Scrape one site (NY or NJ) for an account
+
+    Args:
+        source: 'NY' or 'NJ'
+        account_data: Account dictionary (account_number/plate_number or violation_number/nj_plate_number)
+        timeout: Seconds before the scrape is abandoned (default: ASYNC_FETCH_TIMEOUT)
+
+    Returns:
+        Scraper result dictionary with 'source' set
+    """
+    timeout = timeout or ASYNC_FETCH_TIMEOUT
+    try:
+        if source == 'NY':
+            result = await _run_blocking('browser', timeout, extract_toll_info,
+                                         account_data.get('account_number', '').strip(),
+                                         account_data.get('plate_number', '').strip())
+        else:
+            violation_number = account_data.get('violation_number') or account_data.get('nj_violation_number', '')
+            nj_plate = account_data.get('nj_plate_number') or account_data.get('plate_number', '')
+            result = await _run_blocking('browser', timeout, extract_toll_info_nj,
+                                         violation_number=violation_number.strip(),
+                                         plate_number=nj_plate.strip())
+    except asyncio.TimeoutError:
+        result = {'success': False, 'error': f'Timed out after {timeout}s'}
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+
+    result['source'] = source
+    return result
+
+
+def combine_results(account_data: Dict, site_results: List[Dict]) -> Dict:
+    """
+    Merge NY and NJ results for one account into a single result
+
+    Args:
+        account_data: Account dictionary that was fetched
+        site_results: Results from fetch_site
+
+    Returns:
+        Combined result in the same shape auto_fetch produces
+    """
+    successful = [r for r in site_results if r.get('success')]
+    ny_result = next((r for r in site_results if r.get('source') == 'NY'), None)
+    nj_result = next((r for r in site_results if r.get('source') == 'NJ'), None)
+    ny_balance = ny_result.get('balance_amount', 0) if ny_result and ny_result.get('success') else 0
+    nj_balance = nj_result.get('balance_amount', 0) if nj_result and nj_result.get('success') else 0
+    bill_numbers = []
+    for result in successful:
+        bill_numbers.extend(result.get('toll_bill_numbers', []))
+
+    return {
+        'success': bool(successful),
+        'account_number': account_data.get('account_number', ''),
+        'plate_number': account_data.get('plate_number', ''),
+        'violation_number': account_data.get('violation_number') or account_data.get('nj_violation_number', ''),
+        'email': account_data.get('email', ''),
+        'balance_amount': sum(r.get('balance_amount', 0) or 0 for r in successful),
+        'ny_balance_amount': ny_balance,
+        'nj_balance_amount': nj_balance,
+        'toll_bill_numbers': list(set(bill_numbers)),
+        'violation_count': sum(r.get('violation_count', 0) or 0 for r in successful),
+        'sources': [r['source'] for r in site_results],
+        'ny_result': ny_result,
+        'nj_result': nj_result,
+        'combined_results': site_results,
+        'error': None if successful else '; '.join(f"{r['source']}: {r.get('error', 'Unknown error')}"
+                                                   for r in site_results)
+    }
+
+
+def _sites_for(account_data: Dict) -> List[str]:
+    """Which sites an account needs (NY, NJ or both)"""
+    sources = account_data.get('sources') or [account_data.get('source', 'NY')]
+    if 'BOTH' in sources:
+        sources = ['NY', 'NJ']
+    sites = []
+    if 'NY' in sources and account_data.get('account_number') and account_data.get('plate_number'):
+        sites.append('NY')
+    if ('NJ' in sources and (account_data.get('violation_number') or account_data.get('nj_violation_number'))
+            and (account_data.get('nj_plate_number') or account_data.get('plate_number'))):
+        sites.append('NJ')
+    return sites
+
+
+async def fetch_account(account_data: Dict, timeout: float = None) -> Dict:
+    """
+    Fetch toll information for one account (NY and NJ sites run concurrently)
+
+    Args:
+        account_data: Account dictionary
+        timeout: Per-site timeout in seconds (default: ASYNC_FETCH_TIMEOUT)
+
+    Returns:
+        Combined result dictionary
+    """
+    sites = _sites_for(account_data)
+    if not sites:
+        result = combine_results(account_data, [])
+        result['error'] = 'No valid NY or NJ data'
+        return result
+    results = await asyncio.gather(*(fetch_site(site, account_data, timeout) for site in sites))
+    return combine_results(account_data, list(results))
+
+
+async def fetch_many(accounts: List[Dict], max_in_flight: int = None, timeout: float = None,
+                     on_result: Optional[Callable[[Dict, Dict], None]] = None) -> List[Dict]:
+    """
+    Fetch many accounts concurrently
+
+    Args:
+        accounts: Account dictionaries
+        max_in_flight: Jobs admitted at once (default: ASYNC_MAX_IN_FLIGHT); browsers are
+                       separately capped at ASYNC_BROWSER_WORKERS
+        timeout: Per-site timeout in seconds (default: ASYNC_FETCH_TIMEOUT)
+        on_result: Optional callback(account, result) called as each account finishes
+
+    Returns:
+        Combined results in the same order as accounts
+    """
+    semaphore = asyncio.Semaphore(max_in_flight or ASYNC_MAX_IN_FLIGHT)
+
+    async def run(account):
+        async with semaphore:
+            result = await fetch_account(account, timeout)
+        if on_result:
+            try:
+                on_result(account, result)
+            except Exception as e:
+                print(f"⚠️  Error in result callback: {str(e)}")
+        return result
+
+    return list(await asyncio.gather(*(run(account) for account in accounts)))
+
+
+def _read_unread_mail(folder: str, limit: int) -> List[Dict]:
+    """Fetch unread requests on the IMAP thread (keeps the connection open between calls)"""
+    global _mail_reader
+    if _mail_reader is None:
+        _mail_reader = EmailReader()
+    return _mail_reader.get_unread_emails(folder=folder, limit=limit)
+
+
+def _mark_mail_read(email_ids: List[str], folder: str) -> int:
+    """Mark emails as read on the IMAP thread"""
+    if _mail_reader is None:
+        return 0
+    return sum(1 for email_id in email_ids if _mail_reader.mark_as_read(email_id, folder=folder))
+
+
+async def check_mail(folder: str = None, limit: int = 10, timeout: float = None) -> List[Dict]:
+    """
+    Get unread toll request emails
+
+    Args:
+        folder: IMAP folder (default: IMAP_FOLDER)
+        limit: Maximum number of emails to read
+        timeout: Seconds before giving up (default: ASYNC_MAIL_TIMEOUT)
+
+    Returns:
+        List of parsed email requests (empty on timeout or error)
+    """
+    try:
+        return await _run_blocking('imap', timeout or ASYNC_MAIL_TIMEOUT, _read_unread_mail,
+                                   folder or IMAP_FOLDER, limit)
+    except asyncio.TimeoutError:
+        print("⚠️  Timed out checking email")
+    except Exception as e:
+        print(f"❌ Error checking email: {str(e)}")
+    return []
+
+
+async def mark_mail_read(email_ids: List[str], folder: str = None, timeout: float = None) -> int:
+    """
+    Mark request emails as read
+
+    Returns:
+        int: Number of emails marked
+    """
+    try:
+        return await _run_blocking('imap', timeout or ASYNC_MAIL_TIMEOUT, _mark_mail_read,
+                                   email_ids, folder or IMAP_FOLDER)
+    except Exception as e:
+        print(f"❌ Error marking emails as read: {str(e)}")
+        return 0
+
+
+async def send_mail(recipient_email: str, toll_results: List[Dict], timeout: float = None) -> bool:
+    """
+    Queue one email covering the given results in the email outbox
+
+    Args:
+        recipient_email: Email address to send to
+        toll_results: Toll information dictionaries (one per account)
+        timeout: Seconds before giving up (default: ASYNC_MAIL_TIMEOUT)
+
+    Returns:
+        bool: True if the email was queued (the outbox delivers it and retries failures);
+              False if an identical email was already queued or sent recently
+    """
+    queue = queue_toll_info_email if len(toll_results) == 1 else queue_toll_digest_email
+    toll_data = toll_results[0] if len(toll_results) == 1 else toll_results
+    try:
+        status = await _run_blocking('mail', timeout or ASYNC_MAIL_TIMEOUT, queue, recipient_email, toll_data)
+        return status == EMAIL_QUEUED
+    except asyncio.TimeoutError:
+        print(f"⚠️  Timed out queueing email to {recipient_email}")
+    except Exception as e:
+        print(f"❌ Error queueing email to {recipient_email}: {str(e)}")
+    return False
+
+
+def _request_to_account(email_data: Dict) -> Dict:
+    """Turn a parsed email request into an account dictionary"""
+    return {
+        'account_number': email_data.get('account_number') or '',
+        'plate_number': email_data.get('plate_number') or '',
+        'violation_number': email_data.get('violation_number') or '',
+        'nj_plate_number': email_data.get('nj_plate_number') or email_data.get('plate_number') or '',
+        'email': email_data.get('email') or email_data.get('sender_email') or '',
+        'sources': ['NY', 'NJ'] if email_data.get('source') == 'BOTH' else [email_data.get('source', 'NY')]
+    }
+
+
+def _save_request_accounts(account_data: Dict):
+    """Add the requested accounts to the auto-fetch list (merges if the email is already saved)"""
+    sites = _sites_for(account_data)
+    if 'NY' in sites:
+        add_account(account_number=account_data['account_number'], plate_number=account_data['plate_number'],
+                    email=account_data['email'], source='NY')
+    if 'NJ' in sites:
+        add_account(violation_number=account_data['violation_number'], plate_number=account_data['nj_plate_number'],
+                    email=account_data['email'], source='NJ')
+
+
+async def answer_request(email_data: Dict) -> Dict:
+    """
+    Save, fetch and reply to one email request
+
+    Returns:
+        Combined result, or a `deferred` result if a site's circuit breaker is open (the
+        request is then answered in full on a later check, as in email_checker_worker)
+    """
+    account_data = _request_to_account(email_data)
+    try:
+        await _run_blocking('mail', ASYNC_MAIL_TIMEOUT, _save_request_accounts, account_data)
+    except Exception as e:
+        print(f"⚠️  Could not save requested account(s): {str(e)}")
+
+    result = await fetch_account(account_data)
+    deferred_sources = [r['source'] for r in result['combined_results'] if r.get('deferred')]
+    if deferred_sources:
+        print(f"⏸️  Deferring request from {email_data.get('sender_email')} until "
+              f"{' and '.join(deferred_sources)} accept lookups again")
+        return {**result, 'success': False, 'deferred': True, 'deferred_sources': deferred_sources}
+
+    if result['success'] and result['email']:
+        result['email_queued'] = await send_mail(result['email'], [result])
+    return result
+
+
+async def answer_mail_requests(limit: int = 10) -> List[Dict]:
+    """
+    Read unread requests, fetch them concurrently and queue the replies
+
+    Identical requests inside the duplicate-request window are answered once. As in
+    email_checker_worker, an email is marked as read once its request was processed;
+    deferred requests (and ones that raised) stay unread and are retried on the next check.
+
+    Returns:
+        Combined results, one per request
+    """
+    requests = await check_mail(limit=limit)
+    if not requests:
+        return []
+
+    print(f"📬 {len(requests)} request(s) to process")
+    loop = asyncio.get_running_loop()
+
+    # Saving the accounts, both site lookups (run concurrently) and queueing the reply
+    request_timeout = ASYNC_FETCH_TIMEOUT + 2 * ASYNC_MAIL_TIMEOUT
+
+    def answer_blocking(email_data):
+        # Runs on a 'requests' thread inside the deduplicator: drive the async handler on the event loop
+        return asyncio.run_coroutine_threadsafe(answer_request(email_data), loop).result()
+
+    async def answer(email_data):
+        try:
+            result, first_request = await _run_blocking('requests', request_timeout, request_deduplicator.run,
+                                                        email_data, answer_blocking)
+        except Exception as e:
+            print(f"❌ Error processing email from {email_data.get('sender_email')}: {str(e) or type(e).__name__}")
+            return {'success': False, 'error': str(e) or type(e).__name__}
+        if first_request is not None:
+            print(f"♻️  Duplicate request from {email_data.get('sender_email')} - "
+                  f"already answered from the request sent by {first_request.get('sender_email')}")
+        if result and result.get('deferred'):
+            print(f"⏸️  Left email from {email_data.get('sender_email')} unread - will retry on the next check")
+        else:
+            await mark_mail_read([email_data['email_id']])
+        return result or {'success': False, 'error': 'Request failed'}
+
+    return list(await asyncio.gather(*(answer(email_data) for email_data in requests)))
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'fetch'
+
+    if command == 'fetch':
+        from account_manager import load_accounts
+        from auto_fetch import queue_digest_emails
+        from email_outbox import get_outbox
+
+        accounts = load_accounts()
+        print(f"🚀 Fetching {len(accounts)} account(s) with up to {ASYNC_BROWSER_WORKERS} browsers")
+        results = asyncio.run(fetch_many(
+            accounts,
+            on_result=lambda account, result: print(
+                f"{'✅' if result['success'] else '❌'} {result['account_number'] or result['violation_number']}: "
+                f"{'$%.2f' % result['balance_amount'] if result['success'] else result['error']}")
+        ))
+        queue_digest_emails(results)
+        get_outbox().flush()
+        print(f"✅ Completed: {sum(1 for r in results if r['success'])} successful out of {len(results)}")
+    elif command == 'mail':
+        from email_outbox import get_outbox
+
+        results = asyncio.run(answer_mail_requests())
+        get_outbox().flush()
+        print(f"✅ Answered {sum(1 for r in results if r['success'])} of {len(results)} request(s)")
+    else:
+        print("Usage: python async_orchestrator.py [fetch|mail]")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,10 @@
 """
 Automated script to fetch toll information for all configured accounts
 Runs every 3 hours via launchd scheduler
-Processes accounts sequentially (one by one) with 15-second wait between each
+Processes accounts in parallel, as many at once as each site's adaptive concurrency
+limit allows (see adaptive_limiter); AUTO_FETCH_MODE=sequential processes them one by
+one with a 15-second wait between each. Browsers stay on the search form between
+accounts (AUTO_FETCH_SESSION_REUSE, see lookup_sessions)
 """
 import os
 import sys
@@ -11,8 +14,15 @@ import time
 from datetime import datetime
 from automation_selenium import extract_toll_info
 from automation_selenium_nj import extract_toll_info_nj
-from email_service import send_toll_info_email
+from email_outbox import EMAIL_QUEUED, queue_toll_info_email, queue_toll_digest_email, get_outbox
 from account_manager import load_accounts, save_accounts
+from notification_state import NotificationState, CHANGE_ONLY_NOTIFICATIONS
+from fetch_timing import format_timings
+from metrics import write_textfile
+from adaptive_limiter import current_limits, total_limit
+from fetch_supervisor import reap_orphans
+from lookup_sessions import batch_sessions
+from concurrent.futures import ThreadPoolExecutor
 import threading
 
 # Change to script directory
@@ -26,6 +36,46 @@ load_dotenv()
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'accounts_config.json')
 LOG_FILE = os.path.join(os.path.dirname(__file__), 'auto_fetch.log')
 
+# Send one digest email per recipient at the end of the run instead of one email per account
+EMAIL_DIGEST = os.getenv('EMAIL_DIGEST', 'true').lower() in ('1', 'true', 'yes')
+# Write the run's metrics here for a node_exporter textfile collector (unset = off)
+AUTO_FETCH_METRICS_FILE = os.getenv('AUTO_FETCH_METRICS_FILE')
+# 'adaptive' (parallel, paced by the per-site AIMD limiters) or 'sequential'
+AUTO_FETCH_MODE = os.getenv('AUTO_FETCH_MODE', 'adaptive').lower()
+# Keep browsers parked on the search form between accounts instead of reloading the site
+AUTO_FETCH_SESSION_REUSE = os.getenv('AUTO_FETCH_SESSION_REUSE', 'true').lower() in ('1', 'true', 'yes')
+
+# One read-modify-write of accounts_config.json at a time
+accounts_update_lock = threading.Lock()
+
+# Last emailed content per recipient/account (for change-only notifications)
+notification_state = NotificationState()
+
+# Emails avoided during this run
+email_savings = {'batched': 0, 'unchanged': 0}
+
+def should_notify(email, toll_results):
+    """
+    Check whether any of a recipient's results changed since their last email
+    
+    Args:
+        email: Recipient email address
+        toll_results: Results that would go into the email
+        
+    Returns:
+        bool: True if the email should be sent
+    """
+    if not CHANGE_ONLY_NOTIFICATIONS:
+        return True
+    reasons = [notification_state.check(email, result)[1] for result in toll_results]
+    sendable = [reason for reason in reasons if reason != 'unchanged']
+    if sendable:
+        if sendable == ['heartbeat'] * len(sendable):
+            log_message(f"💓 No changes for {email}, sending heartbeat email")
+        return True
+    log_message(f"🔕 No changes for {email} since the last email - skipping")
+    return False
+
 def log_message(message):
     """Log message to file and console"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -86,6 +136,9 @@ def process_account(account_data, results_list, results_lock):
     """
     Process a single account - handles both NY and NJ accounts sequentially
     Merges results if account has both NY and NJ
+    
+    Returns:
+        The combined result (also appended to results_list), or None if the account was skipped
     """
     sources = account_data.get('sources', [account_data.get('source', 'NY')])
     email = account_data.get('email', '').strip()
@@ -96,7 +149,7 @@ def process_account(account_data, results_list, results_lock):
     
     if not has_ny and not has_nj:
         log_message(f"⚠️  Skipping account - no valid NY or NJ data")
-        return
+        return None
     
     # Combined results
     combined_balance = 0.0
@@ -115,8 +168,10 @@ def process_account(account_data, results_list, results_lock):
         log_message(f"🔄 Processing NY Account: {account_number}, Plate: {plate_number}")
         
         try:
-            result = extract_toll_info(account_number, plate_number, headless=False)
+            result = extract_toll_info(account_number, plate_number)
             result['source'] = 'NY'
+            if result.get('timings'):
+                log_message(f"⏱️  NY fetch took {format_timings(result['timings'])}")
             
             if result.get('success'):
                 ny_balance = result.get('balance_amount', 0)
@@ -128,6 +183,9 @@ def process_account(account_data, results_list, results_lock):
                 # Store NY balance separately
                 account_data['ny_balance_amount'] = ny_balance
                 log_message(f"✅ NY Success - Balance: ${ny_balance:.2f}")
+            elif result.get('deferred'):
+                log_message(f"⏸️  NY Deferred: {result.get('error')}")
+                combined_results.append(result)
             else:
                 log_message(f"❌ NY Failed: {result.get('error', 'Unknown error')}")
                 combined_results.append(result)
@@ -145,10 +203,11 @@ def process_account(account_data, results_list, results_lock):
         try:
             result = extract_toll_info_nj(
                 violation_number=violation_number,
-                plate_number=nj_plate,
-                headless=False
+                plate_number=nj_plate
             )
             result['source'] = 'NJ'
+            if result.get('timings'):
+                log_message(f"⏱️  NJ fetch took {format_timings(result['timings'])}")
             
             if result.get('success'):
                 nj_balance = result.get('balance_amount', 0)
@@ -160,6 +219,9 @@ def process_account(account_data, results_list, results_lock):
                 # Store NJ balance separately
                 account_data['nj_balance_amount'] = nj_balance
                 log_message(f"✅ NJ Success - Balance: ${nj_balance:.2f}")
+            elif result.get('deferred'):
+                log_message(f"⏸️  NJ Deferred: {result.get('error')}")
+                combined_results.append(result)
             else:
                 log_message(f"❌ NJ Failed: {result.get('error', 'Unknown error')}")
                 combined_results.append(result)
@@ -181,81 +243,132 @@ def process_account(account_data, results_list, results_lock):
         'sources': sources,
         'ny_result': next((r for r in combined_results if r.get('source') == 'NY'), None),
         'nj_result': next((r for r in combined_results if r.get('source') == 'NJ'), None),
-        'combined_results': combined_results
+        'combined_results': combined_results,
+        # Every lookup was skipped because its site's circuit breaker is open
+        'deferred': bool(combined_results) and all(r.get('deferred') for r in combined_results)
     }
     
     # Update account data in accounts_config.json if automation was successful
     if has_success:
-        try:
-            accounts = load_accounts()
-            account_updated = False
+        # Accounts are processed in parallel - one read-modify-write of the file at a time
+        with accounts_update_lock:
+            try:
+                accounts = load_accounts()
+                account_updated = False
             
-            # Find and update the account that was processed
-            account_number = account_data.get('account_number', '').strip().upper() if account_data.get('account_number') else ''
-            violation_number = (account_data.get('violation_number') or account_data.get('nj_violation_number', '')).strip().upper()
-            plate_number = account_data.get('plate_number', '').strip().upper() if account_data.get('plate_number') else ''
-            nj_plate = (account_data.get('nj_plate_number') or account_data.get('plate_number', '')).strip().upper()
+                # Find and update the account that was processed
+                account_number = account_data.get('account_number', '').strip().upper() if account_data.get('account_number') else ''
+                violation_number = (account_data.get('violation_number') or account_data.get('nj_violation_number', '')).strip().upper()
+                plate_number = account_data.get('plate_number', '').strip().upper() if account_data.get('plate_number') else ''
+                nj_plate = (account_data.get('nj_plate_number') or account_data.get('plate_number', '')).strip().upper()
             
-            for acc in accounts:
-                # Match by NY account details
-                acc_account = acc.get('account_number', '').strip().upper()
-                acc_plate = acc.get('plate_number', '').strip().upper()
-                match_by_ny = (account_number and acc_account == account_number and acc_plate == plate_number)
+                for acc in accounts:
+                    # Match by NY account details
+                    acc_account = acc.get('account_number', '').strip().upper()
+                    acc_plate = acc.get('plate_number', '').strip().upper()
+                    match_by_ny = (account_number and acc_account == account_number and acc_plate == plate_number)
                 
-                # Match by NJ violation details
-                acc_violation = (acc.get('violation_number') or acc.get('nj_violation_number', '')).strip().upper()
-                acc_nj_plate = (acc.get('nj_plate_number') or acc.get('plate_number', '')).strip().upper()
-                match_by_nj = (violation_number and acc_violation == violation_number and acc_nj_plate == nj_plate)
+                    # Match by NJ violation details
+                    acc_violation = (acc.get('violation_number') or acc.get('nj_violation_number', '')).strip().upper()
+                    acc_nj_plate = (acc.get('nj_plate_number') or acc.get('plate_number', '')).strip().upper()
+                    match_by_nj = (violation_number and acc_violation == violation_number and acc_nj_plate == nj_plate)
                 
-                # Match by email (fallback)
-                acc_email = acc.get('email', '').strip().lower()
-                match_by_email = (email and acc_email == email.lower())
+                    # Match by email (fallback)
+                    acc_email = acc.get('email', '').strip().lower()
+                    match_by_email = (email and acc_email == email.lower())
                 
-                # Update if matched
-                if match_by_ny or match_by_nj or (match_by_email and (has_ny or has_nj)):
-                    # Update balances (always set, even if 0)
-                    acc['balance_amount'] = combined_balance
-                    acc['ny_balance_amount'] = ny_balance
-                    acc['nj_balance_amount'] = nj_balance
-                    acc['violation_count'] = combined_violations
-                    acc['toll_bill_numbers'] = list(set(combined_bill_numbers))
-                    acc['last_updated'] = datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p")
-                    account_updated = True
-                    log_message(f"💾 Updated account data - NY: ${ny_balance:.2f}, NJ: ${nj_balance:.2f}, Total: ${combined_balance:.2f}")
-                    break
+                    # Update if matched
+                    if match_by_ny or match_by_nj or (match_by_email and (has_ny or has_nj)):
+                        # Update balances (always set, even if 0)
+                        acc['balance_amount'] = combined_balance
+                        acc['ny_balance_amount'] = ny_balance
+                        acc['nj_balance_amount'] = nj_balance
+                        acc['violation_count'] = combined_violations
+                        acc['toll_bill_numbers'] = list(set(combined_bill_numbers))
+                        acc['last_updated'] = datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p")
+                        account_updated = True
+                        log_message(f"💾 Updated account data - NY: ${ny_balance:.2f}, NJ: ${nj_balance:.2f}, Total: ${combined_balance:.2f}")
+                        break
             
-            if account_updated:
-                # Save updated accounts
-                save_accounts(accounts)
-            else:
-                log_message(f"⚠️  Could not find matching account to update (Account: {account_number}, Violation: {violation_number}, Email: {email})")
-        except Exception as e:
-            log_message(f"⚠️  Warning: Could not update account data: {str(e)}")
-            import traceback
-            log_message(f"   Traceback: {traceback.format_exc()}")
+                if account_updated:
+                    # Save updated accounts
+                    save_accounts(accounts)
+                else:
+                    log_message(f"⚠️  Could not find matching account to update (Account: {account_number}, Violation: {violation_number}, Email: {email})")
+            except Exception as e:
+                log_message(f"⚠️  Warning: Could not update account data: {str(e)}")
+                import traceback
+                log_message(f"   Traceback: {traceback.format_exc()}")
     
-    # Send email if provided
+    # Queue email if provided (sent by the outbox sender thread)
     if email:
-        if has_success:
+        if has_success and EMAIL_DIGEST:
+            # Sent with the recipient's other accounts once the run finishes
+            combined_result['email'] = email
+            log_message(f"📥 Results for {email} will be sent in the run digest")
+        elif has_success and not should_notify(email, [combined_result]):
+            email_savings['unchanged'] += 1
+        elif has_success:
             try:
-                log_message(f"📤 Attempting to send email to {email}...")
-                # Pass logger function to email_service
-                email_success = send_toll_info_email(email, combined_result, logger=log_message)
-                
-                if email_success:
-                    log_message(f"✅ Email sent successfully to {email} (Combined: {' + '.join(sources)})")
-                else:
-                    log_message(f"❌ Email sending failed for {email} - check error messages above")
-                    
+                if queue_toll_info_email(email, combined_result, logger=log_message) == EMAIL_QUEUED:
+                    log_message(f"📤 Queued email to {email} (Combined: {' + '.join(sources)})")
+                notification_state.record(email, [combined_result])
             except Exception as e:
-                log_message(f"❌ Error sending email to {email}: {str(e)}")
+                log_message(f"❌ Error queueing email to {email}: {str(e)}")
                 import traceback
                 log_message(f"   Traceback: {traceback.format_exc()}")
+        elif combined_result['deferred']:
+            log_message(f"⏸️  Email to {email} deferred - site is refusing lookups, will retry next run")
         else:
             log_message(f"⚠️  Email not sent to {email} - automation did not complete successfully (no data to send)")
     
     with results_lock:
         results_list.append(combined_result)
+    return combined_result
+
+def group_results_by_recipient(results):
+    """
+    Group successful results of a run by recipient email
+    
+    Args:
+        results: Combined results from process_account
+        
+    Returns:
+        Dictionary mapping recipient email to its list of results (in processing order)
+    """
+    digests = {}
+    for result in results:
+        email = (result.get('email') or '').strip()
+        if email and result.get('success'):
+            digests.setdefault(email.lower(), (email, []))[1].append(result)
+    return {email: account_results for email, account_results in digests.values()}
+
+def queue_digest_emails(results):
+    """
+    Queue one email per recipient covering all of their accounts from this run
+    
+    Args:
+        results: Combined results from process_account
+        
+    If nothing changed for any of a recipient's accounts, their email is skipped.
+    Updates email_savings with the emails avoided by batching and by skipping.
+    """
+    digests = group_results_by_recipient(results)
+    for email, account_results in digests.items():
+        if not should_notify(email, account_results):
+            email_savings['unchanged'] += 1
+            email_savings['batched'] += len(account_results) - 1
+            continue
+        try:
+            status = queue_toll_digest_email(email, account_results, logger=log_message)
+            notification_state.record(email, account_results)
+            email_savings['batched'] += len(account_results) - 1
+            if status == EMAIL_QUEUED:
+                log_message(f"📤 Queued email to {email} ({len(account_results)} account(s))")
+        except Exception as e:
+            log_message(f"❌ Error queueing email to {email}: {str(e)}")
+            import traceback
+            log_message(f"   Traceback: {traceback.format_exc()}")
 
 def main():
     """Main function to process all accounts"""
@@ -263,6 +376,9 @@ def main():
     log_message("🚀 Starting automated toll information fetch")
     log_message("=" * 60)
     
+    # Chrome left behind by earlier runs that crashed or were killed
+    reap_orphans()
+    
     # Load accounts
     accounts = load_accounts()
     
@@ -283,33 +399,74 @@ def main():
         return
     
     log_message(f"📋 Found {len(valid_accounts)} account(s) to process")
-    log_message("📌 Processing accounts sequentially (one at a time, not in parallel)")
-    log_message("⏱️  Wait time between accounts: 15 seconds")
-    log_message("=" * 60)
-    
-    # Process accounts sequentially (one by one, not in parallel)
     results = []
     results_lock = threading.Lock()
     
-    for i, account in enumerate(valid_accounts, 1):
-        log_message(f"\n[{i}/{len(valid_accounts)}] Processing account...")
-        process_account(account, results, results_lock)
-        log_message(f"✓ Completed account {i}/{len(valid_accounts)}")
+    # Browsers stay on the search form between accounts (see lookup_sessions)
+    with batch_sessions(AUTO_FETCH_SESSION_REUSE):
+        if AUTO_FETCH_MODE == 'sequential':
+            log_message("📌 Processing accounts sequentially (one at a time, not in parallel)")
+            log_message("⏱️  Wait time between accounts: 15 seconds")
+            log_message("=" * 60)
+        
+            for i, account in enumerate(valid_accounts, 1):
+                log_message(f"\n[{i}/{len(valid_accounts)}] Processing account...")
+                result = process_account(account, results, results_lock)
+                log_message(f"✓ Completed account {i}/{len(valid_accounts)}")
+            
+                # Wait 15 seconds before processing next account (except for the last one,
+                # and not after a skipped account or one whose lookups were all deferred - nothing was fetched)
+                if i < len(valid_accounts) and result and not result.get('deferred'):
+                    log_message("⏳ Waiting 15 seconds before processing next account...")
+                    time.sleep(15)
+                    log_message("✅ Wait complete, proceeding to next account\n")
+        else:
+            # Parallel: each site's limiter decides how many lookups run at once and
+            # adapts it to the site's latency and errors during the run
+            workers = max(1, min(len(valid_accounts), total_limit()))
+            log_message(f"📌 Processing accounts in parallel (adaptive concurrency, up to {workers} at once)")
+            log_message("=" * 60)
+        
+            def run_account(i, account):
+                log_message(f"\n[{i}/{len(valid_accounts)}] Processing account...")
+                process_account(account, results, results_lock)
+                log_message(f"✓ Completed account {i}/{len(valid_accounts)}")
         
-        # Wait 15 seconds before processing next account (except for the last one)
-        if i < len(valid_accounts):
-            log_message("⏳ Waiting 15 seconds before processing next account...")
-            time.sleep(15)
-            log_message("✅ Wait complete, proceeding to next account\n")
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='auto-fetch') as executor:
+                for future in [executor.submit(run_account, i, account) for i, account in enumerate(valid_accounts, 1)]:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        log_message(f"❌ Error processing account: {str(e)}")
+            log_message(f"📈 Concurrency limits at end of run: {current_limits()}")
+    
+    # One email per recipient for the whole run
+    if EMAIL_DIGEST:
+        queue_digest_emails(results)
+    
+    # Wait for queued emails to go out
+    outbox = get_outbox()
+    if outbox.pending():
+        log_message(f"📤 Waiting for {outbox.pending()} queued email(s) to be sent...")
+    outbox.flush()
     
     # Summary
     successful = sum(1 for r in results if r.get('success'))
-    failed = len(results) - successful
+    deferred = sum(1 for r in results if r.get('deferred'))
+    failed = len(results) - successful - deferred
     
     log_message("=" * 60)
-    log_message(f"✅ Completed: {successful} successful, {failed} failed out of {len(results)} total")
+    log_message(f"✅ Completed: {successful} successful, {failed} failed, {deferred} deferred out of {len(results)} total")
+    log_message(f"📧 Emails: {outbox.sent} sent, {outbox.failed} failed, {outbox.pending()} still queued for retry")
+    avoided = email_savings['batched'] + email_savings['unchanged']
+    if avoided:
+        log_message(f"📉 SMTP sends avoided: {avoided} "
+                    f"({email_savings['batched']} batched into digests, {email_savings['unchanged']} unchanged since last email)")
     log_message("=" * 60)
     log_message("")  # Empty line for readability
+    
+    if AUTO_FETCH_METRICS_FILE:
+        write_textfile(AUTO_FETCH_METRICS_FILE)
 
 if __name__ == '__main__':
     try:
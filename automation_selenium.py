@@ -2,37 +2,81 @@
 Web automation script using Selenium to extract toll balance and violations from E-ZPass NY website
 """
 import time
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
 import json
-from typing import Dict
+from typing import Dict, Optional
 import re
+from browser import LOCAL_ERRORS, launch_chrome, quit_chrome
+from toll_extraction import extract_ny_financials
+from ezpass_sites import NY_HOME_URL, NY_PAY_TOLL_URL
+from http_fetcher import capture_form_from_driver, try_http_fetch
+from fetch_timing import lap, track_fetch
+from selector_cache import selector_cache
+from circuit_breaker import LOCAL_ERROR, guarded_fetch, local_error_result
+from adaptive_limiter import limited_fetch
+from fetch_supervisor import supervised_fetch
+from tab_scheduler import run_in_tab, tab_mode_enabled
+from lookup_sessions import run_in_session, sessions_active
+from form_fill import fill_field
+from page_outcome import PageOutcome, OUTCOME_MESSAGES, page_text as current_page_text, wait_for_outcome
 
 
 class EZPassAutomation:
-    def __init__(self):
+    def __init__(self, driver=None):
+        """
+        Args:
+            driver: Browser (tab) to drive, owned by the caller (default: launch and quit a browser per lookup)
+        """
         self.account_number = None
         self.plate_number = None
         self.balance = None
         self.violations = []
         self.violation_count = 0
         self.driver = None
+        self._shared_driver = driver
+        # True while a reused session's browser is parked on the search form
+        self.form_ready = False
+
+    def _open_search_form(self):
+        """Load the homepage and then the Pay Toll search form"""
+        # Step 1: Navigate to homepage first
+        print("Navigating to E-ZPass NY homepage...")
+        try:
+            self.driver.get(NY_HOME_URL)
+            time.sleep(2)
+            print(f"✓ Homepage loaded: {self.driver.current_url}")
+        except Exception as e:
+            print(f"Warning: Could not load homepage: {str(e)}")
+        lap('homepage')
+        
+        # Step 2: Navigate to pay toll page
+        print("Navigating to Pay Toll page...")
+        try:
+            self.driver.get(NY_PAY_TOLL_URL)
+            time.sleep(3)
+            print(f"✓ Pay Toll page loaded: {self.driver.current_url}")
+        except Exception as e:
+            error_msg = str(e)
+            if 'ERR_ABORTED' in error_msg or 'net::' in error_msg:
+                raise Exception(
+                    "Unable to access E-ZPass NY website. The site appears to be blocking automated requests. "
+                    "This is a common security measure. Error: " + error_msg
+                )
+            raise Exception(f"Failed to load page: {error_msg}")
+        lap('pay_toll_page')
 
-    def login_and_extract(self, account_number: str, plate_number: str, headless: bool = False) -> Dict:
+    def login_and_extract(self, account_number: str, plate_number: str, headless: Optional[bool] = None) -> Dict:
         """
         Automate login and extract toll balance and violation information using Selenium
         
         Args:
             account_number: E-ZPass account number
             plate_number: License plate number
-            headless: Whether to run browser in headless mode
+            headless: Override the configured browser mode (None = BROWSER_MODE, True = headless, False = visible)
             
         Returns:
             Dictionary containing balance, violations, and other extracted data
@@ -41,121 +85,12 @@ class EZPassAutomation:
         self.plate_number = plate_number
         
         try:
-            # Setup Chrome options
-            chrome_options = Options()
-            if headless:
-                chrome_options.add_argument('--headless')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            chrome_options.add_argument('--start-maximized')
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            chrome_options.add_argument('user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            
-            print("Launching Chrome browser...")
-            # Use webdriver_manager to automatically handle ChromeDriver
-            import os
-            driver_path = ChromeDriverManager().install()
-            
-            # ChromeDriverManager sometimes returns the wrong file (e.g., THIRD_PARTY_NOTICES.chromedriver)
-            # We need to find the actual chromedriver executable
-            original_path = driver_path
-            valid_driver_found = False
-            
-            # Check if the returned path is actually the chromedriver executable
-            if os.path.isfile(driver_path):
-                file_size = os.path.getsize(driver_path)
-                # Real chromedriver binary should be > 10MB (typically ~15MB)
-                # Text files like THIRD_PARTY_NOTICES.chromedriver are < 1MB
-                if file_size >= 10000000:  # >= 10MB - this looks like the real executable
-                    valid_driver_found = True
-                    print(f"✅ ChromeDriverManager returned valid executable: {driver_path} ({file_size / 1024 / 1024:.1f}MB)")
-                else:
-                    # Too small - likely wrong file
-                    print(f"⚠️  ChromeDriverManager returned suspicious file: {driver_path} ({file_size / 1024 / 1024:.1f}MB)")
-            
-            # If we don't have a valid driver_path yet, search for it
-            if not valid_driver_found:
-                # Search directory (either the directory itself or parent of the wrong file)
-                if os.path.isdir(original_path):
-                    search_dir = original_path
-                elif os.path.isfile(original_path):
-                    search_dir = os.path.dirname(original_path)
-                else:
-                    # Fallback: search common locations
-                    search_dir = os.path.dirname(os.path.dirname(original_path)) if os.path.dirname(original_path) else "/Users/ghuman/.wdm/drivers/chromedriver"
-                
-                print(f"🔍 Searching for chromedriver executable in: {search_dir}")
-                chromedriver_found = False
-                
-                for root, dirs, files in os.walk(search_dir):
-                    for file in files:
-                        # Match EXACT filename 'chromedriver' (case-sensitive)
-                        # Ignore files like 'THIRD_PARTY_NOTICES.chromedriver'
-                        if file == 'chromedriver':
-                            candidate_path = os.path.join(root, file)
-                            # Verify it's executable and has reasonable size
-                            if os.path.isfile(candidate_path) and os.access(candidate_path, os.X_OK):
-                                file_size = os.path.getsize(candidate_path)
-                                # Real chromedriver binary should be > 10MB (typically ~15MB)
-                                if file_size >= 10000000:  # >= 10MB
-                                    driver_path = candidate_path
-                                    chromedriver_found = True
-                                    valid_driver_found = True
-                                    print(f"✅ Found chromedriver executable: {driver_path} ({file_size / 1024 / 1024:.1f}MB)")
-                                    break
-                    if chromedriver_found:
-                        break
-                
-                if not chromedriver_found:
-                    raise Exception(f"Could not find valid chromedriver executable in: {search_dir}")
-            
-            # Final validation
-            if not os.path.isfile(driver_path):
-                raise Exception(f"ChromeDriver executable not found at: {driver_path}")
-            
-            if not os.access(driver_path, os.X_OK):
-                raise Exception(f"ChromeDriver is not executable: {driver_path}")
-            
-            # Verify it's a real binary (should be > 10MB)
-            file_size = os.path.getsize(driver_path)
-            if file_size < 10000000:  # Less than 10MB is suspicious
-                raise Exception(f"ChromeDriver file seems too small ({file_size} bytes) - might be a text file, not binary: {driver_path}")
-            
-            print(f"🚀 Using ChromeDriver: {driver_path} ({file_size / 1024 / 1024:.1f}MB)")
-            
-            service = Service(driver_path)
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            
-            # Remove webdriver property
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            self.driver = self._shared_driver or launch_chrome(headless)
             
-            print(f"Browser launched (headless={headless})")
-            
-            # Step 1: Navigate to homepage first
-            print("Navigating to E-ZPass NY homepage...")
-            try:
-                self.driver.get('https://www.e-zpassny.com')
-                time.sleep(2)
-                print(f"✓ Homepage loaded: {self.driver.current_url}")
-            except Exception as e:
-                print(f"Warning: Could not load homepage: {str(e)}")
-            
-            # Step 2: Navigate to pay toll page
-            print("Navigating to Pay Toll page...")
-            try:
-                self.driver.get('https://www.e-zpassny.com/tbm/pay-toll')
-                time.sleep(3)
-                print(f"✓ Pay Toll page loaded: {self.driver.current_url}")
-            except Exception as e:
-                error_msg = str(e)
-                if 'ERR_ABORTED' in error_msg or 'net::' in error_msg:
-                    raise Exception(
-                        "Unable to access E-ZPass NY website. The site appears to be blocking automated requests. "
-                        "This is a common security measure. Error: " + error_msg
-                    )
-                raise Exception(f"Failed to load page: {error_msg}")
+            # A reused session is already on the search form (see lookup_sessions)
+            if not self.form_ready:
+                self._open_search_form()
+            self.form_ready = False
             
             # Step 3: Find and fill account number field
             print(f"Entering account number: {account_number}")
@@ -181,12 +116,14 @@ class EZPassAutomation:
                 (By.CSS_SELECTOR, 'input[type="text"]')
             ]
             
-            for by, selector in account_selectors:
+            # The strategy that worked last time is tried first (see selector_cache)
+            for (by, selector), timeout in selector_cache.candidates('NY', 'account_input', account_selectors, 3):
                 try:
-                    account_input = WebDriverWait(self.driver, 3).until(
+                    account_input = WebDriverWait(self.driver, timeout).until(
                         EC.presence_of_element_located((by, selector))
                     )
                     if account_input and account_input.is_displayed():
+                        selector_cache.record('NY', 'account_input', (by, selector))
                         break
                 except (TimeoutException, NoSuchElementException):
                     continue
@@ -207,16 +144,15 @@ class EZPassAutomation:
                 self.driver.save_screenshot('debug_account_input.png')
                 raise Exception("Could not find Account/Toll Bill/Violation Number input field")
             
-            # Enter account number
-            account_input.clear()
-            account_input.send_keys(account_number)
-            print(f"✓ Entered account number: {account_number}")
-            time.sleep(0.5)
+            # Enter account number (one script call; typed only if the site rejects it)
+            if fill_field(self.driver, account_input, account_number, 'NY'):
+                print(f"✓ Entered account number: {account_number}")
+            else:
+                print(f"⚠️  Account number may not have been entered: {account_number}")
             
             # Step 4: Press Tab to move to plate number field, then enter plate number
             print(f"Pressing Tab to move to plate number field...")
             account_input.send_keys(Keys.TAB)
-            time.sleep(0.5)
             
             # Get the currently focused element (should be the plate number field after Tab)
             plate_input = self.driver.switch_to.active_element
@@ -233,12 +169,13 @@ class EZPassAutomation:
                     (By.CSS_SELECTOR, 'input[name*="plate" i]')
                 ]
                 
-                for by, selector in plate_selectors:
+                for (by, selector), timeout in selector_cache.candidates('NY', 'plate_input', plate_selectors, 2):
                     try:
-                        plate_input = WebDriverWait(self.driver, 2).until(
+                        plate_input = WebDriverWait(self.driver, timeout).until(
                             EC.presence_of_element_located((by, selector))
                         )
                         if plate_input and plate_input.is_displayed():
+                            selector_cache.record('NY', 'plate_input', (by, selector))
                             break
                     except TimeoutException:
                         continue
@@ -258,10 +195,14 @@ class EZPassAutomation:
                 raise Exception("Could not find plate number input field")
             
             # Enter plate number
-            plate_input.clear()
-            plate_input.send_keys(plate_number)
-            print(f"✓ Entered plate number: {plate_number}")
-            time.sleep(0.5)
+            if fill_field(self.driver, plate_input, plate_number, 'NY'):
+                print(f"✓ Entered plate number: {plate_number}")
+            else:
+                print(f"⚠️  Plate number may not have been entered: {plate_number}")
+            
+            # Remember the form so later lookups can skip the browser
+            capture_form_from_driver('NY', self.driver, account_input, plate_input)
+            lap('form_fill')
             
             # Step 5: Submit form
             # Based on the form: "SEARCH" button
@@ -285,16 +226,18 @@ class EZPassAutomation:
                 (By.CSS_SELECTOR, 'button.btn')
             ]
             
-            for by, selector in submit_selectors:
+            for (by, selector), timeout in selector_cache.candidates('NY', 'submit_button', submit_selectors, 2):
                 try:
-                    submit_button = WebDriverWait(self.driver, 2).until(
+                    submit_button = WebDriverWait(self.driver, timeout).until(
                         EC.element_to_be_clickable((by, selector))
                     )
                     if submit_button and submit_button.is_displayed():
+                        selector_cache.record('NY', 'submit_button', (by, selector))
                         break
                 except TimeoutException:
                     continue
             
+            form_page_text = current_page_text(self.driver)
             if submit_button:
                 submit_button.click()
                 print("✓ Form submitted (SEARCH button clicked)")
@@ -302,273 +245,60 @@ class EZPassAutomation:
                 # Try pressing Enter on plate input as fallback
                 plate_input.send_keys(Keys.RETURN)
                 print("✓ Pressed Enter to submit")
+            lap('submit')
             
-            # Wait for page to load data (give ample time for results to render)
+            # Wait for the results (or a block / not-found / invalid-input page) to render
             post_submit_wait = 15
-            print(f"Waiting {post_submit_wait} seconds for results to load...")
-            time.sleep(post_submit_wait)
+            print(f"Waiting up to {post_submit_wait} seconds for results to load...")
+            outcome, _ = wait_for_outcome(self.driver, 'NY', post_submit_wait, stale_text=form_page_text)
+            lap('results_wait')
+            if outcome.is_failure:
+                return {
+                    'success': False,
+                    'error': OUTCOME_MESSAGES[outcome],
+                    'outcome': outcome.value,
+                    'account_number': account_number,
+                    'plate_number': plate_number
+                }
             
             # Step 6: Extract all financial information from the page
-            print("Extracting financial information...")
-            
-            # Get all text from the page
             page_text = ""
-            all_dollar_amounts = []
-            violations = []
-            violation_count = 0
-            toll_entries = []
-            
             try:
                 page_text = self.driver.find_element(By.TAG_NAME, 'body').text
             except:
                 pass
             
-            # Find all dollar amounts on the page
-            dollar_pattern = r'\$[\s]*([\d,]+\.?\d*)'
-            all_matches = re.findall(dollar_pattern, page_text)
-            for match in all_matches:
-                try:
-                    amount = float(match.replace(',', ''))
-                    all_dollar_amounts.append(amount)
-                except:
-                    pass
-            
-            # Extract from tables - more comprehensive
+            table_rows = []
             try:
-                tables = self.driver.find_elements(By.TAG_NAME, 'table')
-                for table in tables:
-                    rows = table.find_elements(By.TAG_NAME, 'tr')
-                    for row in rows:
-                        row_text = row.text.strip()
-                        row_lower = row_text.lower()
-                        
-                        if not row_text:
-                            continue
-                        
-                        # Look for balance/total amounts
-                        if '$' in row_text and ('balance' in row_lower or 'total' in row_lower or 'due' in row_lower or 'amount due' in row_lower):
-                            # Extract amount
-                            matches = re.findall(dollar_pattern, row_text)
-                            if matches:
-                                try:
-                                    amount = float(matches[0].replace(',', ''))
-                                    all_dollar_amounts.append(amount)
-                                except:
-                                    pass
-                        
-                        # Look for toll charges
-                        if '$' in row_text and ('toll' in row_lower or 'charge' in row_lower or 'invoice' in row_lower or 'fee' in row_lower):
-                            toll_entries.append(row_text)
-                            matches = re.findall(dollar_pattern, row_text)
-                            for match in matches:
-                                try:
-                                    amount = float(match.replace(',', ''))
-                                    all_dollar_amounts.append(amount)
-                                except:
-                                    pass
-                        
-                        # Look for violations
-                        if 'violation' in row_lower:
-                            violations.append(row_text)
-                            # Try to extract violation number
-                            violation_num_match = re.search(r'violation[s]?\s*#?\s*:?\s*(\d+)', row_lower)
-                            if violation_num_match:
-                                violation_count = max(violation_count, int(violation_num_match.group(1)))
+                for table in self.driver.find_elements(By.TAG_NAME, 'table'):
+                    table_rows.extend(row.text for row in table.find_elements(By.TAG_NAME, 'tr'))
             except Exception as e:
                 print(f"Error extracting from tables: {str(e)}")
             
-            # Look for violation count in page text
-            if 'violation' in page_text.lower():
-                violation_patterns = [
-                    r'violation[s]?\s*:?\s*(\d+)',
-                    r'(\d+)\s*violation[s]?',
-                    r'violation\s*count[:\s]*(\d+)',
-                    r'total\s*violation[s]?\s*:?\s*(\d+)'
-                ]
-                for pattern in violation_patterns:
-                    match = re.search(pattern, page_text, re.IGNORECASE)
-                    if match:
-                        violation_count = max(violation_count, int(match.group(1)))
-            
-            # Calculate total balance due - look for specific "due" or "total" amounts first
-            total_balance_due = 0.0
-            balance_amount = 0.0
-            toll_charges_total = 0.0
-            
-            # First, look for explicit "Total Due", "Amount Due", "Balance Due" text
-            due_patterns = [
-                r'total\s+(?:amount\s+)?due[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'amount\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'balance\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'total\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'outstanding\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)'
-            ]
-            
-            for pattern in due_patterns:
-                match = re.search(pattern, page_text, re.IGNORECASE)
-                if match:
-                    try:
-                        total_balance_due = float(match.group(1).replace(',', ''))
-                        print(f"Found explicit balance due: ${total_balance_due:.2f}")
-                        break
-                    except:
-                        pass
-            
-            # Extract toll bill numbers and sum toll charges
-            toll_bill_numbers = []
-            for entry in toll_entries:
-                # Extract bill numbers from toll entries
-                # Look for patterns like "Bill #12345", "Invoice: ABC123", "Toll Bill: 123456", etc.
-                bill_patterns = [
-                    r'(?:bill|invoice|toll\s*bill)[\s#:]*([A-Z0-9-]+)',
-                    r'\b([A-Z]{2,}\d{4,}|\d{6,})\b',  # Alphanumeric codes or long numbers
-                    r'bill\s*(?:number|#)?\s*:?\s*([A-Z0-9-]+)',
-                ]
-                
-                for pattern in bill_patterns:
-                    bill_match = re.search(pattern, entry, re.IGNORECASE)
-                    if bill_match and bill_match.group(1):
-                        bill_num = bill_match.group(1).strip()
-                        if bill_num not in toll_bill_numbers:
-                            toll_bill_numbers.append(bill_num)
-                        break
-                
-                # Sum toll charges
-                matches = re.findall(dollar_pattern, entry)
-                for match in matches:
-                    try:
-                        amount = float(match.replace(',', ''))
-                        toll_charges_total += amount
-                    except:
-                        pass
-            
-            # If no explicit "due" found, calculate from components
-            if total_balance_due == 0:
-                # Look for account balance separately
-                balance_patterns = [
-                    r'account\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)',
-                    r'balance[:\s]*\$?\s*([\d,]+\.?\d*)',
-                ]
-                
-                for pattern in balance_patterns:
-                    match = re.search(pattern, page_text, re.IGNORECASE)
-                    if match:
-                        try:
-                            balance_amount = float(match.group(1).replace(',', ''))
-                            print(f"Found account balance: ${balance_amount:.2f}")
-                            break
-                        except:
-                            pass
-                
-                # If still no balance found, use the largest amount found
-                if balance_amount == 0 and all_dollar_amounts:
-                    # Filter out very small amounts (likely not the balance)
-                    significant_amounts = [a for a in all_dollar_amounts if a > 1.0]
-                    if significant_amounts:
-                        balance_amount = max(significant_amounts)
-                        print(f"Using largest amount found as balance: ${balance_amount:.2f}")
-                
-                # Use balance_amount as total_balance_due
-                # Don't add toll_charges_total because it's likely already included in balance_amount
-                # The toll_charges_total is extracted from individual entries, which may duplicate the balance
-                total_balance_due = balance_amount
-                if toll_charges_total > 0 and toll_charges_total != balance_amount:
-                    # Only add if they're different (toll_charges might be separate pending charges)
-                    # But if they're the same, it's likely the same amount being counted twice
-                    print(f"⚠️  Note: balance_amount (${balance_amount:.2f}) and toll_charges_total (${toll_charges_total:.2f}) are different")
-                    # Use the larger of the two, as toll_charges might be additional pending charges
-                    total_balance_due = max(balance_amount, toll_charges_total)
-                else:
-                    print(f"ℹ️  Using balance_amount (${balance_amount:.2f}) as total_balance_due (toll_charges likely included)")
-            else:
-                # If we found explicit total_balance_due, check for separate account balance
-                # Account balance is more reliable than "Total Balance Due" which might include pending charges
-                balance_patterns = [
-                    r'account\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)',
-                ]
-                
-                for pattern in balance_patterns:
-                    match = re.search(pattern, page_text, re.IGNORECASE)
-                    if match:
-                        try:
-                            account_balance = float(match.group(1).replace(',', ''))
-                            print(f"Found account balance: ${account_balance:.2f}")
-                            # Prioritize account balance if it's reasonable (not 0 and not way larger than total_balance_due)
-                            # Account balance is usually the actual balance due
-                            if account_balance > 0 and account_balance <= total_balance_due * 1.5:
-                                balance_amount = account_balance
-                                print(f"✅ Using account balance (${account_balance:.2f}) as it's more reliable than total_balance_due (${total_balance_due:.2f})")
-                            else:
-                                # Account balance seems wrong, use total_balance_due
-                                balance_amount = total_balance_due
-                                print(f"⚠️  Account balance (${account_balance:.2f}) seems incorrect, using total_balance_due (${total_balance_due:.2f})")
-                            break
-                        except:
-                            pass
-                
-                # If balance_amount not found separately, use total_balance_due
-                if balance_amount == 0:
-                    # If we have total_balance_due, use it as balance_amount
-                    balance_amount = total_balance_due
-                    print(f"Using total_balance_due as balance_amount: ${balance_amount:.2f}")
-            
-            # If no amounts found, try to find any text with "balance" or "due"
-            if total_balance_due == 0:
-                try:
-                    # Look for balance/due text elements
-                    balance_elements = self.driver.find_elements(By.XPATH, '//*[contains(text(), "Balance") or contains(text(), "Due") or contains(text(), "$")]')
-                    for elem in balance_elements:
-                        text = elem.text
-                        if '$' in text:
-                            matches = re.findall(dollar_pattern, text)
-                            for match in matches:
-                                try:
-                                    amount = float(match.replace(',', ''))
-                                    if amount > total_balance_due:
-                                        total_balance_due = amount
-                                except:
-                                    pass
-                except:
-                    pass
+            def balance_texts():
+                """Texts of elements mentioning Balance/Due/$ (last-resort balance search)"""
+                elements = self.driver.find_elements(By.XPATH, '//*[contains(text(), "Balance") or contains(text(), "Due") or contains(text(), "$")]')
+                return [elem.text for elem in elements]
+            
+            extracted = extract_ny_financials(page_text, table_rows, balance_texts)
+            total_balance_due = extracted['total_balance_due']
+            balance_amount = extracted['balance_amount']
+            final_balance = extracted['final_balance']
+            toll_charges_total = extracted['toll_charges_total']
+            toll_bill_numbers = extracted['toll_bill_numbers']
+            violation_count = extracted['violation_count']
+            violations = extracted['violations']
+            toll_entries = extracted['toll_entries']
+            lap('extract')
             
             # Take screenshot
             self.driver.save_screenshot('debug_after_login.png')
-            
-            # Determine final balance
-            # Priority: explicit total_balance_due > balance_amount > largest amount on page
-            if total_balance_due > 0:
-                # If we found explicit total_balance_due, use it
-                # But if balance_amount is different and smaller, it might be the actual account balance
-                # Check if they're close (within 10%) - if so, use the explicit total_balance_due
-                if balance_amount > 0:
-                    diff_percent = abs(total_balance_due - balance_amount) / max(total_balance_due, balance_amount) * 100
-                    if diff_percent < 10:  # Within 10% of each other
-                        # They're likely the same amount, use the explicit total_balance_due
-                        final_balance = total_balance_due
-                        print(f"ℹ️  Using explicit total_balance_due (${total_balance_due:.2f}) - balance_amount (${balance_amount:.2f}) is similar")
-                    else:
-                        # They're different - use the explicit total_balance_due (it's the "total due")
-                        final_balance = total_balance_due
-                        print(f"ℹ️  Using explicit total_balance_due (${total_balance_due:.2f}) - differs from balance_amount (${balance_amount:.2f})")
-                else:
-                    final_balance = total_balance_due
-            elif balance_amount > 0:
-                final_balance = balance_amount
-            else:
-                # Last resort: try to find any large amount on the page
-                if all_dollar_amounts:
-                    significant_amounts = [a for a in all_dollar_amounts if a > 10.0]  # Filter small amounts
-                    if significant_amounts:
-                        final_balance = max(significant_amounts)
-                        print(f"Using largest significant amount found: ${final_balance:.2f}")
-                    else:
-                        final_balance = 0.0
-                else:
-                    final_balance = 0.0
+            lap('screenshot')
             
             # Format results clearly
             result = {
                 'success': True,
+                'outcome': outcome.value,
                 'account_number': account_number,
                 'plate_number': plate_number,
                 'total_balance_due': round(total_balance_due, 2),
@@ -611,35 +341,96 @@ class EZPassAutomation:
             except:
                 pass
             
-            return {
+            result = {
                 'success': False,
                 'error': error_msg,
                 'account_number': account_number,
                 'plate_number': plate_number
             }
+            if isinstance(e, LOCAL_ERRORS):
+                result['outcome'] = LOCAL_ERROR
+            return result
         finally:
             # Clean up
-            if self.driver:
-                try:
-                    self.driver.quit()
-                except:
-                    pass
+            if self.driver and not self._shared_driver:
+                quit_chrome(self.driver)
 
+    def _form_showing(self, wait: float = 0) -> bool:
+        """True if the search form's account field is displayed (within `wait` seconds)"""
+        locator = selector_cache.get('NY', 'account_input')
+        if not locator:
+            return False
+        try:
+            WebDriverWait(self.driver, wait).until(EC.visibility_of_element_located(tuple(locator)))
+            return True
+        except (TimeoutException, NoSuchElementException):
+            return False
 
-def extract_toll_info(account_number: str, plate_number: str, headless: bool = False) -> Dict:
+    def return_to_form(self) -> bool:
+        """
+        Get back to the search form after a lookup, ready for the next account (session reuse)
+        
+        Stays on the page if the results rendered next to the form, otherwise goes back in
+        the history and, if the site doesn't allow that, loads the Pay Toll page directly.
+        
+        Returns:
+            True if the search form is showing
+        """
+        try:
+            if self._form_showing():
+                return True
+            self.driver.back()
+            if self._form_showing(5):
+                return True
+            print("Search form not restored by going back - reloading the Pay Toll page...")
+            self.driver.get(NY_PAY_TOLL_URL)
+            return self._form_showing(10)
+        except Exception as e:
+            print(f"⚠️  Could not return to the search form: {str(e)}")
+            return False
+
+
+def extract_toll_info(account_number: str, plate_number: str, headless: Optional[bool] = None) -> Dict:
     """
-    Convenience function to extract toll information using Selenium
+    Convenience function to extract toll information
+    
+    Tries the plain HTTP path first (see http_fetcher) and falls back to Selenium.
+    While the NY site is refusing lookups, returns a `deferred` result without
+    fetching (see circuit_breaker). Concurrent lookups wait for the site's adaptive
+    concurrency limit (see adaptive_limiter), and a fetch that runs past FETCH_DEADLINE
+    is cancelled with a `timeout` result (see fetch_supervisor). With BROWSER_TABS > 1
+    the Selenium lookup runs in a tab of a shared browser (see tab_scheduler). Inside
+    batch_sessions() it reuses a browser parked on the search form (see lookup_sessions).
     
     Args:
         account_number: E-ZPass account number
         plate_number: License plate number
-        headless: Whether to run browser in headless mode
+        headless: Override the configured browser mode (None = BROWSER_MODE, True = headless, False = visible)
         
     Returns:
-        Dictionary with extracted information
+        Dictionary with extracted information, including per-stage `timings` (see fetch_timing)
     """
-    automation = EZPassAutomation()
-    return automation.login_and_extract(account_number, plate_number, headless)
+    def fetch():
+        with track_fetch('NY') as timer:
+            result = try_http_fetch('NY', account_number=account_number, plate_number=plate_number)
+            if result is None:
+                def lookup(automation):
+                    return automation.login_and_extract(account_number, plate_number, headless)
+                try:
+                    if sessions_active():
+                        result = run_in_session('NY', EZPassAutomation, lookup, headless)
+                    elif tab_mode_enabled():
+                        result = run_in_tab(lambda tab: lookup(EZPassAutomation(tab)), headless)
+                    else:
+                        result = lookup(EZPassAutomation())
+                except LOCAL_ERRORS as e:
+                    print(f"⚠️  NY lookup could not start: {str(e)}")
+                    result = local_error_result('NY', e, account_number=account_number, plate_number=plate_number)
+            return timer.attach(result)
+
+    # Circuit breaker -> adaptive concurrency limit -> hard deadline -> fetch
+    return guarded_fetch('NY', lambda: limited_fetch('NY', lambda: supervised_fetch('NY', fetch)),
+                         account_number=account_number, plate_number=plate_number)
 
 
 if __name__ == '__main__':
@@ -653,7 +444,7 @@ if __name__ == '__main__':
     
     account = sys.argv[1]
     plate = sys.argv[2]
-    headless_mode = sys.argv[3].lower() == 'true' if len(sys.argv) > 3 else False
+    headless_mode = sys.argv[3].lower() == 'true' if len(sys.argv) > 3 else None
     
     result = extract_toll_info(account, plate, headless_mode)
     print(json.dumps(result, indent=2))
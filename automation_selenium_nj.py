@@ -2,22 +2,35 @@
 Web automation script using Selenium to extract toll balance and violations from E-ZPass NJ website
 """
 import time
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
 import json
-from typing import Dict
+from typing import Dict, Optional
 import re
+from browser import LOCAL_ERRORS, launch_chrome, quit_chrome
+from toll_extraction import extract_nj_violation_info
+from ezpass_sites import NJ_HOME_URL
+from http_fetcher import capture_form_from_driver, try_http_fetch
+from fetch_timing import lap, track_fetch
+from selector_cache import selector_cache
+from circuit_breaker import LOCAL_ERROR, guarded_fetch, local_error_result
+from adaptive_limiter import limited_fetch
+from fetch_supervisor import supervised_fetch
+from tab_scheduler import run_in_tab, tab_mode_enabled
+from lookup_sessions import run_in_session, sessions_active
+from form_fill import fill_field, field_value
+from page_outcome import PageOutcome, OUTCOME_MESSAGES, page_text as current_page_text, wait_for_outcome
 
 
 class EZPassNJAutomation:
-    def __init__(self):
+    def __init__(self, driver=None):
+        """
+        Args:
+            driver: Browser (tab) to drive, owned by the caller (default: launch and quit a browser per lookup)
+        """
         self.account_number = None
         self.plate_number = None
         self.violation_number = None
@@ -25,9 +38,12 @@ class EZPassNJAutomation:
         self.violations = []
         self.violation_count = 0
         self.driver = None
+        self._shared_driver = driver
+        # True while a reused session's browser is parked on the violation form
+        self.form_ready = False
 
     def login_and_extract(self, account_number: str = None, plate_number: str = None, 
-                         violation_number: str = None, headless: bool = False) -> Dict:
+                         violation_number: str = None, headless: Optional[bool] = None) -> Dict:
         """
         Automate login and extract toll balance and violation information using Selenium
         
@@ -35,7 +51,7 @@ class EZPassNJAutomation:
             account_number: E-ZPass account number (optional)
             plate_number: License plate number (required)
             violation_number: Violation/Invoice number (optional, for violation lookup)
-            headless: Whether to run browser in headless mode
+            headless: Override the configured browser mode (None = BROWSER_MODE, True = headless, False = visible)
             
         Returns:
             Dictionary containing balance, violations, and other extracted data
@@ -45,107 +61,19 @@ class EZPassNJAutomation:
         self.violation_number = violation_number
         
         try:
-            # Setup Chrome options
-            chrome_options = Options()
-            if headless:
-                chrome_options.add_argument('--headless')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            chrome_options.add_argument('--start-maximized')
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            chrome_options.add_argument('user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            
-            print("Launching Chrome browser...")
-            # Use webdriver_manager to automatically handle ChromeDriver
-            import os
-            driver_path = ChromeDriverManager().install()
-            
-            # ChromeDriverManager sometimes returns the wrong file (e.g., THIRD_PARTY_NOTICES.chromedriver)
-            # We need to find the actual chromedriver executable
-            original_path = driver_path
-            valid_driver_found = False
-            
-            # Check if the returned path is actually the chromedriver executable
-            if os.path.isfile(driver_path):
-                file_size = os.path.getsize(driver_path)
-                # Real chromedriver binary should be > 10MB (typically ~15MB)
-                # Text files like THIRD_PARTY_NOTICES.chromedriver are < 1MB
-                if file_size >= 10000000:  # >= 10MB - this looks like the real executable
-                    valid_driver_found = True
-                    print(f"✅ ChromeDriverManager returned valid executable: {driver_path} ({file_size / 1024 / 1024:.1f}MB)")
-                else:
-                    # Too small - likely wrong file
-                    print(f"⚠️  ChromeDriverManager returned suspicious file: {driver_path} ({file_size / 1024 / 1024:.1f}MB)")
+            self.driver = self._shared_driver or launch_chrome(headless)
             
-            # If we don't have a valid driver_path yet, search for it
-            if not valid_driver_found:
-                # Search directory (either the directory itself or parent of the wrong file)
-                if os.path.isdir(original_path):
-                    search_dir = original_path
-                elif os.path.isfile(original_path):
-                    search_dir = os.path.dirname(original_path)
-                else:
-                    # Fallback: search common locations
-                    search_dir = os.path.dirname(os.path.dirname(original_path)) if os.path.dirname(original_path) else "/Users/ghuman/.wdm/drivers/chromedriver"
-                
-                print(f"🔍 Searching for chromedriver executable in: {search_dir}")
-                chromedriver_found = False
-                
-                for root, dirs, files in os.walk(search_dir):
-                    for file in files:
-                        # Match EXACT filename 'chromedriver' (case-sensitive)
-                        # Ignore files like 'THIRD_PARTY_NOTICES.chromedriver'
-                        if file == 'chromedriver':
-                            candidate_path = os.path.join(root, file)
-                            # Verify it's executable and has reasonable size
-                            if os.path.isfile(candidate_path) and os.access(candidate_path, os.X_OK):
-                                file_size = os.path.getsize(candidate_path)
-                                # Real chromedriver binary should be > 10MB (typically ~15MB)
-                                if file_size >= 10000000:  # >= 10MB
-                                    driver_path = candidate_path
-                                    chromedriver_found = True
-                                    valid_driver_found = True
-                                    print(f"✅ Found chromedriver executable: {driver_path} ({file_size / 1024 / 1024:.1f}MB)")
-                                    break
-                    if chromedriver_found:
-                        break
-                
-                if not chromedriver_found:
-                    raise Exception(f"Could not find valid chromedriver executable in: {search_dir}")
-            
-            # Final validation
-            if not os.path.isfile(driver_path):
-                raise Exception(f"ChromeDriver executable not found at: {driver_path}")
-            
-            if not os.access(driver_path, os.X_OK):
-                raise Exception(f"ChromeDriver is not executable: {driver_path}")
-            
-            # Verify it's a real binary (should be > 10MB)
-            file_size = os.path.getsize(driver_path)
-            if file_size < 10000000:  # Less than 10MB is suspicious
-                raise Exception(f"ChromeDriver file seems too small ({file_size} bytes) - might be a text file, not binary: {driver_path}")
-            
-            print(f"🚀 Using ChromeDriver: {driver_path} ({file_size / 1024 / 1024:.1f}MB)")
-            
-            service = Service(driver_path)
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            
-            # Remove webdriver property
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            
-            print(f"Browser launched (headless={headless})")
-            
-            # Navigate to E-ZPass NJ homepage
-            print("Navigating to E-ZPass NJ homepage...")
-            try:
-                self.driver.get('https://www.ezpassnj.com/en/home/index.shtml')
-                time.sleep(2)
-                print("✓ Homepage loaded: https://www.ezpassnj.com/en/home/index.shtml")
-            except Exception as e:
-                print(f"⚠️  Error loading homepage: {str(e)}")
-                return self._create_error_result("Failed to load E-ZPass NJ website")
+            # Navigate to E-ZPass NJ homepage (a reused session is already on the form)
+            if not self.form_ready:
+                print("Navigating to E-ZPass NJ homepage...")
+                try:
+                    self.driver.get(NJ_HOME_URL)
+                    time.sleep(2)
+                    print(f"✓ Homepage loaded: {NJ_HOME_URL}")
+                    lap('homepage')
+                except Exception as e:
+                    print(f"⚠️  Error loading homepage: {str(e)}")
+                    return self._create_error_result("Failed to load E-ZPass NJ website")
             
             # Check if we have violation number or account number
             if violation_number and plate_number:
@@ -159,65 +87,86 @@ class EZPassNJAutomation:
             print(f"Error during automation: {str(e)}")
             import traceback
             traceback.print_exc()
-            return self._create_error_result(str(e))
+            result = self._create_error_result(str(e))
+            if isinstance(e, LOCAL_ERRORS):
+                result['outcome'] = LOCAL_ERROR
+            return result
         finally:
-            if self.driver:
-                try:
-                    self.driver.quit()
-                except:
-                    pass
+            if self.driver and not self._shared_driver:
+                quit_chrome(self.driver)
 
-    def _fetch_violation_info(self, violation_number: str, plate_number: str) -> Dict:
-        """Fetch violation/invoice information"""
+    def _open_violation_form(self) -> Optional[Dict]:
+        """
+        Open the Invoice/Violation form from the homepage (switching into its iframe)
+        
+        Returns:
+            An error result if the site refused, None once the form is open
+        """
+        print("Looking for Invoice/Violation payment section...")
+        
+        # Look for the violation/invoice payment link or modal
+        print("Searching for Invoice/Violation payment option...")
         try:
-            print("Looking for Invoice/Violation payment section...")
-            
-            # Look for the violation/invoice payment link or modal
-            print("Searching for Invoice/Violation payment option...")
+            # Try to find and click "Invoice / Violations / Toll-by-Plate" link
+            violation_link = WebDriverWait(self.driver, 15).until(
+                EC.element_to_be_clickable((By.LINK_TEXT, "Invoice / Violations / Toll-by-Plate"))
+            )
+            self.driver.execute_script("arguments[0].click();", violation_link)
+            print("✓ Clicked Invoice/Violation link")
+            time.sleep(3)
+        except:
+            # Try alternative selectors
             try:
-                # Try to find and click "Invoice / Violations / Toll-by-Plate" link
-                violation_link = WebDriverWait(self.driver, 15).until(
-                    EC.element_to_be_clickable((By.LINK_TEXT, "Invoice / Violations / Toll-by-Plate"))
+                violation_link = WebDriverWait(self.driver, 10).until(
+                    EC.presence_of_element_located((By.PARTIAL_LINK_TEXT, "Invoice"))
                 )
                 self.driver.execute_script("arguments[0].click();", violation_link)
-                print("✓ Clicked Invoice/Violation link")
+                print("✓ Clicked Invoice link (alternative)")
                 time.sleep(3)
             except:
-                # Try alternative selectors
+                # Try finding by text content
                 try:
-                    violation_link = WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.PARTIAL_LINK_TEXT, "Invoice"))
-                    )
-                    self.driver.execute_script("arguments[0].click();", violation_link)
-                    print("✓ Clicked Invoice link (alternative)")
-                    time.sleep(3)
-                except:
-                    # Try finding by text content
-                    try:
-                        all_links = self.driver.find_elements(By.TAG_NAME, 'a')
-                        for link in all_links:
-                            link_text = link.text.lower()
-                            if 'invoice' in link_text or 'violation' in link_text:
-                                self.driver.execute_script("arguments[0].click();", link)
-                                print("✓ Clicked Invoice link (by text)")
-                                time.sleep(3)
-                                break
-                    except Exception as e:
-                        print(f"⚠️  Could not find violation link: {str(e)}")
-            
-            # Wait for modal/form to appear
-            print("Waiting for violation form to appear...")
-            time.sleep(8)  # Give more time for modal to load
-            
-            # Check for iframes
-            try:
-                iframes = self.driver.find_elements(By.TAG_NAME, 'iframe')
-                if iframes:
-                    print(f"Found {len(iframes)} iframe(s), switching to first one...")
-                    self.driver.switch_to.frame(iframes[0])
-                    time.sleep(2)
-            except Exception as e:
-                print(f"No iframe found or error switching: {str(e)}")
+                    all_links = self.driver.find_elements(By.TAG_NAME, 'a')
+                    for link in all_links:
+                        link_text = link.text.lower()
+                        if 'invoice' in link_text or 'violation' in link_text:
+                            self.driver.execute_script("arguments[0].click();", link)
+                            print("✓ Clicked Invoice link (by text)")
+                            time.sleep(3)
+                            break
+                except Exception as e:
+                    print(f"⚠️  Could not find violation link: {str(e)}")
+        
+        # Wait for modal/form to appear
+        print("Waiting for violation form to appear...")
+        def form_visible():
+            return (bool(self.driver.find_elements(By.TAG_NAME, 'iframe')) or
+                    len(self.driver.find_elements(By.CSS_SELECTOR, 'input[type="text"]')) >= 2)
+        outcome, _ = wait_for_outcome(self.driver, 'NJ', 8, ready=form_visible)
+        if outcome.is_failure:
+            return self._create_error_result(OUTCOME_MESSAGES[outcome], outcome)
+        
+        # Check for iframes
+        try:
+            iframes = self.driver.find_elements(By.TAG_NAME, 'iframe')
+            if iframes:
+                print(f"Found {len(iframes)} iframe(s), switching to first one...")
+                self.driver.switch_to.frame(iframes[0])
+                time.sleep(2)
+        except Exception as e:
+            print(f"No iframe found or error switching: {str(e)}")
+        lap('open_violation_form')
+        return None
+
+    def _fetch_violation_info(self, violation_number: str, plate_number: str) -> Dict:
+        """Fetch violation/invoice information"""
+        try:
+            # A reused session is already on the violation form (see lookup_sessions)
+            if not self.form_ready:
+                error_result = self._open_violation_form()
+                if error_result:
+                    return error_result
+            self.form_ready = False
             
             # Find the violation/invoice input fields
             print("Entering violation number and plate number...")
@@ -237,15 +186,17 @@ class EZPassNJAutomation:
                 ('input[type="text"]', None),  # Will find both by position
             ]
             
-            for notice_sel, tag_sel in input_selectors:
+            # The pair that worked last time is tried first (see selector_cache)
+            for (notice_sel, tag_sel), timeout in selector_cache.candidates('NJ', 'violation_inputs', input_selectors, 5):
                 try:
                     if tag_sel:
-                        violation_input = WebDriverWait(self.driver, 5).until(
+                        violation_input = WebDriverWait(self.driver, timeout).until(
                             EC.presence_of_element_located((By.CSS_SELECTOR, notice_sel))
                         )
                         plate_input = self.driver.find_element(By.CSS_SELECTOR, tag_sel)
                         if violation_input and plate_input:
                             print(f"✓ Found inputs using selector: {notice_sel}")
+                            selector_cache.record('NJ', 'violation_inputs', (notice_sel, tag_sel))
                             break
                     else:
                         # Find all text inputs and use by position
@@ -254,6 +205,7 @@ class EZPassNJAutomation:
                             violation_input = all_text_inputs[0]
                             plate_input = all_text_inputs[1]
                             print("✓ Found inputs by position (first two text inputs)")
+                            selector_cache.record('NJ', 'violation_inputs', (notice_sel, tag_sel))
                             break
                 except Exception as e:
                     continue
@@ -313,84 +265,25 @@ class EZPassNJAutomation:
                     print(f"Error finding inputs: {str(e)}")
             
             if violation_input and plate_input:
-                # Make inputs visible and interactable
-                try:
-                    self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", violation_input)
-                    time.sleep(1)
-                    # Make sure inputs are enabled
-                    self.driver.execute_script("arguments[0].removeAttribute('readonly');", violation_input)
-                    self.driver.execute_script("arguments[0].removeAttribute('disabled');", violation_input)
-                except:
-                    pass
+                # Set each value and fire the form's input/change events in one script call;
+                # typed key by key only if the site rejects it (see form_fill)
+                print(f"Attempting to enter violation number: {violation_number}")
+                if fill_field(self.driver, violation_input, violation_number, 'NJ', unlock=True):
+                    print(f"✓ Entered violation number: {field_value(violation_input)}")
+                else:
+                    print(f"⚠️  Violation number may not have been entered: {field_value(violation_input) or 'empty'}")
                 
-                # Enter violation number using JavaScript first (more reliable)
-                try:
-                    print(f"Attempting to enter violation number: {violation_number}")
-                    # Click to focus
-                    violation_input.click()
-                    time.sleep(0.5)
-                    # Clear using JavaScript
-                    self.driver.execute_script("arguments[0].value = '';", violation_input)
-                    time.sleep(0.3)
-                    # Set value using JavaScript
-                    self.driver.execute_script(f"arguments[0].value = '{violation_number}';", violation_input)
-                    time.sleep(0.3)
-                    # Also try typing (in case there are event handlers)
-                    violation_input.clear()
-                    violation_input.send_keys(violation_number)
-                    time.sleep(0.5)
-                    
-                    # Verify it was entered
-                    entered_value = violation_input.get_attribute('value')
-                    if entered_value:
-                        print(f"✓ Entered violation number: {entered_value}")
-                    else:
-                        print(f"⚠️  Violation number may not have been entered. Trying alternative method...")
-                        # Try alternative: select all and type
-                        violation_input.send_keys(Keys.CONTROL + 'a')
-                        violation_input.send_keys(violation_number)
-                        time.sleep(0.5)
-                        entered_value = violation_input.get_attribute('value')
-                        print(f"✓ Entered violation number (retry): {entered_value or 'unknown'}")
-                except Exception as e:
-                    print(f"Error entering violation number: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                print(f"Attempting to enter plate number: {plate_number}")
+                if fill_field(self.driver, plate_input, plate_number, 'NJ'):
+                    print(f"✓ Entered plate number: {field_value(plate_input)}")
+                else:
+                    print(f"⚠️  Plate number may not have been entered: {field_value(plate_input) or 'empty'}")
                 
-                # Enter plate number
-                try:
-                    print(f"Attempting to enter plate number: {plate_number}")
-                    # Click to focus
-                    plate_input.click()
-                    time.sleep(0.5)
-                    # Clear using JavaScript
-                    self.driver.execute_script("arguments[0].value = '';", plate_input)
-                    time.sleep(0.3)
-                    # Set value using JavaScript
-                    self.driver.execute_script(f"arguments[0].value = '{plate_number}';", plate_input)
-                    time.sleep(0.3)
-                    # Also try typing
-                    plate_input.clear()
-                    plate_input.send_keys(plate_number)
-                    time.sleep(0.5)
-                    
-                    # Verify it was entered
-                    entered_value = plate_input.get_attribute('value')
-                    if entered_value:
-                        print(f"✓ Entered plate number: {entered_value}")
-                    else:
-                        print(f"⚠️  Plate number may not have been entered. Trying alternative method...")
-                        plate_input.send_keys(Keys.CONTROL + 'a')
-                        plate_input.send_keys(plate_number)
-                        time.sleep(0.5)
-                        entered_value = plate_input.get_attribute('value')
-                        print(f"✓ Entered plate number (retry): {entered_value or 'unknown'}")
-                except Exception as e:
-                    print(f"Error entering plate number: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                # Remember the form so later lookups can skip the browser
+                capture_form_from_driver('NJ', self.driver, violation_input, plate_input)
+                lap('form_fill')
                 
-                time.sleep(2)
+                form_page_text = current_page_text(self.driver)
                 
                 # Find and click the "View Invoice / Violation / Toll Bill" button
                 print("Looking for 'View Invoice / Violation / Toll Bill' button...")
@@ -456,12 +349,16 @@ class EZPassNJAutomation:
                     # Try pressing Enter as fallback
                     plate_input.send_keys(Keys.RETURN)
                     print("✓ Form submitted (Enter key - fallback)")
+                lap('submit')
                 
-                # Wait for results
-                print("Waiting 10 seconds for results to load...")
-                time.sleep(10)
+                # Wait for results (or a block / not-found / invalid-input page)
+                print("Waiting up to 10 seconds for results to load...")
+                outcome, _ = wait_for_outcome(self.driver, 'NJ', 10, stale_text=form_page_text)
+                lap('results_wait')
+                if outcome.is_failure:
+                    return self._create_error_result(OUTCOME_MESSAGES[outcome], outcome)
                 
-                return self._extract_violation_data()
+                return self._extract_violation_data(outcome)
             else:
                 # Debug: print page source snippet
                 print("Could not find input fields. Page title:", self.driver.title)
@@ -478,71 +375,18 @@ class EZPassNJAutomation:
         # For now, return error as account login requires credentials
         return self._create_error_result("Account login not yet implemented. Please use violation number lookup.")
 
-    def _extract_violation_data(self) -> Dict:
+    def _extract_violation_data(self, outcome: PageOutcome = PageOutcome.UNKNOWN) -> Dict:
         """Extract violation/invoice data from the page"""
         try:
             print("Extracting violation information...")
             
-            page_source = self.driver.page_source
             page_text = self.driver.find_element(By.TAG_NAME, 'body').text
             
-            # Extract ONLY total amount due (not individual amounts)
-            balance_amount = 0.0
-            violation_count = 0
-            toll_bill_numbers = []
-            
-            # Look specifically for "total amount due" patterns (priority order)
-            total_amount_due_patterns = [
-                r'total\s+amount\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'amount\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'total\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'balance\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'total\s+balance\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
-                r'outstanding\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)',
-            ]
-            
-            # Try to find "total amount due" first
-            for pattern in total_amount_due_patterns:
-                matches = re.findall(pattern, page_text, re.IGNORECASE)
-                for match in matches:
-                    try:
-                        amount = float(match.replace(',', ''))
-                        if amount > 0:
-                            balance_amount = amount
-                            print(f"✓ Found total amount due: ${balance_amount:.2f}")
-                            break
-                    except:
-                        pass
-                if balance_amount > 0:
-                    break
-            
-            # Only extract violation number if there's an amount due
-            if balance_amount > 0:
-                # Extract violation/invoice number
-                if self.violation_number:
-                    toll_bill_numbers.append(self.violation_number)
-                    violation_count = 1  # Set to 1 if amount due exists
-                    print(f"✓ Extracted violation number: {self.violation_number}")
-                
-                # Also try to find additional violation numbers on the page if amount due exists
-                violation_patterns = [
-                    r'violation\s*(?:number|#)?\s*[:\s]*([A-Z0-9-]+)',
-                    r'invoice\s*(?:number|#)?\s*[:\s]*([A-Z0-9-]+)',
-                    r'toll\s*bill\s*(?:number|#)?\s*[:\s]*([A-Z0-9-]+)',
-                    r'bill\s*(?:number|#)?\s*[:\s]*([A-Z0-9-]+)',
-                ]
-                
-                for pattern in violation_patterns:
-                    matches = re.findall(pattern, page_text, re.IGNORECASE)
-                    for match in matches:
-                        violation_num = match.strip().upper()
-                        if violation_num and violation_num not in toll_bill_numbers:
-                            toll_bill_numbers.append(violation_num)
-                            print(f"✓ Found additional violation/invoice number: {violation_num}")
-            else:
-                print("ℹ️  No total amount due found (balance = $0.00)")
-                violation_count = 0
-                toll_bill_numbers = []
+            extracted = extract_nj_violation_info(page_text, self.violation_number)
+            balance_amount = extracted['balance_amount']
+            violation_count = extracted['violation_count']
+            toll_bill_numbers = extracted['toll_bill_numbers']
+            lap('extract')
             
             print("\n" + "=" * 60)
             print("EXTRACTION COMPLETE")
@@ -557,6 +401,7 @@ class EZPassNJAutomation:
             
             return {
                 'success': True,
+                'outcome': outcome.value,
                 'account_number': self.account_number or '',
                 'plate_number': self.plate_number,
                 'violation_number': self.violation_number,
@@ -573,9 +418,51 @@ class EZPassNJAutomation:
             traceback.print_exc()
             return self._create_error_result(f"Error extracting data: {str(e)}")
 
-    def _create_error_result(self, error_message: str) -> Dict:
-        """Create an error result dictionary"""
-        return {
+    def _form_showing(self, wait: float = 0) -> bool:
+        """True if the violation form's fields are displayed (within `wait` seconds)"""
+        strategy = selector_cache.get('NJ', 'violation_inputs')
+        if not strategy:
+            return False
+        notice_sel, tag_sel = strategy
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                fields = [el for el in self.driver.find_elements(By.CSS_SELECTOR, notice_sel) if el.is_displayed()]
+                # By-position strategy: the form has (at least) two text inputs
+                if len(fields) >= (1 if tag_sel else 2):
+                    return True
+            except WebDriverException:
+                pass
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.25)
+
+    def return_to_form(self) -> bool:
+        """
+        Get back to the violation form after a lookup, ready for the next violation (session reuse)
+        
+        Stays on the page if the results rendered next to the form, otherwise goes back in
+        the history and re-enters the form's iframe.
+        
+        Returns:
+            True if the violation form is showing
+        """
+        try:
+            if self._form_showing():
+                return True
+            self.driver.switch_to.default_content()
+            self.driver.back()
+            iframes = self.driver.find_elements(By.TAG_NAME, 'iframe')
+            if iframes:
+                self.driver.switch_to.frame(iframes[0])
+            return self._form_showing(5)
+        except Exception as e:
+            print(f"⚠️  Could not return to the violation form: {str(e)}")
+            return False
+
+    def _create_error_result(self, error_message: str, outcome: Optional[PageOutcome] = None) -> Dict:
+        """Create an error result dictionary (with the page outcome when one was detected)"""
+        result = {
             'success': False,
             'error': error_message,
             'account_number': self.account_number or '',
@@ -587,29 +474,64 @@ class EZPassNJAutomation:
             'violations': [],
             'source': 'NJ E-ZPass'
         }
+        if outcome is not None:
+            result['outcome'] = outcome.value
+        return result
 
 
 def extract_toll_info_nj(violation_number: str = None, plate_number: str = None, 
-                         account_number: str = None, headless: bool = False) -> Dict:
+                         account_number: str = None, headless: Optional[bool] = None) -> Dict:
     """
     Convenience function to extract toll information from E-ZPass NJ
     
+    Violation lookups try the plain HTTP path first (see http_fetcher) and fall back to Selenium.
+    While the NJ site is refusing lookups, returns a `deferred` result without
+    fetching (see circuit_breaker). Concurrent lookups wait for the site's adaptive
+    concurrency limit (see adaptive_limiter), and a fetch that runs past FETCH_DEADLINE
+    is cancelled with a `timeout` result (see fetch_supervisor). With BROWSER_TABS > 1
+    the Selenium lookup runs in a tab of a shared browser (see tab_scheduler). Inside
+    batch_sessions() it reuses a browser parked on the violation form (see lookup_sessions).
+    
     Args:
         violation_number: Violation/Invoice number (optional)
         plate_number: License plate number (required)
         account_number: E-ZPass account number (optional)
-        headless: Whether to run browser in headless mode
+        headless: Override the configured browser mode (None = BROWSER_MODE, True = headless, False = visible)
         
     Returns:
-        Dictionary with extracted information
+        Dictionary with extracted information, including per-stage `timings` (see fetch_timing)
     """
-    automation = EZPassNJAutomation()
-    return automation.login_and_extract(
-        account_number=account_number,
-        plate_number=plate_number,
-        violation_number=violation_number,
-        headless=headless
-    )
+    def fetch():
+        with track_fetch('NJ') as timer:
+            result = None
+            if violation_number and plate_number:
+                result = try_http_fetch('NJ', violation_number=violation_number, plate_number=plate_number,
+                                        account_number=account_number)
+            if result is None:
+                def lookup(automation):
+                    return automation.login_and_extract(
+                        account_number=account_number,
+                        plate_number=plate_number,
+                        violation_number=violation_number,
+                        headless=headless
+                    )
+                try:
+                    if sessions_active():
+                        result = run_in_session('NJ', EZPassNJAutomation, lookup, headless)
+                    elif tab_mode_enabled():
+                        result = run_in_tab(lambda tab: lookup(EZPassNJAutomation(tab)), headless)
+                    else:
+                        result = lookup(EZPassNJAutomation())
+                except LOCAL_ERRORS as e:
+                    print(f"⚠️  NJ lookup could not start: {str(e)}")
+                    result = local_error_result('NJ', e, violation_number=violation_number or '',
+                                                plate_number=plate_number or '', account_number=account_number or '')
+            return timer.attach(result)
+
+    # Circuit breaker -> adaptive concurrency limit -> hard deadline -> fetch
+    return guarded_fetch('NJ', lambda: limited_fetch('NJ', lambda: supervised_fetch('NJ', fetch)),
+                         violation_number=violation_number or '', plate_number=plate_number or '',
+                         account_number=account_number or '')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark email template rendering with and without the compiled template cache
+
+Compares the old approach (read templates/email_template.html and build a new
+jinja2.Template for every email) against the shared Environment from email_service,
+and checks both produce the same HTML.
+
+Usage:
+    python benchmarks/bench_email_template.py [count]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Template
+from email_service import (TEMPLATES_DIR, EMAIL_TEMPLATE_NAME, get_template_environment,
+                           toll_account_context, build_toll_info_message, build_toll_digest_message)
+
+TOLL_RESULTS = [
+    {
+        'account_number': '123456789',
+        'plate_number': 'ABC1234',
+        'violation_number': 'T123456789012',
+        'balance_amount': 142.75,
+        'ny_balance_amount': 98.50,
+        'nj_balance_amount': 44.25,
+        'toll_bill_numbers': ['T0123456', 'T0123457', 'T0123458'],
+        'violation_count': 3,
+        'sources': ['NY', 'NJ']
+    },
+    {
+        'account_number': '987654321',
+        'plate_number': 'XYZ9876',
+        'balance_amount': 27.40,
+        'ny_balance_amount': 27.40,
+        'toll_bill_numbers': ['T0987654'],
+        'violation_count': 1,
+        'sources': ['NY']
+    }
+]
+TOLL_DATA = TOLL_RESULTS[0]
+
+# Template variables as build_toll_digest_message passes them (one card per account)
+ACCOUNTS = [toll_account_context(toll_data, logger=lambda *_: None) for toll_data in TOLL_RESULTS]
+CONTEXT = {
+    'accounts': ACCOUNTS,
+    'date': 'January 01, 2026 at 09:00 AM',
+    'balance_due': f"{sum(account['balance'] for account in ACCOUNTS):.2f}",
+    'ny_balance_due': f"{sum(account['ny_balance'] for account in ACCOUNTS):.2f}",
+    'nj_balance_due': f"{sum(account['nj_balance'] for account in ACCOUNTS):.2f}",
+    'bill_numbers': [bill for account in ACCOUNTS for bill in account['bill_numbers']],
+    'violation_count': sum(account['violation_count'] for account in ACCOUNTS),
+    'has_ny': any(account['has_ny'] for account in ACCOUNTS),
+    'has_nj': any(account['has_nj'] for account in ACCOUNTS)
+}
+
+
+def render_uncached():
+    """Render the way build_toll_info_message used to: parse and compile every time"""
+    with open(os.path.join(TEMPLATES_DIR, EMAIL_TEMPLATE_NAME), 'r') as f:
+        template = Template(f.read())
+    return template.render(**CONTEXT)
+
+
+def render_cached():
+    """Render through the shared environment"""
+    return get_template_environment().get_template(EMAIL_TEMPLATE_NAME).render(**CONTEXT)
+
+
+def time_it(func, count):
+    """Call func `count` times and return elapsed seconds"""
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+    if render_uncached() != render_cached():
+        print("❌ Cached and uncached templates rendered different HTML")
+        sys.exit(1)
+
+    uncached_time = time_it(render_uncached, count)
+    cached_time = time_it(render_cached, count)
+    build_time = time_it(lambda: build_toll_info_message('user@example.com', TOLL_DATA, 'sender@example.com',
+                                                         logger=lambda *_: None), count)
+    digest_time = time_it(lambda: build_toll_digest_message('user@example.com', TOLL_RESULTS, 'sender@example.com',
+                                                            logger=lambda *_: None), count)
+
+    print("=" * 60)
+    print("EMAIL TEMPLATE BENCHMARK")
+    print("=" * 60)
+    print(f"Renders: {count}")
+    print(f"Compile per email (old):    {count / uncached_time:>10,.0f} emails/sec")
+    print(f"Cached template:            {count / cached_time:>10,.0f} emails/sec "
+          f"({uncached_time / cached_time:.1f}x)")
+    print(f"Full build_toll_info_message:{count / build_time:>11,.0f} emails/sec")
+    print(f"Digest ({len(TOLL_RESULTS)} accounts):       {count / digest_time:>10,.0f} emails/sec")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+End-to-end fetch benchmark against the local E-ZPass fixture server
+
+Runs N synthetic accounts through the NY and NJ lookups at each concurrency level
+and records per-stage latency (driver start, navigation, form fill, wait, extract,
+email), accounts per minute and peak RSS. Results are written as JSON so runs can
+be compared across commits.
+
+Modes:
+    browser  Selenium scrapers (needs Chrome; HTTP_FETCH=off)
+    http     HTTP-only fetch path (HTTP_FETCH=only)
+
+Stages are measured from outside the scrapers: driver start is launch_chrome,
+navigation is page loads (GETs in http mode), wait is sleeps (results POSTs in http
+mode), extract is the toll_extraction call, email is building the notification, and
+form fill is whatever remains of the fetch (finding fields, typing, submitting).
+The scrapers' own stage timings (result['timings']) are summarized as scraper_stages.
+
+Usage:
+    python benchmarks/bench_fetch.py [--mode browser|http] [--accounts N] [--concurrency 1,2,4]
+                                     [--sites NY,NJ] [--latency-ms MS] [--results-latency-ms MS]
+                                     [--failure-rate RATE] [--output FILE]
+    python benchmarks/bench_fetch.py --compare OLD.json NEW.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fixture_server import start_fixture_server, expected_balance
+
+STAGES = ('driver_start', 'navigation', 'form_fill', 'wait', 'extract', 'email')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+_current = threading.local()
+
+
+@contextmanager
+def stage(name):
+    """Add the time spent in the block to the current fetch's stage totals"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_current, 'timings', None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def timed(name, func):
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class TimedDriver:
+    """WebDriver proxy that counts page loads as navigation"""
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def get(self, url):
+        with stage('navigation'):
+            return self._driver.get(url)
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+class TimedSleep:
+    """Stand-in for a scraper module's `time` that counts sleeps as wait"""
+
+    def sleep(self, seconds):
+        with stage('wait'):
+            time.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def instrument(mode):
+    """Patch the fetch path so each stage is timed; returns (fetch_ny, fetch_nj, build_email)"""
+    import automation_selenium
+    import automation_selenium_nj
+    import http_fetcher
+    from email_service import build_toll_info_message
+
+    if mode == 'browser':
+        for module in (automation_selenium, automation_selenium_nj):
+            launch = module.launch_chrome
+            module.launch_chrome = lambda headless=None, launch=launch: TimedDriver(
+                timed('driver_start', launch)(headless))
+            module.time = TimedSleep()
+        automation_selenium.extract_ny_financials = timed('extract', automation_selenium.extract_ny_financials)
+        automation_selenium_nj.extract_nj_violation_info = timed(
+            'extract', automation_selenium_nj.extract_nj_violation_info)
+    else:
+        request = http_fetcher._request
+        http_fetcher._request = lambda method, url, **kwargs: timed(
+            'navigation' if method == 'GET' else 'wait', request)(method, url, **kwargs)
+        http_fetcher.extract_ny_financials = timed('extract', http_fetcher.extract_ny_financials)
+        http_fetcher.extract_nj_violation_info = timed('extract', http_fetcher.extract_nj_violation_info)
+
+    def fetch_ny(lookup, plate):
+        return automation_selenium.extract_toll_info(lookup, plate)
+
+    def fetch_nj(lookup, plate):
+        return automation_selenium_nj.extract_toll_info_nj(violation_number=lookup, plate_number=plate)
+
+    def build_email(result):
+        return build_toll_info_message('bench@example.com', result, 'sender@example.com')
+
+    return {'NY': fetch_ny, 'NJ': fetch_nj}, build_email
+
+
+def process_tree_rss():
+    """RSS in bytes of this process and its descendants (browsers, drivers)"""
+    if not os.path.isdir('/proc'):
+        # No /proc (macOS): lifetime peak of this process only
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    parents = {}
+    for pid in os.listdir('/proc'):
+        if pid.isdigit():
+            try:
+                with open(f'/proc/{pid}/stat', 'r') as f:
+                    parents[int(pid)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+
+    tree = {os.getpid()}
+    changed = True
+    while changed:
+        children = {pid for pid, ppid in parents.items() if ppid in tree} - tree
+        tree |= children
+        changed = bool(children)
+
+    total = 0
+    for pid in tree:
+        try:
+            with open(f'/proc/{pid}/statm', 'r') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class RssSampler:
+    """Track peak process-tree RSS on a background thread"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, process_tree_rss())
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss())
+            self._stop.wait(self.interval)
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(values):
+    return {
+        'p50': round(percentile(values, 50), 4),
+        'p95': round(percentile(values, 95), 4),
+        'p99': round(percentile(values, 99), 4),
+        'mean': round(sum(values) / len(values), 4) if values else 0.0
+    }
+
+
+def run_level(site, fetch, build_email, accounts, concurrency):
+    """Fetch every account for one site at one concurrency level"""
+
+    def run_one(account):
+        lookup, plate = account
+        _current.timings = {}
+        start = time.perf_counter()
+        try:
+            result = fetch(lookup, plate)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        fetch_seconds = time.perf_counter() - start
+
+        if result.get('success'):
+            with stage('email'):
+                build_email(result)
+
+        timings = _current.timings
+        _current.timings = None
+        measured = sum(timings.get(name, 0.0) for name in ('driver_start', 'navigation', 'wait', 'extract'))
+        timings['form_fill'] = max(0.0, fetch_seconds - measured)
+        timings['total'] = time.perf_counter() - start
+        return {
+            'success': bool(result.get('success')),
+            'correct': bool(result.get('success'))
+                       and abs(result.get('balance_amount', 0) - expected_balance(lookup, plate)) < 0.005,
+            'timings': timings,
+            'scraper_stages': (result.get('timings') or {}).get('stages', {})
+        }
+
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(run_one, accounts))
+        wall = time.perf_counter() - start
+
+    return {
+        'site': site,
+        'concurrency': concurrency,
+        'accounts': len(accounts),
+        'succeeded': sum(1 for outcome in outcomes if outcome['success']),
+        'correct': sum(1 for outcome in outcomes if outcome['correct']),
+        'wall_seconds': round(wall, 3),
+        'accounts_per_minute': round(len(accounts) / wall * 60, 2) if wall else 0.0,
+        'peak_rss_mb': round(sampler.peak / 1024 / 1024, 1),
+        'stages': {name: summarize([outcome['timings'].get(name, 0.0) for outcome in outcomes])
+                   for name in STAGES + ('total',)},
+        # Finer-grained stages the scrapers report themselves (see fetch_timing)
+        'scraper_stages': {name: summarize([outcome['scraper_stages'].get(name, 0.0) for outcome in outcomes])
+                           for name in dict.fromkeys(name for outcome in outcomes
+                                                     for name in outcome['scraper_stages'])}
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_run(run):
+    print(f"\n{run['site']} x{run['concurrency']}: {run['succeeded']}/{run['accounts']} ok "
+          f"({run['correct']} correct), {run['accounts_per_minute']:.1f} accounts/min, "
+          f"peak RSS {run['peak_rss_mb']:.1f}MB")
+    print(f"   {'stage':<14}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in run['stages'].items():
+        print(f"   {name:<14}{stats['p50'] * 1000:>8.1f}ms{stats['p95'] * 1000:>8.1f}ms{stats['p99'] * 1000:>8.1f}ms")
+
+
+def compare(old_path, new_path):
+    """Print throughput and latency changes between two result files"""
+    with open(old_path, 'r') as f:
+        old = json.load(f)
+    with open(new_path, 'r') as f:
+        new = json.load(f)
+    print(f"📊 {old.get('commit')} ({old['mode']}) -> {new.get('commit')} ({new['mode']})")
+
+    old_runs = {(run['site'], run['concurrency']): run for run in old['runs']}
+    for run in new['runs']:
+        before = old_runs.get((run['site'], run['concurrency']))
+        if not before:
+            continue
+        print(f"\n{run['site']} x{run['concurrency']}: accounts/min "
+              f"{before['accounts_per_minute']:.1f} -> {run['accounts_per_minute']:.1f}, "
+              f"peak RSS {before['peak_rss_mb']:.1f} -> {run['peak_rss_mb']:.1f}MB")
+        for name in run['stages']:
+            if name not in before['stages']:
+                continue
+            old_p50, new_p50 = before['stages'][name]['p50'], run['stages'][name]['p50']
+            old_p95, new_p95 = before['stages'][name]['p95'], run['stages'][name]['p95']
+            change = f"{(new_p50 - old_p50) / old_p50 * 100:+.0f}%" if old_p50 else 'n/a'
+            print(f"   {name:<14} p50 {old_p50 * 1000:.1f} -> {new_p50 * 1000:.1f}ms ({change}), "
+                  f"p95 {old_p95 * 1000:.1f} -> {new_p95 * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end fetch benchmark against the fixture server')
+    parser.add_argument('--mode', choices=('browser', 'http'), default='browser')
+    parser.add_argument('--accounts', type=int, default=10, help='Accounts per site and concurrency level')
+    parser.add_argument('--concurrency', default='1,2,4', help='Comma-separated concurrency levels')
+    parser.add_argument('--sites', default='NY,NJ')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Fixture latency per page')
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--results-latency-ms', type=float, default=300, help='Extra fixture latency for results')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', default='bench')
+    parser.add_argument('--output', help='JSON results file (default: benchmarks/results/fetch-<commit>-<time>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    settings = {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms,
+                'results_latency_ms': args.results_latency_ms, 'failure_rate': args.failure_rate}
+    server = start_fixture_server(settings=settings, seed=args.seed)
+
+    # The scrapers read these at import time
+    os.environ.update(server.site_env())
+    os.environ['HTTP_FETCH'] = 'only' if args.mode == 'http' else 'off'
+    os.environ['FORM_CAPTURE_FILE'] = os.path.join(tempfile.mkdtemp(prefix='bench_fetch_'), 'form_captures.json')
+    # Injected failures would otherwise open the circuit breaker and turn lookups into deferrals
+    os.environ['CIRCUIT_BREAKER'] = 'off'
+    # Pin the adaptive limiter at the highest level so the concurrency under test is what runs
+    pinned_limit = str(max(int(level) for level in args.concurrency.split(',') if level.strip()))
+    for name in ('AIMD_INITIAL_LIMIT', 'AIMD_MIN_LIMIT', 'AIMD_MAX_LIMIT'):
+        os.environ[name] = pinned_limit
+    fetchers, build_email = instrument(args.mode)
+
+    sites = [site.strip().upper() for site in args.sites.split(',') if site.strip()]
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    accounts = [(f"BENCH{i:05d}", f"P{i:05d}") for i in range(args.accounts)]
+
+    print(f"🚀 Benchmarking {args.mode} fetch: {args.accounts} account(s) x {sites} at concurrency {levels}")
+    print(f"   Fixture server {server.base_url}: {json.dumps(settings)}")
+
+    runs = []
+    for concurrency in levels:
+        for site in sites:
+            run = run_level(site, fetchers[site], build_email, accounts, concurrency)
+            print_run(run)
+            runs.append(run)
+    server.shutdown()
+
+    report = {
+        'benchmark': 'fetch',
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'mode': args.mode,
+        'accounts': args.accounts,
+        'fixture': settings,
+        'runs': runs
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"fetch-{report['commit'] or 'unknown'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
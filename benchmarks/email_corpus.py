@@ -0,0 +1,83 @@
+"""
+Representative toll-request emails for parser benchmarks
+
+Each entry is (subject, body, from_email). The mix mirrors what the inbox actually
+receives: form submissions, hand-typed requests, NJ violations, combined NY + NJ
+requests, JSON posts, and the newsletters/notifications that must not match.
+"""
+
+CORPUS = [
+    (
+        "New toll request",
+        "NY Toll Bill Account Number: 752918782\n"
+        "Plate Number: AULAKH13\n"
+        "Email Address (for toll bill notifications): rinduaulakh@gmail.com\n",
+        "forms@myezpassdata.com",
+    ),
+    (
+        "Toll balance please",
+        "Hi,\n\nAccount: 748855526\nPlate: PANDHERR\nEmail: driver@example.com\n\nThanks!",
+        "driver@example.com",
+    ),
+    (
+        "Check my account",
+        "Account: 123456789, Plate: ABC1234, Email: user@example.com",
+        "user@example.com",
+    ),
+    (
+        "NJ violation",
+        "Violation Number: T13255735180201\nPlate: T127211C\nEmail Address: nj.driver@example.com",
+        "nj.driver@example.com",
+    ),
+    (
+        "Both states",
+        "Account Number: 600123987\n"
+        "NJ Violation: T99887766554433\n"
+        "License Plate: XYZ9876\n"
+        "Email: both@example.com\n",
+        "both@example.com",
+    ),
+    (
+        "API submission",
+        '{"account_number": "555000111", "plate_number": "JSON123", "email": "api@example.com"}',
+        "api@example.com",
+    ),
+    (
+        "Invoice lookup",
+        "Invoice #: T55544433322211\nPlate number: NJPLATE9\n",
+        "someone@example.com",
+    ),
+    (
+        "Re: Your toll information",
+        "Thanks for the info!\n\n"
+        "> E-ZPass NY Toll Information\n"
+        "> NY Account Number: 700800900\n"
+        "> NY Plate Number: QUOTE77\n"
+        "> NY Balance: $12.50\n"
+        "> Total Balance Due: $12.50\n",
+        "reply@example.com",
+    ),
+    (
+        "Your weekly newsletter",
+        "This week: new account features, email preferences and more. "
+        "Manage your account settings at any time. " * 20,
+        "noreply@newsletter.example.com",
+    ),
+    (
+        "Security alert",
+        "A new sign-in to your account was detected. If this was you, no action is "
+        "needed. Account ID: and the rest of this message has no plate.",
+        "no-reply@accounts.example.com",
+    ),
+    (
+        "Fwd: toll",
+        "<html><body><p>Account #: 810-220-330</p><p>Plate #: FWD-4321</p>"
+        "<p>Email: fwd@example.com</p></body></html>",
+        "myezpassdata@gmail.com",
+    ),
+    (
+        "hello",
+        "Just saying hi, no toll details in here at all. " * 50,
+        "friend@example.com",
+    ),
+]
@@ -0,0 +1,241 @@
+"""
+Shared Chrome launcher for the E-ZPass scrapers
+
+Every browser holds a host-wide slot from launch_chrome() until quit_chrome() (see
+browser_slots), so all processes on the host together stay within BROWSER_HOST_SLOTS.
+chromedriver runs in its own process group, tagged with its owning fetch, so the fetch
+supervisor can kill it (and its Chrome processes) on a deadline or when orphaned.
+Launches wait while the host is low on memory, and browser_bloated() tells the code that
+reuses browsers (lookup sessions, the tab scheduler) to retire one whose RSS has grown
+past BROWSER_RSS_LIMIT_MB (see memory_guard).
+"""
+import os
+import threading
+from typing import Optional
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from webdriver_manager.chrome import ChromeDriverManager
+from runtime_config import get_runtime_config, resolve_browser_mode, parse_window_size
+from fetch_timing import lap
+from metrics import gauge
+from browser_slots import NoBrowserSlot, acquire_browser_slot
+from fetch_supervisor import OWNER_ENV, owner_tag, register_browser, unregister_browser, kill_process_group
+from memory_guard import BROWSER_RECYCLES, InsufficientMemory, admit_browser, over_rss_limit, track_browser, untrack_browser
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+# Real chromedriver binary should be > 10MB (typically ~15MB)
+# Text files like THIRD_PARTY_NOTICES.chromedriver are < 1MB
+MIN_DRIVER_SIZE = 10000000
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+_active_browsers = 0
+_active_browsers_lock = threading.Lock()
+
+# Host-wide slot and chromedriver process group of each running browser (keyed by id(driver))
+_browser_slots = {}
+_browser_groups = {}
+
+
+class BrowserLaunchError(Exception):
+    """chromedriver could not be installed or Chrome failed to start"""
+
+
+# Errors that keep a lookup from starting on this host (the site was never contacted)
+LOCAL_ERRORS = (NoBrowserSlot, InsufficientMemory, BrowserLaunchError)
+
+
+def _is_valid_driver(path: str) -> bool:
+    return os.path.isfile(path) and os.access(path, os.X_OK) and os.path.getsize(path) >= MIN_DRIVER_SIZE
+
+
+def find_chromedriver() -> str:
+    """
+    Locate the chromedriver executable (resolved once per process)
+
+    ChromeDriverManager sometimes returns the wrong file (e.g., THIRD_PARTY_NOTICES.chromedriver),
+    so the returned path is checked and the install directory searched if needed.
+
+    Returns:
+        str: Path to the chromedriver executable
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path:
+            return _driver_path
+
+        driver_path = ChromeDriverManager().install()
+
+        if os.path.isfile(driver_path) and os.path.getsize(driver_path) >= MIN_DRIVER_SIZE:
+            print(f"✅ ChromeDriverManager returned valid executable: {driver_path} "
+                  f"({os.path.getsize(driver_path) / 1024 / 1024:.1f}MB)")
+        else:
+            if os.path.isfile(driver_path):
+                print(f"⚠️  ChromeDriverManager returned suspicious file: {driver_path} "
+                      f"({os.path.getsize(driver_path) / 1024 / 1024:.1f}MB)")
+
+            # Search directory (either the directory itself or parent of the wrong file)
+            if os.path.isdir(driver_path):
+                search_dir = driver_path
+            elif os.path.isfile(driver_path):
+                search_dir = os.path.dirname(driver_path)
+            else:
+                search_dir = os.path.expanduser('~/.wdm/drivers/chromedriver')
+
+            print(f"🔍 Searching for chromedriver executable in: {search_dir}")
+            found = None
+            for root, dirs, files in os.walk(search_dir):
+                # Match EXACT filename 'chromedriver' (case-sensitive)
+                if 'chromedriver' in files and _is_valid_driver(os.path.join(root, 'chromedriver')):
+                    found = os.path.join(root, 'chromedriver')
+                    break
+
+            if not found:
+                raise Exception(f"Could not find valid chromedriver executable in: {search_dir}")
+            driver_path = found
+            print(f"✅ Found chromedriver executable: {driver_path}")
+
+        # Final validation
+        if not os.access(driver_path, os.X_OK):
+            raise Exception(f"ChromeDriver is not executable: {driver_path}")
+
+        _driver_path = driver_path
+        return _driver_path
+
+
+def build_chrome_options(mode: str, window_size: str = None) -> Options:
+    """
+    Build Chrome options for a browser mode
+
+    Args:
+        mode: headless-new, headless-old or visible
+        window_size: Viewport as 'WIDTH,HEIGHT' (default: from runtime config)
+
+    Returns:
+        Chrome Options
+    """
+    width, height = parse_window_size(window_size or get_runtime_config()['window_size'])
+
+    chrome_options = Options()
+    if mode == 'headless-new':
+        chrome_options.add_argument('--headless=new')
+    elif mode == 'headless-old':
+        chrome_options.add_argument('--headless')
+    else:
+        chrome_options.add_argument('--start-maximized')
+    chrome_options.add_argument(f'--window-size={width},{height}')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    chrome_options.add_argument(f'user-agent={USER_AGENT}')
+    return chrome_options
+
+
+def launch_chrome(headless: Optional[bool] = None) -> webdriver.Chrome:
+    """
+    Launch Chrome with the configured mode, window size and anti-automation tweaks
+
+    Args:
+        headless: Per-call override (None uses BROWSER_MODE from the runtime config)
+
+    Returns:
+        Chrome WebDriver
+
+    Raises:
+        NoBrowserSlot: If no host-wide browser slot became free in time
+        InsufficientMemory: If free memory stayed below BROWSER_MIN_FREE_MB
+        BrowserLaunchError: If chromedriver could not be installed or Chrome failed to start
+    """
+    global _active_browsers
+    mode = resolve_browser_mode(headless)
+
+    print("Launching Chrome browser...")
+    try:
+        driver_path = find_chromedriver()
+    except Exception as e:
+        raise BrowserLaunchError(f"Could not install chromedriver: {str(e)}") from e
+    print(f"🚀 Using ChromeDriver: {driver_path}")
+    lap('driver_install')
+
+    slot = acquire_browser_slot()
+    try:
+        admit_browser()
+    except Exception:
+        slot.release()
+        raise
+    lap('browser_slot')
+    # Own session (process group) and owner tag: see fetch_supervisor
+    service = Service(driver_path, env={**os.environ, OWNER_ENV: owner_tag()},
+                      popen_kw={'start_new_session': True})
+    try:
+        driver = webdriver.Chrome(service=service, options=build_chrome_options(mode))
+    except Exception as e:
+        if getattr(service, 'process', None):
+            kill_process_group(service.process.pid)
+        slot.release()
+        raise BrowserLaunchError(f"Chrome failed to start: {str(e)}") from e
+
+    pgid = service.process.pid
+    register_browser(pgid)
+    track_browser(pgid, str(slot.index))
+    with _active_browsers_lock:
+        _active_browsers += 1
+        _browser_slots[id(driver)] = slot
+        _browser_groups[id(driver)] = pgid
+
+    # Remove webdriver property
+    try:
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    except Exception:
+        quit_chrome(driver)
+        raise
+
+    print(f"Browser launched (mode={mode})")
+    lap('browser_start')
+    return driver
+
+
+def quit_chrome(driver):
+    """Quit a browser started by launch_chrome and free its slot (errors are ignored)"""
+    global _active_browsers
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    with _active_browsers_lock:
+        _active_browsers = max(0, _active_browsers - 1)
+        slot = _browser_slots.pop(id(driver), None)
+        pgid = _browser_groups.pop(id(driver), None)
+    if pgid:
+        # Chrome processes that outlived quit() (or a quit() that failed)
+        kill_process_group(pgid)
+        unregister_browser(pgid)
+        untrack_browser(pgid)
+    if slot:
+        slot.release()
+
+
+def browser_process_group(driver) -> Optional[int]:
+    """Process group of a browser started by launch_chrome (None once it has been quit)"""
+    with _active_browsers_lock:
+        return _browser_groups.get(id(driver))
+
+
+def browser_bloated(driver) -> bool:
+    """True if a browser's RSS has grown past BROWSER_RSS_LIMIT_MB"""
+    pgid = browser_process_group(driver)
+    return bool(pgid) and over_rss_limit(pgid)
+
+
+def active_browser_count() -> int:
+    """Browsers launched by this process that have not been quit yet"""
+    return _active_browsers
+
+
+gauge('tolls_active_browsers', 'Chrome instances running in this process', func=active_browser_count)
@@ -0,0 +1,144 @@
+"""
+Host-wide limit on running Chrome instances
+
+The dashboard's gunicorn workers, auto_fetch and the email worker are separate
+processes, so a per-process browser limit multiplies out. Every launch_chrome() call
+takes one of BROWSER_HOST_SLOTS slots shared by all processes on the host first.
+
+A slot is a file in BROWSER_SLOTS_DIR held with an exclusive flock(). The kernel drops
+the lock when the file is closed or the process dies, so a crashed process never keeps
+a slot. The holder's pid and start time are written into the slot file for debugging.
+
+Settings (environment):
+    BROWSER_HOST_SLOTS     Browsers allowed on the host at once (default: BROWSER_CONCURRENCY)
+    BROWSER_SLOTS_DIR      Directory for the slot files (default: <tmp>/tolls-browser-slots)
+    BROWSER_SLOT_TIMEOUT   Seconds to wait for a free slot before giving up (default: 60 - below
+                           FETCH_DEADLINE; inside a fetch the wait also ends at its deadline)
+"""
+import fcntl
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Optional
+from dotenv import load_dotenv
+from runtime_config import get_runtime_config
+from fetch_supervisor import time_left
+from metrics import gauge, histogram
+
+load_dotenv()
+
+BROWSER_HOST_SLOTS = int(os.getenv('BROWSER_HOST_SLOTS', get_runtime_config()['browser_concurrency']))
+BROWSER_SLOTS_DIR = os.getenv('BROWSER_SLOTS_DIR', os.path.join(tempfile.gettempdir(), 'tolls-browser-slots'))
+BROWSER_SLOT_TIMEOUT = float(os.getenv('BROWSER_SLOT_TIMEOUT', '60'))
+
+# Seconds between attempts while every slot is taken
+_POLL_INTERVAL = 0.25
+
+BROWSER_SLOT_WAIT = histogram('tolls_browser_slot_wait_seconds', 'Time spent waiting for a host-wide browser slot',
+                              (), (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+
+
+class NoBrowserSlot(Exception):
+    """Every host-wide browser slot stayed taken until the timeout"""
+
+
+class BrowserSlot:
+    """One held slot; release() (or closing the process) frees it"""
+
+    def __init__(self, index: int, handle):
+        self.index = index
+        self._handle = handle
+
+    def release(self):
+        if self._handle is None:
+            return
+        try:
+            self._handle.seek(0)
+            self._handle.truncate()
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+        except OSError:
+            pass
+        finally:
+            self._handle.close()
+            self._handle = None
+
+
+def _slot_path(index: int, slots_dir: str = None) -> str:
+    return os.path.join(slots_dir or BROWSER_SLOTS_DIR, f"slot-{index}.lock")
+
+
+def _try_slot(index: int, slots_dir: str = None) -> Optional[BrowserSlot]:
+    """Take a slot if it is free (never blocks)"""
+    handle = open(_slot_path(index, slots_dir), 'a+')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(f"{os.getpid()} {datetime.now().isoformat(timespec='seconds')}\n")
+    handle.flush()
+    return BrowserSlot(index, handle)
+
+
+def acquire_browser_slot(timeout: float = None, slots: int = None, slots_dir: str = None) -> BrowserSlot:
+    """
+    Wait for a free host-wide browser slot
+
+    Args:
+        timeout: Seconds to wait (default: BROWSER_SLOT_TIMEOUT, capped at the current fetch's deadline)
+        slots: Number of slots on the host (default: BROWSER_HOST_SLOTS)
+        slots_dir: Directory for the slot files (default: BROWSER_SLOTS_DIR)
+
+    Returns:
+        The held BrowserSlot
+
+    Raises:
+        NoBrowserSlot: If no slot became free in time
+    """
+    timeout = time_left(BROWSER_SLOT_TIMEOUT) if timeout is None else timeout
+    slots = max(1, slots or BROWSER_HOST_SLOTS)
+    os.makedirs(slots_dir or BROWSER_SLOTS_DIR, exist_ok=True)
+
+    start = time.monotonic()
+    announced = False
+    while True:
+        # Start at a pid-dependent slot so processes don't all contend for slot 0
+        offset = os.getpid() % slots
+        for i in range(slots):
+            slot = _try_slot((offset + i) % slots, slots_dir)
+            if slot:
+                BROWSER_SLOT_WAIT.observe(time.monotonic() - start)
+                return slot
+
+        waited = time.monotonic() - start
+        if waited >= timeout:
+            BROWSER_SLOT_WAIT.observe(waited)
+            raise NoBrowserSlot(f"All {slots} browser slot(s) on this host stayed busy for {timeout:.0f}s")
+        if not announced:
+            print(f"⏳ All {slots} browser slot(s) on this host are busy - waiting for one to free up")
+            announced = True
+        time.sleep(_POLL_INTERVAL)
+
+
+def slots_in_use(slots: int = None, slots_dir: str = None) -> int:
+    """Number of slots currently held by any process on the host"""
+    slots = max(1, slots or BROWSER_HOST_SLOTS)
+    busy = 0
+    for i in range(slots):
+        path = _slot_path(i, slots_dir)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'a+') as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            except OSError:
+                busy += 1
+    return busy
+
+
+gauge('tolls_browser_slots_in_use', 'Host-wide browser slots held by any process', func=slots_in_use)
+gauge('tolls_browser_slots_total', 'Host-wide browser slots (BROWSER_HOST_SLOTS)', func=lambda: BROWSER_HOST_SLOTS)
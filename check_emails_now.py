@@ -7,8 +7,9 @@ import os
 sys.path.insert(0, '/Users/ghuman/tolls')
 os.chdir('/Users/ghuman/tolls')
 
-from email_checker_worker import process_email_request
+from email_checker_worker import handle_email_request, request_deduplicator
 from email_reader import check_emails_and_extract
+from fetch_executor import process_requests
 from dotenv import load_dotenv
 from datetime import datetime
 
@@ -32,7 +33,7 @@ try:
         print()
         
         for i, email_data in enumerate(email_requests, 1):
-            print(f"📨 Processing Request #{i}:")
+            print(f"📨 Request #{i}:")
             print(f"   Source: {email_data.get('source', 'N/A')}")
             if email_data.get('source') == 'NY':
                 print(f"   Account: {email_data.get('account_number', 'N/A')}")
@@ -42,12 +43,17 @@ try:
             print(f"   From: {email_data.get('sender_email', 'N/A')}")
             print(f"   Send to: {email_data.get('email', 'N/A')}")
             print()
-            
-            # Process the request
-            print(f"🚀 Running automation for Request #{i}...")
-            process_email_request(email_data)
-            print(f"✅ Completed Request #{i}")
-            print()
+        
+        # Process the requests in parallel (same sender stays in order)
+        print(f"🚀 Running automation for {len(email_requests)} request(s)...")
+        for email_data, result, error in process_requests(email_requests, handle_email_request):
+            if error:
+                print(f"❌ Request from {email_data.get('sender_email', 'N/A')} failed: {str(error)}")
+            else:
+                print(f"✅ Completed request from {email_data.get('sender_email', 'N/A')}")
+        if request_deduplicator.suppressed:
+            print(f"♻️  Suppressed {request_deduplicator.suppressed} duplicate request(s)")
+        print()
     else:
         print("✅ No new email requests found")
         print("   (All emails have been processed or no valid requests)")
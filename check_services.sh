@@ -21,6 +21,9 @@ if [ "$EMAIL_CHECKER_LOADED" -gt 0 ]; then
 else
     echo "   Status: ❌ Not loaded"
 fi
+if curl -sf "http://127.0.0.1:${WORKER_METRICS_PORT:-9102}/metrics" > /dev/null 2>&1; then
+    echo "   Metrics: ✅ http://127.0.0.1:${WORKER_METRICS_PORT:-9102}/metrics"
+fi
 
 # Check Auto-Fetch
 echo ""
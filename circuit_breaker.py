@@ -0,0 +1,282 @@
+"""
+Per-site circuit breaker for the E-ZPass scrapers
+
+When a site starts refusing automation (ERR_ABORTED, block pages, error pages), every
+further lookup launches a browser only to fail slowly. The breaker counts site failures
+(blocked and site-error pages, timeouts, navigation and network errors) per site and, once CIRCUIT_FAILURE_THRESHOLD happen in a row, opens: lookups for that
+site return a `deferred` result straight away instead of fetching.
+
+    closed     Lookups run normally; consecutive failures are counted
+    open       Lookups are deferred until the cool-down has passed
+    half_open  Up to CIRCUIT_HALF_OPEN_PROBES lookups run as probes; a probe the site
+               answers closes the breaker, a failed probe reopens it with twice the cool-down (up to
+               CIRCUIT_MAX_COOLDOWN)
+
+Not-found and invalid-input answers (see page_outcome) are the site working normally and
+do not count as failures, nor do local errors (no browser slot, low memory, chromedriver
+problems, scraper bugs) or a fetch that raised. State lives in CIRCUIT_BREAKER_FILE (default:
+circuit_breaker.json) so the dashboard, the email worker and auto_fetch share it.
+
+Settings (environment):
+    CIRCUIT_BREAKER             'on' (default) or 'off'
+    CIRCUIT_FAILURE_THRESHOLD   Consecutive failures that open the breaker (default: 3)
+    CIRCUIT_COOLDOWN            Seconds before the first probe (default: 300)
+    CIRCUIT_MAX_COOLDOWN        Longest cool-down after repeated failed probes (default: 3600)
+    CIRCUIT_HALF_OPEN_PROBES    Probe lookups allowed at once while half-open (default: 1)
+    CIRCUIT_PROBE_TIMEOUT       Seconds after which an unfinished probe is given up on (default: 600)
+"""
+import fcntl
+import json
+import re
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from metrics import counter, gauge
+
+load_dotenv()
+
+CIRCUIT_BREAKER = os.getenv('CIRCUIT_BREAKER', 'on').lower() not in ('0', 'off', 'false', 'no')
+CIRCUIT_BREAKER_FILE = os.getenv('CIRCUIT_BREAKER_FILE',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'circuit_breaker.json'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+CIRCUIT_COOLDOWN = float(os.getenv('CIRCUIT_COOLDOWN', '300'))
+CIRCUIT_MAX_COOLDOWN = float(os.getenv('CIRCUIT_MAX_COOLDOWN', '3600'))
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv('CIRCUIT_HALF_OPEN_PROBES', '1'))
+CIRCUIT_PROBE_TIMEOUT = float(os.getenv('CIRCUIT_PROBE_TIMEOUT', '600'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Outcome of a lookup that failed on this host before or without reaching the site
+LOCAL_ERROR = 'local_error'
+
+# Outcomes that mean the site is refusing or failing lookups
+SITE_FAILURE_OUTCOMES = ('blocked', 'site_error', 'timeout')
+
+# Failures that say nothing about the site refusing us
+NON_SITE_OUTCOMES = ('not_found', 'invalid_input', 'deferred', LOCAL_ERROR)
+
+# Failures that are the site answering normally
+SITE_ANSWER_OUTCOMES = ('not_found', 'invalid_input')
+
+# Navigation and network errors in a result without an outcome
+_NETWORK_ERROR = re.compile(
+    r"\berr_[a-z_]+\b|net::|\btimed? ?out\b|unable to access|failed to load|"
+    r"connection (?:refused|reset|aborted|closed)|name not resolved|http [5]\d\d\b", re.IGNORECASE)
+
+
+def is_site_failure(result: Optional[Dict]) -> bool:
+    """True if a fetch result shows the site refusing or failing the lookup (None = the fetch raised)"""
+    if not result or result.get('success'):
+        return False
+    outcome = result.get('outcome')
+    if outcome in SITE_FAILURE_OUTCOMES:
+        return True
+    if outcome in NON_SITE_OUTCOMES:
+        return False
+    return bool(_NETWORK_ERROR.search(result.get('error') or ''))
+
+
+def is_site_answer(result: Optional[Dict]) -> bool:
+    """True if a fetch result shows the site working (results, not-found or invalid-input answers)"""
+    return bool(result) and (bool(result.get('success')) or result.get('outcome') in SITE_ANSWER_OUTCOMES)
+
+
+class CircuitBreaker:
+    """File-backed breaker state for every site"""
+
+    def __init__(self, path: str = None, failure_threshold: int = None, cooldown: float = None,
+                 max_cooldown: float = None, half_open_probes: int = None, probe_timeout: float = None):
+        self.path = path or CIRCUIT_BREAKER_FILE
+        self.failure_threshold = failure_threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.cooldown = cooldown if cooldown is not None else CIRCUIT_COOLDOWN
+        self.max_cooldown = max_cooldown if max_cooldown is not None else CIRCUIT_MAX_COOLDOWN
+        self.half_open_probes = half_open_probes or CIRCUIT_HALF_OPEN_PROBES
+        self.probe_timeout = probe_timeout if probe_timeout is not None else CIRCUIT_PROBE_TIMEOUT
+
+    @contextmanager
+    def _locked_state(self):
+        """Load the state under an exclusive lock (shared across processes) and save it after"""
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, 'r') as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                before = json.dumps(state, sort_keys=True)
+                yield state
+                if json.dumps(state, sort_keys=True) != before:
+                    tmp_path = f"{self.path}.tmp"
+                    with open(tmp_path, 'w') as f:
+                        json.dump(state, f, indent=2)
+                    os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _site(self, state: Dict, site: str) -> Dict:
+        return state.setdefault(site, {
+            'state': CLOSED, 'failures': 0, 'opened_at': None, 'cooldown': self.cooldown, 'probes': {}
+        })
+
+    @staticmethod
+    def _probes(entry: Dict) -> Dict[str, float]:
+        """Running probes of a site (probe ID -> start time)"""
+        if not isinstance(entry.get('probes'), dict):
+            entry['probes'] = {}
+        return entry['probes']
+
+    def allow(self, site: str) -> Tuple[bool, float, Optional[str]]:
+        """
+        Check whether a lookup for a site may run now
+
+        An allowed lookup must be followed by record() with the returned probe ID, which
+        also releases the probe slot.
+
+        Args:
+            site: 'NY' or 'NJ'
+
+        Returns:
+            Tuple of (allowed, seconds until the next probe if not allowed, probe ID if the
+            lookup runs as a half-open probe)
+        """
+        now = time.time()
+        with self._locked_state() as state:
+            entry = self._site(state, site)
+            if entry['state'] == CLOSED:
+                return True, 0.0, None
+
+            if entry['state'] == OPEN:
+                retry_at = entry['opened_at'] + entry['cooldown']
+                if now < retry_at:
+                    return False, retry_at - now, None
+                entry['state'] = HALF_OPEN
+                entry['probes'] = {}
+                print(f"🔌 {site} circuit half-open - probing the site")
+
+            probes = {probe: started for probe, started in self._probes(entry).items()
+                      if now - started < self.probe_timeout}
+            entry['probes'] = probes
+            if len(probes) >= self.half_open_probes:
+                return False, max(1.0, min(probes.values()) + self.probe_timeout - now), None
+            probe = uuid.uuid4().hex[:12]
+            probes[probe] = now
+            return True, 0.0, probe
+
+    def record(self, site: str, result: Optional[Dict], probe: Optional[str] = None):
+        """
+        Record the outcome of an allowed lookup
+
+        While the breaker is not closed only the answer of a running probe changes its state;
+        lookups started before it opened and probes that were given up on are ignored.
+        Results that say nothing about the site (local errors, a raised fetch) only release
+        their probe slot.
+
+        Args:
+            site: 'NY' or 'NJ'
+            result: Fetch result (None if the fetch raised)
+            probe: Probe ID returned by allow()
+        """
+        failed = is_site_failure(result)
+        answered = is_site_answer(result)
+        now = time.time()
+        with self._locked_state() as state:
+            entry = self._site(state, site)
+            is_probe = probe is not None and self._probes(entry).pop(probe, None) is not None
+            if entry['state'] != CLOSED and not is_probe:
+                return
+
+            if answered:
+                if entry['state'] != CLOSED:
+                    print(f"🔌 {site} circuit closed - site is answering again")
+                entry.update(state=CLOSED, failures=0, opened_at=None, cooldown=self.cooldown, probes={})
+                return
+            if not failed:
+                return
+
+            entry['failures'] += 1
+            if entry['state'] == HALF_OPEN:
+                # Failed probe: back off further
+                entry['cooldown'] = min(entry['cooldown'] * 2, self.max_cooldown)
+                entry.update(state=OPEN, opened_at=now, probes={})
+                print(f"🔌 {site} circuit re-opened - probe failed, next try in {entry['cooldown']:.0f}s")
+            elif entry['state'] == CLOSED and entry['failures'] >= self.failure_threshold:
+                entry.update(state=OPEN, opened_at=now, cooldown=self.cooldown, probes={})
+                print(f"🔌 {site} circuit opened after {entry['failures']} failures in a row - "
+                      f"deferring lookups for {entry['cooldown']:.0f}s")
+
+    def status(self) -> Dict[str, Dict]:
+        """State of every site seen so far"""
+        with self._locked_state() as state:
+            return json.loads(json.dumps(state))
+
+    def reset(self, site: str = None):
+        """Close the breaker for one site (or all sites)"""
+        with self._locked_state() as state:
+            for name in ([site] if site else list(state)):
+                state.pop(name, None)
+
+
+circuit_breaker = CircuitBreaker()
+
+CIRCUIT_DEFERRED = counter('tolls_circuit_deferred_total', 'Lookups deferred by an open circuit breaker', ('site',))
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+gauge('tolls_circuit_state', 'Circuit breaker state per site (0 closed, 1 half-open, 2 open)', ('site',),
+      func=lambda: {site: _STATE_VALUES.get(entry.get('state'), 0)
+                    for site, entry in circuit_breaker.status().items()})
+
+
+def deferred_result(site: str, retry_after: float, **lookup) -> Dict:
+    """Result returned instead of fetching while a site's breaker is open"""
+    return {
+        'success': False,
+        'deferred': True,
+        'outcome': 'deferred',
+        'error': f"{site} site is refusing automated lookups - deferred, retry in {retry_after:.0f}s",
+        'retry_after': round(retry_after),
+        'source': site,
+        **lookup
+    }
+
+
+def local_error_result(site: str, error: Exception, **lookup) -> Dict:
+    """Result of a lookup that could not run on this host (no browser slot, low memory, no chromedriver)"""
+    return {
+        'success': False,
+        'outcome': LOCAL_ERROR,
+        'error': str(error),
+        'source': site,
+        **lookup
+    }
+
+
+def guarded_fetch(site: str, fetch: Callable[[], Dict], **lookup) -> Dict:
+    """
+    Run a fetch through the site's circuit breaker
+
+    Args:
+        site: 'NY' or 'NJ'
+        fetch: Performs the lookup and returns its result dictionary
+        **lookup: Lookup fields copied into a deferred result
+
+    Returns:
+        The fetch result, or a deferred result if the breaker is open
+    """
+    if not CIRCUIT_BREAKER:
+        return fetch()
+    allowed, retry_after, probe = circuit_breaker.allow(site)
+    if not allowed:
+        CIRCUIT_DEFERRED.inc(site=site)
+        print(f"⏸️  {site} lookup deferred - circuit open, retry in {retry_after:.0f}s")
+        return deferred_result(site, retry_after, **lookup)
+    result = None
+    try:
+        result = fetch()
+        return result
+    finally:
+        circuit_breaker.record(site, result, probe)
@@ -10,8 +10,12 @@ from datetime import datetime
 from email_reader import EmailReader
 from automation_selenium import extract_toll_info
 from automation_selenium_nj import extract_toll_info_nj
-from email_service import send_toll_info_email
+from email_outbox import EMAIL_QUEUED, queue_toll_info_email
 from account_manager import add_account
+from fetch_executor import process_requests, EMAIL_FETCH_WORKERS
+from request_dedup import RequestDeduplicator
+from metrics import start_metrics_server
+from fetch_supervisor import start_watchdog
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,10 +24,20 @@ load_dotenv()
 # Configuration
 CHECK_INTERVAL = int(os.getenv('EMAIL_CHECK_INTERVAL', '3600'))  # Default: 1 hour
 IMAP_FOLDER = os.getenv('IMAP_FOLDER', 'INBOX')
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '9102'))  # 0 disables /metrics
+
+# Answers repeated requests for the same account/plate from the first run's result
+request_deduplicator = RequestDeduplicator()
 
 
 def process_email_request(email_data):
-    """Process a single email request - handles both NY and NJ accounts sequentially"""
+    """
+    Process a single email request - handles both NY and NJ accounts sequentially
+    
+    Returns:
+        Combined toll data dictionary, None if nothing was fetched successfully, or a
+        `deferred` result if a site's circuit breaker is open (see circuit_breaker)
+    """
     account_number = email_data.get('account_number')
     violation_number = email_data.get('violation_number')
     plate_number = email_data.get('plate_number')
@@ -47,6 +61,7 @@ def process_email_request(email_data):
     combined_violations = 0
     combined_result = None
     sources_processed = []
+    deferred_sources = []
     
     # Process NY account first (if exists)
     if account_number and plate_number:
@@ -57,7 +72,7 @@ def process_email_request(email_data):
         try:
             # Fetch NY toll information
             print("   🔄 Fetching NY toll data...")
-            ny_result = extract_toll_info(account_number, plate_number, headless=False)
+            ny_result = extract_toll_info(account_number, plate_number)
             
             if ny_result.get('success'):
                 print("   ✅ Successfully fetched NY toll data")
@@ -71,6 +86,9 @@ def process_email_request(email_data):
                 combined_violations += violations
                 combined_result = ny_result
                 sources_processed.append('NY')
+            elif ny_result.get('deferred'):
+                print(f"   ⏸️  NY deferred: {ny_result.get('error')}")
+                deferred_sources.append('NY')
             else:
                 error_msg = ny_result.get('error', 'Unknown error')
                 print(f"   ❌ NY failed: {error_msg}")
@@ -89,7 +107,7 @@ def process_email_request(email_data):
         try:
             # Fetch NJ violation information
             print("   🔄 Fetching NJ violation data...")
-            nj_result = extract_toll_info_nj(violation_number, nj_plate_number, headless=False)
+            nj_result = extract_toll_info_nj(violation_number, nj_plate_number)
             
             if nj_result.get('success'):
                 print("   ✅ Successfully fetched NJ violation data")
@@ -112,24 +130,41 @@ def process_email_request(email_data):
                 else:
                     combined_result = nj_result
                 sources_processed.append('NJ')
+            elif nj_result.get('deferred'):
+                print(f"   ⏸️  NJ deferred: {nj_result.get('error')}")
+                deferred_sources.append('NJ')
             else:
                 error_msg = nj_result.get('error', 'Unknown error')
                 print(f"   ❌ NJ failed: {error_msg}")
         except Exception as e:
             print(f"   ❌ Error processing NJ request: {str(e)}")
     
+    # A site is refusing lookups: leave the email unread and answer it in full on a later check
+    if deferred_sources:
+        print(f"   ⏸️  Deferring request until {' and '.join(deferred_sources)} accept lookups again")
+        return {'success': False, 'deferred': True, 'deferred_sources': deferred_sources}
+    
     # Send combined email if we have results
     if combined_result and combined_result.get('success'):
         print(f"   💰 Total Balance: ${combined_balance:.2f} ({' + '.join(sources_processed)})")
         print(f"   ⚠️  Total Violations: {combined_violations}")
         
         if email_address:
-            print(f"   📤 Sending results to {email_address}...")
-            email_sent = send_toll_info_email(email_address, combined_result)
-            if email_sent:
-                print(f"   ✅ Email sent successfully")
+            if queue_toll_info_email(email_address, combined_result) == EMAIL_QUEUED:
+                print(f"   📤 Queued results for {email_address}")
             else:
-                print(f"   ❌ Failed to send email")
+                print(f"   ℹ️  Identical results already sent to {email_address} recently - not sent again")
+    
+    return combined_result
+
+
+def handle_email_request(email_data):
+    """Process an email request unless an identical one was already answered"""
+    result, first_request = request_deduplicator.run(email_data, process_email_request)
+    if first_request is not None:
+        print(f"\n♻️  Duplicate request from {email_data.get('sender_email')} - "
+              f"already answered from the request sent by {first_request.get('sender_email')}")
+    return result
 
 
 def main():
@@ -139,9 +174,13 @@ def main():
     print("=" * 60)
     print(f"Checking emails every {CHECK_INTERVAL} seconds ({CHECK_INTERVAL/60:.1f} minutes)")
     print(f"Email folder: {IMAP_FOLDER}")
+    print(f"Parallel fetch workers: {EMAIL_FETCH_WORKERS}")
+    print(f"Duplicate request window: {request_deduplicator.window_seconds} seconds")
     print("Press Ctrl+C to stop")
     print("=" * 60)
     
+    start_metrics_server(WORKER_METRICS_PORT)
+    start_watchdog()
     reader = EmailReader()
     
     try:
@@ -164,15 +203,25 @@ def main():
                 else:
                     print(f"   📬 Found {len(emails)} email(s) with toll requests")
                     
-                    # Process each email
-                    for email_data in emails:
+                    def mark_read(email_data, result, error):
+                        # Mark email as read once it has been processed
                         email_id = email_data.get('email_id')
-                        process_email_request(email_data)
-                        
-                        # Mark email as read
-                        if email_id:
+                        if error:
+                            print(f"   ❌ Error processing email from {email_data.get('sender_email')}: {str(error)}")
+                        elif result and result.get('deferred'):
+                            print(f"   ⏸️  Left email unread - will retry on the next check")
+                        elif email_id:
                             reader.mark_as_read(email_id)
                             print(f"   ✓ Marked email as read")
+                    
+                    # Process emails in parallel (same sender stays in order)
+                    suppressed_before = request_deduplicator.suppressed
+                    process_requests(emails, handle_email_request, on_done=mark_read)
+                    
+                    suppressed = request_deduplicator.suppressed - suppressed_before
+                    if suppressed:
+                        print(f"   ♻️  Suppressed {suppressed} duplicate request(s) "
+                              f"({request_deduplicator.suppressed} since start)")
             
             except KeyboardInterrupt:
                 print("\n\n⚠️  Stopping email checker...")
@@ -0,0 +1,525 @@
+"""
+Durable outbound email queue with retry and crash recovery
+
+Callers enqueue toll information emails and return immediately. Each email is stored
+in a SQLite outbox (EMAIL_OUTBOX_DB) before anything is sent, so a crash or restart
+between a scrape and its email no longer loses the result. A background sender thread
+delivers queued emails over the shared SMTP connection from email_service.
+
+States:
+    queued  - waiting to be sent (possibly until next_attempt_at after a failure)
+    sending - claimed by a sender; returns to queued if its lease expires (crash)
+    sent    - delivered
+    failed  - gave up after OUTBOX_MAX_ATTEMPTS attempts
+
+Delivery is at-least-once: if a process dies after SMTP accepted a message but before
+it was marked sent, the email is sent again after the lease expires.
+
+Usage:
+    python email_outbox.py drain     # send everything queued now, ignoring backoff
+    python email_outbox.py status    # show counts per state and recent failures
+"""
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from typing import Callable, Dict, List, Optional, Union
+from dotenv import load_dotenv
+from email_service import send_toll_info_email, send_toll_digest_email, get_smtp_connection, EMAIL_FIELDS
+from metrics import EMAILS, gauge
+
+load_dotenv()
+
+# SQLite file holding the outbox
+EMAIL_OUTBOX_DB = os.getenv('EMAIL_OUTBOX_DB',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'email_outbox.db'))
+
+# Attempts before an email is marked failed
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '6'))
+
+# Retry backoff: OUTBOX_RETRY_BASE * 2^(attempt - 1) seconds, capped at OUTBOX_RETRY_MAX
+OUTBOX_RETRY_BASE = int(os.getenv('OUTBOX_RETRY_BASE', '30'))
+OUTBOX_RETRY_MAX = int(os.getenv('OUTBOX_RETRY_MAX', '3600'))
+
+# How long a sender may hold an email in 'sending' before it is considered crashed
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+
+# An identical email (same recipient and toll data) queued within this window is not queued
+# again, unless the send is explicit (force=True)
+OUTBOX_IDEMPOTENCY_WINDOW = int(os.getenv('OUTBOX_IDEMPOTENCY_WINDOW', '3600'))
+
+# What enqueueing an email did
+EMAIL_QUEUED = 'queued'
+EMAIL_DUPLICATE = 'duplicate'  # an identical email was already queued or sent within the window
+
+# Sent/failed rows older than this are deleted
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', '14'))
+
+# How long (seconds) to wait for due emails when the process exits
+OUTBOX_EXIT_TIMEOUT = int(os.getenv('OUTBOX_EXIT_TIMEOUT', '120'))
+
+# Longest the sender thread sleeps before re-checking the outbox (other processes may enqueue)
+OUTBOX_POLL_INTERVAL = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt_at);
+CREATE INDEX IF NOT EXISTS outbox_key ON outbox (idempotency_key, created_at);
+"""
+
+
+def email_payload(toll_data: Dict) -> Dict:
+    """Return the part of a toll result that goes into the email"""
+    return {field: toll_data.get(field) for field in EMAIL_FIELDS if toll_data.get(field) is not None}
+
+
+def idempotency_key(recipient_email: str, payload: Union[Dict, List[Dict]]) -> str:
+    """
+    Build the idempotency key for an email
+
+    Args:
+        recipient_email: Email address to send to
+        payload: Emailed toll data (from email_payload), or a list of them for a digest
+
+    Returns:
+        str: SHA-256 of the normalized recipient and the emailed toll data
+    """
+    content = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(f"{recipient_email.strip().lower()}\n{content}".encode('utf-8')).hexdigest()
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before the next attempt after `attempts` failed attempts"""
+    return min(OUTBOX_RETRY_BASE * (2 ** max(attempts - 1, 0)), OUTBOX_RETRY_MAX)
+
+
+class EmailOutbox:
+    def __init__(self, db_path: str = None):
+        """
+        Initialize the outbox (the sender thread starts on first enqueue or start())
+
+        Args:
+            db_path: SQLite file to use (default: EMAIL_OUTBOX_DB)
+        """
+        self.db_path = db_path or EMAIL_OUTBOX_DB
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._loggers = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._idle = threading.Condition(self._lock)
+
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            conn.execute("DELETE FROM outbox WHERE state IN ('sent', 'failed') AND updated_at < ?",
+                         (time.time() - OUTBOX_RETENTION_DAYS * 86400,))
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection (one per operation, so any thread can use the outbox)"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def start(self):
+        """Start the background sender thread if it isn't running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, recipient_email: str, toll_data: Dict, logger: Optional[Callable] = None,
+                force: bool = False) -> str:
+        """
+        Store a toll information email in the outbox for delivery
+
+        Args:
+            recipient_email: Email address to send to
+            toll_data: Dictionary containing toll information
+            logger: Optional logger function used by the sender thread in this process
+            force: Queue it even if an identical email went out within OUTBOX_IDEMPOTENCY_WINDOW
+                   (explicit sends)
+
+        Returns:
+            str: EMAIL_QUEUED once the email is stored, EMAIL_DUPLICATE if an identical one
+                 was already queued or sent (nothing new is queued)
+        """
+        return self._store(recipient_email, email_payload(toll_data), logger, force)
+
+    def enqueue_digest(self, recipient_email: str, toll_results: List[Dict],
+                       logger: Optional[Callable] = None, force: bool = False) -> str:
+        """
+        Store one email covering several of a recipient's accounts
+
+        Args:
+            recipient_email: Email address to send to
+            toll_results: List of toll information dictionaries, one per account
+            logger: Optional logger function used by the sender thread in this process
+            force: Queue it even if an identical email went out within OUTBOX_IDEMPOTENCY_WINDOW
+
+        Returns:
+            str: EMAIL_QUEUED or EMAIL_DUPLICATE (see enqueue)
+        """
+        if len(toll_results) == 1:
+            return self.enqueue(recipient_email, toll_results[0], logger=logger, force=force)
+        return self._store(recipient_email, [email_payload(toll_data) for toll_data in toll_results], logger, force)
+
+    def _store(self, recipient_email: str, payload: Union[Dict, List[Dict]], logger: Optional[Callable],
+               force: bool = False) -> str:
+        """Insert an email into the outbox unless an identical one is recent (or force is set)"""
+        log = logger if logger else print
+        key = idempotency_key(recipient_email, payload)
+        payload = json.dumps(payload, default=str)
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = None if force else conn.execute(
+                "SELECT id, state FROM outbox WHERE idempotency_key = ? AND state != 'failed' "
+                "AND created_at >= ? ORDER BY id DESC LIMIT 1",
+                (key, now - OUTBOX_IDEMPOTENCY_WINDOW)
+            ).fetchone()
+            if existing:
+                conn.execute("COMMIT")
+                log(f"ℹ️  Identical email to {recipient_email} already {existing['state']} (outbox #{existing['id']}) "
+                    f"- not queued again")
+                return EMAIL_DUPLICATE
+
+            cursor = conn.execute(
+                "INSERT INTO outbox (idempotency_key, recipient, payload, state, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (key, recipient_email, payload, now, now, now)
+            )
+            if logger:
+                self._loggers[cursor.lastrowid] = logger
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        self.start()
+        self._wakeup.set()
+        return EMAIL_QUEUED
+
+    def _claim(self, ignore_backoff: bool = False) -> Optional[sqlite3.Row]:
+        """
+        Claim the next due email (moving it to 'sending')
+
+        Emails left in 'sending' by a crashed process are returned to the queue first.
+
+        Args:
+            ignore_backoff: Claim queued emails even if their retry time hasn't come yet
+
+        Returns:
+            The claimed row, or None if nothing is due
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE outbox SET state = 'queued', lease_until = NULL, updated_at = ? "
+                "WHERE state = 'sending' AND lease_until < ?",
+                (now, now)
+            )
+            row = conn.execute(
+                "SELECT * FROM outbox WHERE state = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT 1",
+                (float('inf') if ignore_backoff else now,)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE outbox SET state = 'sending', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (now + OUTBOX_LEASE_SECONDS, now, row['id'])
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _deliver(self, row: sqlite3.Row) -> str:
+        """
+        Send a claimed email and record the outcome
+
+        Returns:
+            str: New state ('sent', 'queued' for a scheduled retry, or 'failed')
+        """
+        logger = self._loggers.get(row['id'])
+        log = logger if logger else print
+        attempts = row['attempts'] + 1
+        error = None
+
+        try:
+            payload = json.loads(row['payload'])
+            if isinstance(payload, list):
+                sent = send_toll_digest_email(row['recipient'], payload, logger=logger)
+            else:
+                sent = send_toll_info_email(row['recipient'], payload, logger=logger)
+            if not sent:
+                error = 'SMTP send failed'
+        except Exception as e:
+            error = str(e)
+
+        now = time.time()
+        if error is None:
+            state, next_attempt_at = 'sent', row['next_attempt_at']
+            self.sent += 1
+            EMAILS.inc(outcome='sent')
+        elif attempts < OUTBOX_MAX_ATTEMPTS:
+            state, next_attempt_at = 'queued', now + retry_delay(attempts)
+            self.retried += 1
+            EMAILS.inc(outcome='retry')
+            log(f"⚠️  Email to {row['recipient']} failed (attempt {attempts}/{OUTBOX_MAX_ATTEMPTS}), "
+                f"retrying in {retry_delay(attempts):.0f}s: {error}")
+        else:
+            state, next_attempt_at = 'failed', row['next_attempt_at']
+            self.failed += 1
+            EMAILS.inc(outcome='failed')
+            log(f"❌ Email to {row['recipient']} failed after {attempts} attempts: {error}")
+
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE outbox SET state = ?, next_attempt_at = ?, lease_until = NULL, last_error = ?, updated_at = ? "
+                "WHERE id = ?",
+                (state, next_attempt_at, error, now, row['id'])
+            )
+        if state != 'queued':
+            self._loggers.pop(row['id'], None)
+        return state
+
+    def _next_due_in(self) -> float:
+        """Seconds until the next queued email is due (capped at the poll interval)"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE state = 'queued'").fetchone()
+        if row[0] is None:
+            return OUTBOX_POLL_INTERVAL
+        return min(max(row[0] - time.time(), 0), OUTBOX_POLL_INTERVAL)
+
+    def _run(self):
+        """Sender thread: deliver due emails one at a time"""
+        while True:
+            try:
+                with self._lock:
+                    self._busy += 1
+                try:
+                    row = self._claim()
+                    if row:
+                        self._deliver(row)
+                        continue
+                finally:
+                    with self._lock:
+                        self._busy -= 1
+                        self._idle.notify_all()
+
+                self._wakeup.wait(self._next_due_in())
+                self._wakeup.clear()
+            except Exception as e:
+                print(f"❌ Email outbox error: {str(e)}")
+                time.sleep(OUTBOX_POLL_INTERVAL)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of emails in each state"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall()
+        counts = {'queued': 0, 'sending': 0, 'sent': 0, 'failed': 0}
+        counts.update({state: count for state, count in rows})
+        return counts
+
+    def pending(self) -> int:
+        """Number of emails queued or being sent"""
+        counts = self.counts()
+        return counts['queued'] + counts['sending']
+
+    def _due(self) -> int:
+        """Number of emails due now or being sent"""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE state = 'sending' OR (state = 'queued' AND next_attempt_at <= ?)",
+                (time.time(),)
+            ).fetchone()[0]
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every email that is due has been sent, failed or scheduled for retry
+
+        Emails waiting out a retry backoff stay in the outbox and don't block the flush.
+
+        Args:
+            timeout: Maximum seconds to wait (None waits forever)
+
+        Returns:
+            bool: True if nothing is due, False if the timeout expired first
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        if self._due():
+            self.start()
+            self._wakeup.set()
+        while True:
+            with self._lock:
+                while self._busy:
+                    self._idle.wait(0.5)
+            if not self._due():
+                return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            self._wakeup.set()
+            time.sleep(0.2)
+
+    def drain(self, log: Callable = print) -> Dict[str, int]:
+        """
+        Send every queued email now, ignoring retry backoff (one attempt each)
+
+        Returns:
+            Dictionary with counts of emails sent, retried and failed
+        """
+        totals = {'sent': 0, 'queued': 0, 'failed': 0}
+        attempted = set()
+        while True:
+            row = self._claim(ignore_backoff=True)
+            if row is None:
+                break
+            if row['id'] in attempted:
+                # Already tried during this drain - put it back and stop
+                with closing(self._connect()) as conn:
+                    conn.execute("UPDATE outbox SET state = 'queued', attempts = attempts - 1, lease_until = NULL "
+                                 "WHERE id = ?", (row['id'],))
+                break
+            attempted.add(row['id'])
+            log(f"📤 Sending outbox #{row['id']} to {row['recipient']} (attempt {row['attempts'] + 1})")
+            totals[self._deliver(row)] += 1
+        return totals
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> EmailOutbox:
+    """
+    Return the process-wide outbox
+
+    If emails were left queued by an earlier run, the sender thread is started so they
+    go out without waiting for a new enqueue.
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EmailOutbox()
+            atexit.register(_flush_on_exit)
+            if _outbox.pending():
+                print(f"📥 Found {_outbox.pending()} queued email(s) from an earlier run, resuming delivery")
+                _outbox.start()
+        return _outbox
+
+
+def _outbox_counts() -> Dict[str, int]:
+    # Only report once this process has used the outbox
+    return _outbox.counts() if _outbox is not None else {}
+
+
+gauge('tolls_email_outbox_messages', 'Email outbox rows by state', ('state',), func=_outbox_counts)
+
+
+def queue_toll_info_email(recipient_email: str, toll_data: Dict, logger: Optional[Callable] = None,
+                          force: bool = False) -> str:
+    """
+    Queue toll information for delivery without blocking on SMTP
+
+    Args:
+        recipient_email: Email address to send to
+        toll_data: Dictionary containing toll information
+        logger: Optional logger function to use instead of print()
+        force: Queue it even if an identical email went out recently (explicit sends)
+
+    Returns:
+        str: EMAIL_QUEUED once the email is stored in the outbox, EMAIL_DUPLICATE if an
+             identical email was already queued or sent
+    """
+    return get_outbox().enqueue(recipient_email, toll_data, logger=logger, force=force)
+
+
+def queue_toll_digest_email(recipient_email: str, toll_results: List[Dict],
+                            logger: Optional[Callable] = None, force: bool = False) -> str:
+    """
+    Queue one email covering several of a recipient's accounts
+
+    Args:
+        recipient_email: Email address to send to
+        toll_results: List of toll information dictionaries, one per account
+        logger: Optional logger function to use instead of print()
+        force: Queue it even if an identical email went out recently
+
+    Returns:
+        str: EMAIL_QUEUED or EMAIL_DUPLICATE (see queue_toll_info_email)
+    """
+    return get_outbox().enqueue_digest(recipient_email, toll_results, logger=logger, force=force)
+
+
+def _flush_on_exit():
+    """Give due emails a chance to go out before the process exits"""
+    outbox = _outbox
+    if outbox and outbox.pending():
+        print("📤 Sending queued email(s) before exit...")
+        outbox.flush(timeout=OUTBOX_EXIT_TIMEOUT)
+        if outbox.pending():
+            print(f"📥 {outbox.pending()} email(s) remain in the outbox and will be retried on next run")
+    get_smtp_connection().close()
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    outbox = EmailOutbox()
+
+    if command == 'drain':
+        print(f"📤 Draining email outbox ({outbox.pending()} pending)...")
+        totals = outbox.drain()
+        print(f"✅ Drain complete: {totals['sent']} sent, {totals['queued']} will retry, {totals['failed']} failed")
+        get_smtp_connection().close()
+    elif command == 'status':
+        counts = outbox.counts()
+        print(f"📬 Email outbox ({outbox.db_path})")
+        for state in ('queued', 'sending', 'sent', 'failed'):
+            print(f"   {state:8s} {counts[state]}")
+        with closing(outbox._connect()) as conn:
+            failures = conn.execute(
+                "SELECT id, recipient, attempts, last_error FROM outbox WHERE state = 'failed' "
+                "ORDER BY updated_at DESC LIMIT 10"
+            ).fetchall()
+        for row in failures:
+            print(f"   ❌ #{row['id']} {row['recipient']} ({row['attempts']} attempts): {row['last_error']}")
+    else:
+        print("Usage: python email_outbox.py [drain|status]")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,12 +7,148 @@ from email.message import Message
 from email.header import decode_header
 import os
 import re
+import json
 from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from metrics import IMAP_POLL_DURATION
 
 load_dotenv()
 
 
+# Field patterns, in priority order. For each field the first pattern that matches
+# anywhere in the text wins, and for that pattern the leftmost match wins.
+# Narrower spellings such as "Account: ...", "NY Account: ...", "NJ Violation: ..."
+# and "License Plate: ..." are already matched by the general label pattern for
+# their field, which comes first, so they don't need patterns of their own.
+
+# Patterns to match account number (typically digits, minimum 3 characters)
+# Support formats like:
+# - "NY Toll Bill Account Number: 752918782"
+# - "Account Number: 752918782"
+# - "Account: 752918782"
+ACCOUNT_PATTERNS = [
+    r'ny\s*toll\s*bill\s*account\s*number\s*[:\-]?\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
+    r'account\s*(?:number|#|num)?\s*[:\-]?\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
+    r'acc\s*[:]\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
+]
+
+# Patterns to match violation number (for NJ, typically starts with T or similar)
+VIOLATION_PATTERNS = [
+    r'violation\s*(?:number|#|num)?\s*[:\-]?\s*([a-z0-9]{8,}(?:[\-]?[a-z0-9]+)*)',
+    r'invoice\s*(?:number|#)?\s*[:\-]?\s*([a-z0-9]{8,}(?:[\-]?[a-z0-9]+)*)',
+]
+
+# Patterns to match plate number (typically alphanumeric, minimum 2 characters)
+# Support formats like:
+# - "Plate Number: AULAKH13"
+# - "Plate: AULAKH13"
+PLATE_PATTERNS = [
+    r'plate\s*(?:number|#|num)?\s*[:\-]?\s*([a-z0-9]{2,}(?:[\-]?[a-z0-9]+)*)',
+]
+
+# Patterns to match an explicit email field
+# Support multiple formats:
+# - "Email: user@example.com"
+# - "Email Address: user@example.com"
+# - "Email Address (for toll bill notifications): user@example.com"
+EMAIL_FIELD_PATTERNS = [
+    r'email\s*address\s*\([^)]+\)\s*[:\-]?\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',
+    r'email\s*address\s*[:\-]?\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',
+    r'email\s*[:\-]?\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',
+]
+
+FIELD_PATTERNS = [
+    ('account', ACCOUNT_PATTERNS),
+    ('violation', VIOLATION_PATTERNS),
+    ('plate', PLATE_PATTERNS),
+    ('email', EMAIL_FIELD_PATTERNS),
+]
+
+
+def _compile_field_scanner(flags=0):
+    """
+    Compile all field patterns into one scanner
+    
+    Each field pattern starts with its own label word, so at any position in the text
+    at most one field can match, and an alternation in priority order picks the best
+    pattern for that position. Only the label is consumed; the rest of each pattern
+    sits inside a lookahead, so a value that happens to contain another label is
+    still seen by the next match.
+    
+    Args:
+        flags: re flags to compile with
+        
+    Returns:
+        Tuple of (compiled scanner, dict of group name -> (field, priority, value group))
+    """
+    alternatives = []
+    for field, patterns in FIELD_PATTERNS:
+        for priority, pattern in enumerate(patterns):
+            label = re.match(r'[a-z]+', pattern).group(0)
+            rest = pattern[len(label):]
+            alternatives.append(f'{label}(?P<{field}_{priority}>(?={rest}))')
+    
+    scanner = re.compile('|'.join(alternatives), flags)
+    
+    # Each field pattern has exactly one capture group, which directly follows the
+    # named group wrapping the rest of the pattern
+    groups = {}
+    for field, patterns in FIELD_PATTERNS:
+        for priority in range(len(patterns)):
+            name = f'{field}_{priority}'
+            groups[name] = (field, priority, scanner.groupindex[name] + 1)
+    
+    return scanner, groups
+
+
+# The text is lower-cased before scanning, so for plain ASCII text a case-sensitive
+# scan finds exactly what IGNORECASE would, and lets the regex engine skip ahead much
+# faster. A few non-ASCII letters case-fold onto ASCII ones (e.g. 'ſ' matches 's'
+# under IGNORECASE), so anything else keeps the IGNORECASE scanner.
+_FIELD_SCANNER, _FIELD_GROUPS = _compile_field_scanner()
+_FIELD_SCANNER_IGNORECASE, _ = _compile_field_scanner(re.IGNORECASE)
+_NON_ID_CHARS = re.compile(r'[^a-zA-Z0-9\-]')
+_JSON_OBJECT = re.compile(r'\{[^}]+\}', re.DOTALL)
+_FROM_BRACKETS = re.compile(r'<([^>]+)>')
+_EMAIL_ADDRESS = re.compile(r'\b([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b')
+
+# Common false positive words to reject
+_FALSE_POSITIVES = {'AND', 'OR', 'THE', 'UUID', 'ID', 'NUMBER', 'ACCOUNT', 'PLATE', 'VIOLATION', 'EMAIL'}
+
+
+def _scan_fields(text: str) -> Dict[str, str]:
+    """
+    Find account, violation, plate and email values in one pass over the text
+    
+    For each field the highest-priority pattern wins, and for that pattern the
+    leftmost match wins - the same result as trying each pattern in order with
+    re.search() and stopping at the first hit.
+    
+    Args:
+        text: Lower-cased subject and body
+        
+    Returns:
+        Dictionary mapping field name to the raw captured value
+    """
+    scanner = _FIELD_SCANNER if text.isascii() else _FIELD_SCANNER_IGNORECASE
+    
+    best = {}  # field -> (priority, value)
+    top_priority_found = 0
+    for match in scanner.finditer(text):
+        # The named group wrapping the pattern closes last, so it is lastgroup
+        field, priority, group = _FIELD_GROUPS[match.lastgroup]
+        current = best.get(field)
+        if current is None or priority < current[0]:
+            best[field] = (priority, match.group(group))
+            if priority == 0:
+                top_priority_found += 1
+                # Nothing later in the text can beat a top-priority match
+                if top_priority_found == len(FIELD_PATTERNS):
+                    break
+    
+    return {field: value for field, (_, value) in best.items()}
+
+
 class EmailReader:
     def __init__(self):
         """Initialize email reader with IMAP configuration"""
@@ -124,93 +260,37 @@ class EmailReader:
             # Still allow if explicitly contains valid account data, but be more strict
             pass  # Will validate more strictly below
         
-        # Patterns to match account number (typically digits, minimum 3 characters)
-        # Support formats like:
-        # - "NY Toll Bill Account Number: 752918782"
-        # - "Account Number: 752918782"
-        # - "Account: 752918782"
-        account_patterns = [
-            r'ny\s*toll\s*bill\s*account\s*number\s*[:\-]?\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
-            r'account\s*(?:number|#|num)?\s*[:\-]?\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
-            r'account\s*[:]\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
-            r'account[:]\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
-            r'acc\s*[:]\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
-            r'ny\s*account\s*[:\-]?\s*([a-z0-9]{3,}(?:[\-]?[a-z0-9]+)*)',
-        ]
-        
-        # Patterns to match violation number (for NJ, typically starts with T or similar)
-        violation_patterns = [
-            r'violation\s*(?:number|#|num)?\s*[:\-]?\s*([a-z0-9]{8,}(?:[\-]?[a-z0-9]+)*)',
-            r'violation\s*[:]\s*([a-z0-9]{8,}(?:[\-]?[a-z0-9]+)*)',
-            r'nj\s*violation\s*[:\-]?\s*([a-z0-9]{8,}(?:[\-]?[a-z0-9]+)*)',
-            r'invoice\s*(?:number|#)?\s*[:\-]?\s*([a-z0-9]{8,}(?:[\-]?[a-z0-9]+)*)',
-        ]
-        
-        # Patterns to match plate number (typically alphanumeric, minimum 2 characters)
-        # Support formats like:
-        # - "Plate Number: AULAKH13"
-        # - "Plate: AULAKH13"
-        plate_patterns = [
-            r'plate\s*(?:number|#|num)?\s*[:\-]?\s*([a-z0-9]{2,}(?:[\-]?[a-z0-9]+)*)',
-            r'plate\s*[:]\s*([a-z0-9]{2,}(?:[\-]?[a-z0-9]+)*)',
-            r'license\s*plate\s*[:\-]?\s*([a-z0-9]{2,}(?:[\-]?[a-z0-9]+)*)',
-            r'plate[:]\s*([a-z0-9]{2,}(?:[\-]?[a-z0-9]+)*)',
-        ]
-        
-        # Pattern to match email address
-        email_pattern = r'\b([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b'
-        
         account_number = None
         violation_number = None
         plate_number = None
         email_address = None
         source = 'NY'  # Default to NY
         
-        # Try to extract account number (NY)
-        for pattern in account_patterns:
-            match = re.search(pattern, full_text, re.IGNORECASE)
-            if match:
-                account_number = match.group(1).strip().upper()
-                # Clean up common separators
-                account_number = account_number.replace('-', '').replace(' ', '')
-                break
+        # Find account, violation, plate and email fields in a single scan
+        fields = _scan_fields(full_text)
         
-        # Try to extract violation number (NJ)
-        for pattern in violation_patterns:
-            match = re.search(pattern, full_text, re.IGNORECASE)
-            if match:
-                violation_number = match.group(1).strip().upper()
-                # Clean up common separators
-                violation_number = violation_number.replace('-', '').replace(' ', '')
-                source = 'NJ'
-                break
+        # Account number (NY)
+        if 'account' in fields:
+            account_number = fields['account'].strip().upper()
+            # Clean up common separators
+            account_number = account_number.replace('-', '').replace(' ', '')
         
-        # Try to extract plate number
-        for pattern in plate_patterns:
-            match = re.search(pattern, full_text, re.IGNORECASE)
-            if match:
-                plate_number = match.group(1).strip().upper()
-                # Clean up common separators but keep hyphens
-                plate_number = plate_number.replace(' ', '')
-                break
+        # Violation number (NJ)
+        if 'violation' in fields:
+            violation_number = fields['violation'].strip().upper()
+            # Clean up common separators
+            violation_number = violation_number.replace('-', '').replace(' ', '')
+            source = 'NJ'
         
-        # Try to extract email (look for explicit email field first)
-        # Support multiple formats:
-        # - "Email: user@example.com"
-        # - "Email Address: user@example.com"
-        # - "Email Address (for toll bill notifications): user@example.com"
-        email_patterns = [
-            r'email\s*address\s*\([^)]+\)\s*[:\-]?\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',  # "Email Address (for toll bill notifications): ..."
-            r'email\s*address\s*[:\-]?\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',  # "Email Address: ..."
-            r'email\s*[:\-]?\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',  # "Email: ..."
-        ]
+        # Plate number
+        if 'plate' in fields:
+            plate_number = fields['plate'].strip().upper()
+            # Clean up common separators but keep hyphens
+            plate_number = plate_number.replace(' ', '')
         
-        email_address = None
-        for pattern in email_patterns:
-            email_field_match = re.search(pattern, full_text, re.IGNORECASE)
-            if email_field_match:
-                email_address = email_field_match.group(1).strip().lower()
-                break
+        # Explicit email field
+        if 'email' in fields:
+            email_address = fields['email'].strip().lower()
         
         # If no email found, don't default to sender email - this causes all accounts to get the monitoring email
         # Only use sender email if it's NOT the monitoring email (myezpassdata@gmail.com)
@@ -226,17 +306,14 @@ class EmailReader:
         # But validate they're not too short (likely false matches)
         has_account_data = False
         
-        # Common false positive words to reject
-        false_positives = {'AND', 'OR', 'THE', 'UUID', 'ID', 'NUMBER', 'ACCOUNT', 'PLATE', 'VIOLATION', 'EMAIL'}
-        
         if account_number and plate_number:
             # Clean account number (remove non-alphanumeric except hyphens)
-            account_number = re.sub(r'[^a-zA-Z0-9\-]', '', account_number).upper()
+            account_number = _NON_ID_CHARS.sub('', account_number).upper()
             # Clean plate number (remove non-alphanumeric except hyphens)
-            plate_number = re.sub(r'[^a-zA-Z0-9\-]', '', plate_number).upper()
+            plate_number = _NON_ID_CHARS.sub('', plate_number).upper()
             
             # Reject common false positives
-            if account_number in false_positives or plate_number in false_positives:
+            if account_number in _FALSE_POSITIVES or plate_number in _FALSE_POSITIVES:
                 return None
             
             # Validate minimum length and format
@@ -253,12 +330,12 @@ class EmailReader:
         
         if violation_number and plate_number:
             # Clean violation number
-            violation_number = re.sub(r'[^a-zA-Z0-9\-]', '', violation_number).upper()
+            violation_number = _NON_ID_CHARS.sub('', violation_number).upper()
             # Clean plate number
-            plate_number = re.sub(r'[^a-zA-Z0-9\-]', '', plate_number).upper()
+            plate_number = _NON_ID_CHARS.sub('', plate_number).upper()
             
             # Reject common false positives
-            if violation_number in false_positives or plate_number in false_positives:
+            if violation_number in _FALSE_POSITIVES or plate_number in _FALSE_POSITIVES:
                 return None
             
             # Validate minimum length and format
@@ -302,9 +379,8 @@ class EmailReader:
         
         # Try JSON format
         try:
-            json_match = re.search(r'\{[^}]+\}', email_body, re.DOTALL)
+            json_match = _JSON_OBJECT.search(email_body)
             if json_match:
-                import json
                 json_data = json.loads(json_match.group(0))
                 if 'account_number' in json_data and 'plate_number' in json_data:
                     return {
@@ -329,6 +405,10 @@ class EmailReader:
         Returns:
             List of email dictionaries with parsed data
         """
+        with IMAP_POLL_DURATION.time():
+            return self._get_unread_emails(folder, limit)
+    
+    def _get_unread_emails(self, folder: str, limit: int) -> List[Dict]:
         if not self.connection:
             if not self.connect():
                 return []
@@ -355,8 +435,8 @@ class EmailReader:
             
             for email_id in email_ids:
                 try:
-                    # Fetch email
-                    status, msg_data = self.connection.fetch(email_id, '(RFC822)')
+                    # Fetch email without setting \Seen (only mark_as_read marks a request as handled)
+                    status, msg_data = self.connection.fetch(email_id, '(BODY.PEEK[])')
                     
                     if status != 'OK':
                         continue
@@ -370,12 +450,12 @@ class EmailReader:
                     from_email = self.decode_mime_words(msg["From"] or "")
                     
                     # Extract email address from "Name <email@example.com>" format
-                    from_match = re.search(r'<([^>]+)>', from_email)
+                    from_match = _FROM_BRACKETS.search(from_email)
                     if from_match:
                         from_email = from_match.group(1)
                     else:
                         # If no brackets, extract email pattern
-                        email_match = re.search(r'\b([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b', from_email)
+                        email_match = _EMAIL_ADDRESS.search(from_email)
                         if email_match:
                             from_email = email_match.group(1)
                     
@@ -2,26 +2,384 @@
 Email service for sending toll information to users
 """
 import smtplib
+import threading
+import time
+import traceback
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-from jinja2 import Template
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 import os
 from dotenv import load_dotenv
+from metrics import SMTP_SEND_DURATION
 
 # Load environment variables from .env file
 load_dotenv()
 
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+EMAIL_TEMPLATE_NAME = 'email_template.html'
+
+
+class SMTPConnection:
+    """
+    Persistent, authenticated SMTP connection reused across messages
+    
+    Connects and logs in on first use, then keeps the session open. If the server
+    drops the connection (idle timeout, restart), the next send reconnects and
+    re-authenticates once before giving up.
+    """
+    
+    def __init__(self, server: str = None, port: int = None, username: str = None, password: str = None,
+                 timeout: int = 30):
+        """Initialize SMTP connection settings (defaults come from environment variables)"""
+        self.smtp_server = server or os.getenv('SMTP_SERVER', 'smtp.gmail.com')
+        self.smtp_port = port or int(os.getenv('SMTP_PORT', '587'))
+        self.username = username if username is not None else os.getenv('SMTP_USERNAME', '')
+        self.password = password if password is not None else os.getenv('SMTP_PASSWORD', '')
+        self.timeout = timeout
+        self.server = None
+        self._lock = threading.Lock()
+    
+    def is_configured(self) -> bool:
+        """Check whether SMTP credentials are set"""
+        return bool(self.username and self.password)
+    
+    def _connect(self, log):
+        """Open the connection and log in"""
+        # Use SSL for port 465, STARTTLS for port 587
+        if self.smtp_port == 465:
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+            server.starttls()
+        
+        try:
+            server.login(self.username, self.password)
+        except smtplib.SMTPAuthenticationError as auth_error:
+            error_msg = str(auth_error)
+            log(f"❌ Authentication failed: {error_msg}")
+            if "BadCredentials" in error_msg or "Username and Password not accepted" in error_msg:
+                log("\n💡 Common fixes for Gmail:")
+                log("   1. Make sure you're using an App Password (not your regular password)")
+                log("   2. Generate App Password at: https://myaccount.google.com/apppasswords")
+                log("   3. Enable 2-Step Verification first if you haven't")
+                log("   4. Make sure SMTP_USERNAME is your full email address")
+            self._close_server(server)
+            raise
+        except Exception:
+            self._close_server(server)
+            raise
+        
+        self.server = server
+        log(f"🔌 Connected to SMTP server {self.smtp_server}:{self.smtp_port}")
+    
+    def _close_server(self, server):
+        """Close an SMTP server object, ignoring errors"""
+        try:
+            if self.smtp_port != 465:
+                server.quit()
+            else:
+                server.close()
+        except Exception:
+            pass
+    
+    def send(self, msg, log=print) -> bool:
+        """
+        Send a message over the shared connection
+        
+        Args:
+            msg: Email message to send
+            log: Logger function
+            
+        Returns:
+            bool: True if the message was accepted by the server, False otherwise
+        """
+        start = time.perf_counter()
+        sent = self._send(msg, log)
+        SMTP_SEND_DURATION.observe(time.perf_counter() - start, outcome='sent' if sent else 'failed')
+        return sent
+    
+    def _send(self, msg, log) -> bool:
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self.server is None:
+                        self._connect(log)
+                    self.server.send_message(msg)
+                    return True
+                except (smtplib.SMTPServerDisconnected, ConnectionError) as disconnect_error:
+                    # Server dropped the session - reconnect and re-authenticate once
+                    self.server = None
+                    if attempt == 0:
+                        log(f"🔄 SMTP connection lost ({str(disconnect_error) or 'disconnected'}), reconnecting...")
+                        continue
+                    log(f"❌ SMTP error sending email: {str(disconnect_error)}")
+                    return False
+                except smtplib.SMTPAuthenticationError:
+                    # Already logged with hints by _connect
+                    return False
+                except smtplib.SMTPResponseException as smtp_error:
+                    # Server rejected this message but the session is still usable
+                    log(f"❌ SMTP error sending email: {str(smtp_error)}")
+                    return False
+                except Exception as e:
+                    log(f"❌ SMTP error sending email: {str(e)}")
+                    log(traceback.format_exc())
+                    if self.server is not None:
+                        self._close_server(self.server)
+                        self.server = None
+                    return False
+            return False
+    
+    def close(self):
+        """Close the connection if it is open"""
+        with self._lock:
+            if self.server is not None:
+                self._close_server(self.server)
+                self.server = None
+
+
+_smtp_connection = None
+_smtp_connection_lock = threading.Lock()
+
+
+def get_smtp_connection() -> SMTPConnection:
+    """Return the process-wide shared SMTP connection"""
+    global _smtp_connection
+    with _smtp_connection_lock:
+        if _smtp_connection is None:
+            _smtp_connection = SMTPConnection()
+        return _smtp_connection
+
+
+# Toll data fields used by build_toll_info_message
+EMAIL_FIELDS = (
+    'account_number', 'plate_number', 'violation_number', 'nj_violation_number', 'nj_plate_number',
+    'balance_amount', 'ny_balance_amount', 'nj_balance_amount', 'toll_bill_numbers',
+    'violation_count', 'sources'
+)
+
+
+_template_env = None
+_template_env_lock = threading.Lock()
+
+
+def get_template_environment() -> Environment:
+    """
+    Return the process-wide Jinja environment used for email templates
+    
+    Templates are compiled once and kept in memory. auto_reload checks the file's
+    mtime on each lookup, so edits to the template are picked up without a restart.
+    Compiled bytecode is also cached on disk (EMAIL_TEMPLATE_CACHE_DIR, default: the
+    system temp dir) so new worker processes skip the compile step too.
+    """
+    global _template_env
+    with _template_env_lock:
+        if _template_env is None:
+            cache_dir = os.getenv('EMAIL_TEMPLATE_CACHE_DIR') or None
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            _template_env = Environment(
+                loader=FileSystemLoader(TEMPLATES_DIR),
+                bytecode_cache=FileSystemBytecodeCache(cache_dir),
+                auto_reload=True
+            )
+        return _template_env
+
+
+def _parse_balance(value) -> float:
+    """Convert a balance value to float (None or invalid values become 0.0)"""
+    try:
+        return float(value) if value is not None else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def toll_account_context(toll_data, logger=None):
+    """
+    Prepare one account's toll data for the email template
+    
+    Args:
+        toll_data: Dictionary containing toll information
+        logger: Optional logger function to use instead of print()
+        
+    Returns:
+        Dictionary of display values for the account
+    """
+    log = logger if logger else print
+    
+    balance_due_raw = _parse_balance(toll_data.get('balance_amount', 0))
+    ny_balance_raw = _parse_balance(toll_data.get('ny_balance_amount', 0))
+    nj_balance_raw = _parse_balance(toll_data.get('nj_balance_amount', 0))
+    sources = toll_data.get('sources', [])
+    has_ny = bool('NY' in sources or toll_data.get('account_number'))
+    has_nj = bool('NJ' in sources or toll_data.get('violation_number') or toll_data.get('nj_violation_number'))
+    
+    # If NY balance is 0 but balance_amount has value and it's a NY-only account, use balance_amount
+    if ny_balance_raw == 0 and balance_due_raw > 0:
+        if has_ny and not has_nj:
+            # NY-only account, use balance_amount as ny_balance
+            ny_balance_raw = balance_due_raw
+            log(f"Using balance_amount (${balance_due_raw:.2f}) as ny_balance_amount for NY-only account")
+    
+    return {
+        'account_number': toll_data.get('account_number', 'N/A'),
+        'plate_number': toll_data.get('plate_number', 'N/A'),
+        'violation_number': toll_data.get('violation_number') or toll_data.get('nj_violation_number', 'N/A'),
+        'nj_plate_number': toll_data.get('nj_plate_number', toll_data.get('plate_number', 'N/A')),
+        'balance': balance_due_raw,
+        'ny_balance': ny_balance_raw,
+        'nj_balance': nj_balance_raw,
+        'balance_due': f"{balance_due_raw:.2f}",
+        'ny_balance_due': f"{ny_balance_raw:.2f}",
+        'nj_balance_due': f"{nj_balance_raw:.2f}",
+        'bill_numbers': toll_data.get('toll_bill_numbers', []) or [],
+        'violation_count': toll_data.get('violation_count', 0) or 0,
+        'has_ny': has_ny,
+        'has_nj': has_nj,
+        'sources': sources
+    }
+
+
+def build_toll_info_message(recipient_email, toll_data, sender, logger=None):
+    """
+    Build the toll information email (HTML and plain text)
+    
+    Args:
+        recipient_email: Email address to send to
+        toll_data: Dictionary containing toll information
+        sender: From address
+        logger: Optional logger function to use instead of print()
+        
+    Returns:
+        MIMEMultipart message ready to send
+    """
+    return build_toll_digest_message(recipient_email, [toll_data], sender, logger=logger)
+
+
+def build_toll_digest_message(recipient_email, toll_results, sender, logger=None):
+    """
+    Build one email covering all of a recipient's accounts (HTML and plain text)
+    
+    With a single account this is the regular toll information email.
+    
+    Args:
+        recipient_email: Email address to send to
+        toll_results: List of toll information dictionaries, one per account
+        sender: From address
+        logger: Optional logger function to use instead of print()
+        
+    Returns:
+        MIMEMultipart message ready to send
+    """
+    accounts = [toll_account_context(toll_data, logger=logger) for toll_data in toll_results]
+    is_digest = len(accounts) > 1
+    
+    # Totals across all accounts
+    has_ny = any(account['has_ny'] for account in accounts)
+    has_nj = any(account['has_nj'] for account in accounts)
+    balance_due = f"{sum(account['balance'] for account in accounts):.2f}"
+    ny_balance_due = f"{sum(account['ny_balance'] for account in accounts):.2f}"
+    nj_balance_due = f"{sum(account['nj_balance'] for account in accounts):.2f}"
+    violation_count = sum(account['violation_count'] for account in accounts)
+    bill_numbers = []
+    for account in accounts:
+        bill_numbers.extend(bill for bill in account['bill_numbers'] if bill not in bill_numbers)
+    date = datetime.now().strftime('%B %d, %Y at %I:%M %p')
+    
+    # Compiled template from the shared environment (recompiled only if the file changes)
+    template = get_template_environment().get_template(EMAIL_TEMPLATE_NAME)
+    html_content = template.render(
+        accounts=accounts,
+        date=date,
+        balance_due=balance_due,
+        ny_balance_due=ny_balance_due,
+        nj_balance_due=nj_balance_due,
+        bill_numbers=bill_numbers,
+        violation_count=violation_count,
+        has_ny=has_ny,
+        has_nj=has_nj
+    )
+    
+    # Create message with updated subject
+    subject_balance = f"${balance_due}"
+    if is_digest:
+        subject = f"E-ZPass Toll Information - {len(accounts)} Accounts - Total Balance Due: {subject_balance}"
+    elif has_ny and has_nj:
+        subject = f"E-ZPass Toll Information - NY: ${ny_balance_due} | NJ: ${nj_balance_due} | Total: {subject_balance}"
+    elif has_nj:
+        subject = f"E-ZPass NJ Toll Information - Balance Due: {subject_balance}"
+    else:
+        subject = f"E-ZPass NY Toll Information - Balance Due: {subject_balance}"
+    
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient_email
+    
+    # Create plain text version
+    text_parts = ["E-ZPass Toll Information\n"]
+    
+    for index, account in enumerate(accounts, 1):
+        if is_digest:
+            text_parts.append(f"--- Account {index} of {len(accounts)} ---")
+        
+        if account['has_ny']:
+            text_parts.append(f"NY Account Number: {account['account_number']}")
+            text_parts.append(f"NY Plate Number: {account['plate_number']}")
+            text_parts.append(f"NY Balance: ${account['ny_balance_due']}\n")
+        
+        if account['has_nj']:
+            text_parts.append(f"NJ Violation Number: {account['violation_number']}")
+            text_parts.append(f"NJ Plate Number: {account['nj_plate_number']}")
+            text_parts.append(f"NJ Balance: ${account['nj_balance_due']}\n")
+    
+    text_parts.extend([
+        f"Total Balance Due: ${balance_due}",
+        f"Date: {date}",
+        f"\nBill Numbers: {', '.join(bill_numbers) if bill_numbers else 'None'}",
+        f"Violations: {violation_count}"
+    ])
+    
+    text_content = "\n".join(text_parts)
+    
+    # Attach both versions
+    part1 = MIMEText(text_content, 'plain')
+    part2 = MIMEText(html_content, 'html')
+    
+    msg.attach(part1)
+    msg.attach(part2)
+    
+    return msg
+
 
 def send_toll_info_email(recipient_email, toll_data, logger=None):
     """
     Send toll information via email with beautiful HTML template
     
+    Uses the shared persistent SMTP connection, so consecutive emails don't each pay
+    for a new connection, STARTTLS and login.
+    
     Args:
         recipient_email: Email address to send to
         toll_data: Dictionary containing toll information
         logger: Optional logger function to use instead of print()
         
+    Returns:
+        bool: True if email sent successfully, False otherwise
+    """
+    return send_toll_digest_email(recipient_email, [toll_data], logger=logger)
+
+
+def send_toll_digest_email(recipient_email, toll_results, logger=None):
+    """
+    Send one email covering all of a recipient's accounts (a single SMTP transaction)
+    
+    Args:
+        recipient_email: Email address to send to
+        toll_results: List of toll information dictionaries, one per account
+        logger: Optional logger function to use instead of print()
+        
     Returns:
         bool: True if email sent successfully, False otherwise
     """
@@ -29,185 +387,25 @@ def send_toll_info_email(recipient_email, toll_data, logger=None):
     log = logger if logger else print
     
     try:
-        # Email configuration (using Gmail SMTP as default)
-        # You can change these or use environment variables
-        SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
-        SMTP_USERNAME = os.getenv('SMTP_USERNAME', '')
-        SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
+        connection = get_smtp_connection()
         
         # If credentials not set, return False
-        if not SMTP_USERNAME or not SMTP_PASSWORD:
+        if not connection.is_configured():
             log("⚠️  Email credentials not configured. Set SMTP_USERNAME and SMTP_PASSWORD environment variables.")
             return False
         
-        # Read email template
-        template_path = os.path.join(os.path.dirname(__file__), 'templates', 'email_template.html')
-        with open(template_path, 'r') as f:
-            template_content = f.read()
-        
-        # Create template and render
-        template = Template(template_content)
-        
-        # Prepare data for template
-        # Get balance amounts
-        balance_due_raw = toll_data.get('balance_amount', 0)
-        ny_balance_raw = toll_data.get('ny_balance_amount', 0)
-        nj_balance_raw = toll_data.get('nj_balance_amount', 0)
-        bill_numbers = toll_data.get('toll_bill_numbers', [])
-        violation_count = toll_data.get('violation_count', 0)
-        sources = toll_data.get('sources', [])
-        has_ny = 'NY' in sources or toll_data.get('account_number')
-        has_nj = 'NJ' in sources or toll_data.get('violation_number') or toll_data.get('nj_violation_number')
-        
-        # Format balances (handle None values)
-        try:
-            balance_due_raw = float(balance_due_raw) if balance_due_raw is not None else 0.0
-        except (ValueError, TypeError):
-            balance_due_raw = 0.0
-        
-        try:
-            ny_balance_raw = float(ny_balance_raw) if ny_balance_raw is not None else 0.0
-        except (ValueError, TypeError):
-            ny_balance_raw = 0.0
-        
-        try:
-            nj_balance_raw = float(nj_balance_raw) if nj_balance_raw is not None else 0.0
-        except (ValueError, TypeError):
-            nj_balance_raw = 0.0
-        
-        # If NY balance is 0 but balance_amount has value and it's a NY-only account, use balance_amount
-        if ny_balance_raw == 0 and balance_due_raw > 0:
-            if has_ny and not has_nj:
-                # NY-only account, use balance_amount as ny_balance
-                ny_balance_raw = balance_due_raw
-                log(f"Using balance_amount (${balance_due_raw:.2f}) as ny_balance_amount for NY-only account")
-        
-        balance_due = f"{balance_due_raw:.2f}"
-        ny_balance = ny_balance_raw
-        nj_balance = nj_balance_raw
-        
-        ny_balance_due = f"{ny_balance:.2f}"
-        nj_balance_due = f"{nj_balance:.2f}"
-        
-        html_content = template.render(
-            account_number=toll_data.get('account_number', 'N/A'),
-            plate_number=toll_data.get('plate_number', 'N/A'),
-            violation_number=toll_data.get('violation_number') or toll_data.get('nj_violation_number', 'N/A'),
-            nj_plate_number=toll_data.get('nj_plate_number', toll_data.get('plate_number', 'N/A')),
-            date=datetime.now().strftime('%B %d, %Y at %I:%M %p'),
-            balance_due=balance_due,
-            ny_balance_due=ny_balance_due,
-            nj_balance_due=nj_balance_due,
-            bill_numbers=bill_numbers,
-            violation_count=violation_count,
-            has_ny=has_ny,
-            has_nj=has_nj,
-            sources=sources
-        )
-        
-        # Create message with updated subject
-        subject_balance = f"${balance_due}"
-        if has_ny and has_nj:
-            subject = f"E-ZPass Toll Information - NY: ${ny_balance_due} | NJ: ${nj_balance_due} | Total: {subject_balance}"
-        elif has_nj:
-            subject = f"E-ZPass NJ Toll Information - Balance Due: {subject_balance}"
-        else:
-            subject = f"E-ZPass NY Toll Information - Balance Due: {subject_balance}"
+        msg = build_toll_digest_message(recipient_email, toll_results, connection.username, logger=log)
         
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = SMTP_USERNAME
-        msg['To'] = recipient_email
-        
-        # Create plain text version
-        text_parts = ["E-ZPass Toll Information\n"]
-        
-        if has_ny:
-            text_parts.append(f"NY Account Number: {toll_data.get('account_number', 'N/A')}")
-            text_parts.append(f"NY Plate Number: {toll_data.get('plate_number', 'N/A')}")
-            text_parts.append(f"NY Balance: ${ny_balance_due}\n")
-        
-        if has_nj:
-            text_parts.append(f"NJ Violation Number: {toll_data.get('violation_number') or toll_data.get('nj_violation_number', 'N/A')}")
-            text_parts.append(f"NJ Plate Number: {toll_data.get('nj_plate_number', toll_data.get('plate_number', 'N/A'))}")
-            text_parts.append(f"NJ Balance: ${nj_balance_due}\n")
-        
-        text_parts.extend([
-            f"Total Balance Due: ${balance_due}",
-            f"Date: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}",
-            f"\nBill Numbers: {', '.join(bill_numbers) if bill_numbers else 'None'}",
-            f"Violations: {violation_count}"
-        ])
-        
-        text_content = "\n".join(text_parts)
-        
-        # Attach both versions
-        part1 = MIMEText(text_content, 'plain')
-        part2 = MIMEText(html_content, 'html')
-        
-        msg.attach(part1)
-        msg.attach(part2)
-        
-        # Send email
-        try:
-            # Use SSL for port 465, STARTTLS for port 587
-            if SMTP_PORT == 465:
-                # Use SMTP_SSL for port 465
-                server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, timeout=30)
+        if connection.send(msg, log=log):
+            if len(toll_results) > 1:
+                log(f"✅ Digest email ({len(toll_results)} accounts) sent successfully to {recipient_email}")
             else:
-                # Use regular SMTP with STARTTLS for port 587
-                server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
-                server.starttls()
-            
-            try:
-                try:
-                    server.login(SMTP_USERNAME, SMTP_PASSWORD)
-                except smtplib.SMTPAuthenticationError as auth_error:
-                    error_msg = str(auth_error)
-                    log(f"❌ Authentication failed: {error_msg}")
-                    if "BadCredentials" in error_msg or "Username and Password not accepted" in error_msg:
-                        log("\n💡 Common fixes for Gmail:")
-                        log("   1. Make sure you're using an App Password (not your regular password)")
-                        log("   2. Generate App Password at: https://myaccount.google.com/apppasswords")
-                        log("   3. Enable 2-Step Verification first if you haven't")
-                        log("   4. Make sure SMTP_USERNAME is your full email address")
-                    return False
-                except Exception as login_error:
-                    log(f"❌ Login error: {str(login_error)}")
-                    import traceback
-                    error_trace = traceback.format_exc()
-                    log(error_trace)
-                    return False
-                
-                server.send_message(msg)
                 log(f"✅ Email sent successfully to {recipient_email}")
-                
-                # Close connection
-                if SMTP_PORT != 465:
-                    server.quit()
-                else:
-                    server.close()
-                return True
-            except Exception as inner_error:
-                if server:
-                    if SMTP_PORT != 465:
-                        server.quit()
-                    else:
-                        server.close()
-                raise inner_error
-        except smtplib.SMTPException as smtp_error:
-            error_msg = f"❌ SMTP error sending email: {str(smtp_error)}"
-            log(error_msg)
-            import traceback
-            error_trace = traceback.format_exc()
-            log(error_trace)
-            return False
+            return True
+        return False
     except Exception as e:
         error_msg = f"❌ Error sending email: {str(e)}\n   Error type: {type(e).__name__}"
         log(error_msg)
-        import traceback
         error_trace = traceback.format_exc()
         log(error_trace)
         return False
-
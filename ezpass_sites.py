@@ -0,0 +1,20 @@
+"""
+E-ZPass NY and NJ site addresses used by the scrapers and the HTTP fetcher
+
+Set EZPASS_NY_BASE_URL / EZPASS_NJ_BASE_URL to point the scrapers somewhere else,
+e.g. at the local fixture server (see fixture_server.py):
+
+    EZPASS_NY_BASE_URL=http://127.0.0.1:8765/ny
+    EZPASS_NJ_BASE_URL=http://127.0.0.1:8765/nj
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+NY_BASE_URL = os.getenv('EZPASS_NY_BASE_URL', 'https://www.e-zpassny.com').rstrip('/')
+NY_HOME_URL = NY_BASE_URL
+NY_PAY_TOLL_URL = f'{NY_BASE_URL}/tbm/pay-toll'
+
+NJ_BASE_URL = os.getenv('EZPASS_NJ_BASE_URL', 'https://www.ezpassnj.com').rstrip('/')
+NJ_HOME_URL = f'{NJ_BASE_URL}/en/home/index.shtml'
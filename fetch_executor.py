@@ -0,0 +1,84 @@
+"""
+Bounded parallel executor for email-triggered toll fetches
+
+Requests from different senders are processed concurrently, while requests from the
+same sender are processed one after another in the order they arrived. Completion
+callbacks run on the calling thread, so IMAP operations such as marking an email as
+read never share the connection across threads.
+"""
+import os
+import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from runtime_config import lookup_concurrency
+from metrics import FETCH_QUEUE_DEPTH
+
+load_dotenv()
+
+# Maximum number of senders processed at the same time (each one runs its own browser or tab)
+EMAIL_FETCH_WORKERS = int(os.getenv('EMAIL_FETCH_WORKERS', lookup_concurrency()))
+
+
+def sender_key(request: Dict) -> str:
+    """Key used to keep one sender's requests in order"""
+    sender = request.get('sender_email') or request.get('email') or ''
+    return sender.strip().lower()
+
+
+def process_requests(requests: List[Dict], handler: Callable[[Dict], object],
+                     on_done: Optional[Callable[[Dict, object, Optional[Exception]], None]] = None,
+                     max_workers: int = None) -> List[Tuple[Dict, object, Optional[Exception]]]:
+    """
+    Process parsed email requests in parallel, keeping per-sender ordering
+
+    Args:
+        requests: Parsed email dictionaries (from EmailReader.get_unread_emails)
+        handler: Function that processes one request and returns its result
+        on_done: Optional callback(request, result, error) called on this thread as
+                 each request finishes; error is None if the handler succeeded
+        max_workers: Maximum number of senders processed at once (default: EMAIL_FETCH_WORKERS)
+
+    Returns:
+        List of (request, result, error) tuples in the original request order
+    """
+    if not requests:
+        return []
+
+    max_workers = max_workers or EMAIL_FETCH_WORKERS
+
+    # Group requests by sender, preserving arrival order within each group
+    groups = OrderedDict()
+    for index, request in enumerate(requests):
+        groups.setdefault(sender_key(request), []).append(index)
+
+    completed = queue.Queue()
+
+    def run_group(indices):
+        for index in indices:
+            try:
+                result = handler(requests[index])
+                completed.put((index, result, None))
+            except Exception as e:
+                completed.put((index, None, e))
+
+    outcomes = [None] * len(requests)
+    workers = max(1, min(max_workers, len(groups)))
+    FETCH_QUEUE_DEPTH.inc(len(requests))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='email-fetch') as executor:
+        for indices in groups.values():
+            executor.submit(run_group, indices)
+
+        for _ in range(len(requests)):
+            index, result, error = completed.get()
+            FETCH_QUEUE_DEPTH.dec()
+            outcomes[index] = (requests[index], result, error)
+            if on_done:
+                try:
+                    on_done(requests[index], result, error)
+                except Exception as e:
+                    print(f"⚠️  Error in completion callback: {str(e)}")
+
+    return outcomes
@@ -0,0 +1,377 @@
+"""
+Hard deadlines for toll fetches and cleanup of orphaned Chrome processes
+
+Callers that give up on a fetch (thread.join timeouts, gunicorn killing a worker after
+its timeout) used to leave the scrape - and its Chrome and chromedriver processes -
+running. The supervisor fixes both ends:
+
+    Deadlines   Every fetch runs as a job with a deadline (FETCH_DEADLINE). chromedriver
+                is started in its own session, so when a job runs over, the watchdog
+                kills the whole process group (chromedriver and its Chrome processes);
+                the scrape's next Selenium call fails and the fetch returns a `timeout`
+                result. A fetch running in a tab of a shared browser (see
+                tab_scheduler) has its tab closed instead. Waits inside a fetch (for a
+                browser slot, memory, a session or a tab) are cut short at its
+                deadline with time_left() and deadline_wait().
+    Reaping     Every browser process carries TOLLS_FETCH_OWNER=<pid>:<job> in its
+                environment. The watchdog periodically kills chrome/chromedriver
+                processes whose owning process is gone, or whose job in this process
+                has finished.
+
+The watchdog thread starts with the first supervised fetch, or explicitly with
+start_watchdog() in long-running processes. Reaping reads /proc; where there is none
+(macOS) only deadlines are enforced.
+
+Settings (environment):
+    FETCH_DEADLINE           Seconds a fetch may run (default: 100 - under gunicorn's 120s timeout)
+    FETCH_WATCHDOG_INTERVAL  Seconds between deadline checks (default: 2)
+    FETCH_REAP_INTERVAL      Seconds between orphan scans (default: 60)
+    FETCH_REAP_GRACE         Age in seconds before an unowned browser is reaped (default: 30)
+"""
+import itertools
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from metrics import counter, gauge
+
+load_dotenv()
+
+FETCH_DEADLINE = float(os.getenv('FETCH_DEADLINE', '100'))
+FETCH_WATCHDOG_INTERVAL = float(os.getenv('FETCH_WATCHDOG_INTERVAL', '2'))
+FETCH_REAP_INTERVAL = float(os.getenv('FETCH_REAP_INTERVAL', '60'))
+FETCH_REAP_GRACE = float(os.getenv('FETCH_REAP_GRACE', '30'))
+
+OWNER_ENV = 'TOLLS_FETCH_OWNER'
+BROWSER_PROCESS_NAMES = ('chromedriver', 'chrome', 'google-chrome', 'chromium', 'chromium-browser', 'chrome_crashpad_handler')
+
+FETCH_DEADLINE_KILLS = counter('tolls_fetch_deadline_kills_total', 'Fetches cancelled for running past their deadline',
+                               ('site',))
+ORPHANS_REAPED = counter('tolls_orphan_browser_processes_reaped_total', 'Orphaned chrome/chromedriver processes killed')
+
+
+class DeadlineExceeded(Exception):
+    """A wait inside a supervised fetch ran into the fetch's deadline"""
+
+
+class FetchJob:
+    """One supervised fetch and the browsers it started"""
+
+    def __init__(self, job_id: int, site: str, deadline: float, started: float = None):
+        self.job_id = job_id
+        self.site = site
+        self.started = started or time.monotonic()
+        self.deadline = self.started + deadline
+        self.timeout = deadline
+        self.process_groups = []
+        self.cancel_callbacks = []
+        self.timed_out = False
+
+    @property
+    def owner_tag(self) -> str:
+        return f"{os.getpid()}:{self.job_id}"
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_job_ids = itertools.count(1)
+_local = threading.local()
+_watchdog = None
+_watchdog_lock = threading.Lock()
+
+
+def current_job() -> Optional[FetchJob]:
+    """The supervised fetch running on this thread, if any"""
+    return getattr(_local, 'job', None)
+
+
+def owner_tag() -> str:
+    """Value for OWNER_ENV in a browser launched on this thread"""
+    job = current_job()
+    return job.owner_tag if job else f"{os.getpid()}:0"
+
+
+def kill_process_group(pgid: int):
+    """SIGKILL a process group (ignores groups that are already gone)"""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def register_browser(pgid: int):
+    """Record the process group of a browser started by the fetch on this thread"""
+    job = current_job()
+    if job is None:
+        return
+    with _jobs_lock:
+        job.process_groups.append(pgid)
+        timed_out = job.timed_out
+    if timed_out:
+        # Started after the deadline already passed
+        kill_process_group(pgid)
+
+
+def unregister_browser(pgid: int):
+    job = current_job()
+    if job is None:
+        return
+    with _jobs_lock:
+        if pgid in job.process_groups:
+            job.process_groups.remove(pgid)
+
+
+def on_deadline(callback: Callable[[], None]):
+    """Call `callback` (from the watchdog thread) if the fetch on this thread runs past its deadline"""
+    job = current_job()
+    if job is not None:
+        with _jobs_lock:
+            job.cancel_callbacks.append(callback)
+
+
+def time_left(default: Optional[float] = None) -> Optional[float]:
+    """
+    How long a wait on this thread may take
+
+    Args:
+        default: The wait's own timeout (None = unbounded)
+
+    Returns:
+        `default` capped at the time left before the current fetch's deadline (0 once it
+        has passed); `default` outside a supervised fetch
+    """
+    job = current_job() or getattr(_local, 'detached_from', None)
+    if job is None:
+        return default
+    left = max(0.0, job.deadline - time.monotonic())
+    return left if default is None else min(default, left)
+
+
+def deadline_wait(condition: threading.Condition, waiting_for: str):
+    """
+    condition.wait(), bounded by the current fetch's deadline (call with the condition held)
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    remaining = time_left()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"Fetch deadline passed while waiting for {waiting_for}")
+    condition.wait(remaining)
+
+
+@contextmanager
+def deadline_counted_from(start: float):
+    """
+    Count the time since `start` (a time.monotonic() value) against the deadline of fetches
+    started in this block - e.g. the time they spent queued for a place to run
+    """
+    previous = getattr(_local, 'counted_from', None)
+    _local.counted_from = start
+    try:
+        yield
+    finally:
+        _local.counted_from = previous
+
+
+@contextmanager
+def detached():
+    """
+    Launch browsers that outlive the current fetch (shared browsers) inside this block
+
+    The browsers are not killed with the fetch, but waits in the block still end at its deadline.
+    """
+    previous = current_job()
+    previous_detached = getattr(_local, 'detached_from', None)
+    _local.job = None
+    _local.detached_from = previous or previous_detached
+    try:
+        yield
+    finally:
+        _local.job = previous
+        _local.detached_from = previous_detached
+
+
+def timeout_result(job: FetchJob) -> Dict:
+    return {
+        'success': False,
+        'error': f"{job.site} fetch timed out after {job.timeout:.0f}s (deadline exceeded, browser killed)",
+        'outcome': 'timeout',
+        'source': job.site
+    }
+
+
+@contextmanager
+def supervised(site: str, deadline: float = None):
+    """
+    Run a fetch on this thread as a job with a hard deadline
+
+    Yields the FetchJob; check job.timed_out afterwards.
+    """
+    start_watchdog()
+    job = FetchJob(next(_job_ids), site, deadline or FETCH_DEADLINE, getattr(_local, 'counted_from', None))
+    previous = current_job()
+    _local.job = job
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+    try:
+        yield job
+    finally:
+        _local.job = previous
+        with _jobs_lock:
+            _jobs.pop(job.job_id, None)
+            groups = list(job.process_groups)
+        # Anything the fetch left running goes with it
+        for pgid in groups:
+            kill_process_group(pgid)
+
+
+def supervised_fetch(site: str, fetch: Callable[[], Dict], deadline: float = None) -> Dict:
+    """
+    Run a fetch with a hard deadline
+
+    Args:
+        site: 'NY' or 'NJ'
+        fetch: Performs the lookup and returns its result dictionary
+        deadline: Seconds allowed (default: FETCH_DEADLINE)
+
+    Returns:
+        The fetch result, or a `timeout` result if the deadline was exceeded (a failure
+        past the deadline counts as a timeout even before the watchdog has noticed it)
+    """
+    with supervised(site, deadline) as job:
+        try:
+            result = fetch()
+        except Exception:
+            if job.timed_out or time.monotonic() >= job.deadline:
+                return timeout_result(job)
+            raise
+        if job.timed_out or (time.monotonic() >= job.deadline and not (result or {}).get('success')):
+            return timeout_result(job)
+        return result
+
+
+def enforce_deadlines():
+    """Kill the browsers of every job past its deadline"""
+    now = time.monotonic()
+    expired = []
+    with _jobs_lock:
+        for job in _jobs.values():
+            if not job.timed_out and now >= job.deadline:
+                job.timed_out = True
+                expired.append((job, list(job.process_groups), list(job.cancel_callbacks)))
+    for job, groups, callbacks in expired:
+        FETCH_DEADLINE_KILLS.inc(site=job.site)
+        print(f"⏰ {job.site} fetch exceeded its {job.timeout:.0f}s deadline - killing {len(groups)} browser(s)")
+        for pgid in groups:
+            kill_process_group(pgid)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️  Could not cancel {job.site} fetch: {str(e)}")
+
+
+def _process_owner(pid: str) -> Optional[str]:
+    """OWNER_ENV of a chrome/chromedriver process, or None for other processes"""
+    try:
+        with open(f"/proc/{pid}/comm", 'r') as f:
+            name = f.read().strip()
+        if not name.startswith(BROWSER_PROCESS_NAMES):
+            return None
+        with open(f"/proc/{pid}/environ", 'rb') as f:
+            environ = f.read().split(b'\0')
+    except OSError:
+        return None
+    prefix = f"{OWNER_ENV}=".encode()
+    for item in environ:
+        if item.startswith(prefix):
+            return item[len(prefix):].decode('utf-8', 'replace')
+    return None
+
+
+def _process_age(pid: str) -> float:
+    try:
+        return time.time() - os.stat(f"/proc/{pid}").st_mtime
+    except OSError:
+        return 0.0
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def find_orphans() -> List[int]:
+    """Browser processes whose owning process exited or whose job in this process ended"""
+    if not os.path.isdir('/proc'):
+        return []
+    my_pid = os.getpid()
+    with _jobs_lock:
+        active_jobs = set(_jobs)
+    orphans = []
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        owner = _process_owner(pid)
+        if not owner or _process_age(pid) < FETCH_REAP_GRACE:
+            continue
+        try:
+            owner_pid, job_id = (int(part) for part in owner.split(':', 1))
+        except ValueError:
+            continue
+        if owner_pid == my_pid:
+            # Ours: orphaned once its job is over (job 0 = launched outside a supervised fetch)
+            if job_id and job_id not in active_jobs:
+                orphans.append(int(pid))
+        elif not _pid_alive(owner_pid):
+            orphans.append(int(pid))
+    return orphans
+
+
+def reap_orphans() -> int:
+    """Kill orphaned chrome/chromedriver processes; returns how many were killed"""
+    killed = 0
+    for pid in find_orphans():
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except (ProcessLookupError, PermissionError):
+            pass
+    if killed:
+        ORPHANS_REAPED.inc(killed)
+        print(f"🧹 Reaped {killed} orphaned chrome/chromedriver process(es)")
+    return killed
+
+
+def _watchdog_loop():
+    last_reap = 0.0
+    while True:
+        try:
+            enforce_deadlines()
+            if time.monotonic() - last_reap >= FETCH_REAP_INTERVAL:
+                last_reap = time.monotonic()
+                reap_orphans()
+        except Exception as e:
+            print(f"⚠️  Fetch watchdog error: {str(e)}")
+        time.sleep(FETCH_WATCHDOG_INTERVAL)
+
+
+def start_watchdog():
+    """Start the deadline/reaper thread for this process (once)"""
+    global _watchdog
+    with _watchdog_lock:
+        if _watchdog is None or not _watchdog.is_alive():
+            _watchdog = threading.Thread(target=_watchdog_loop, name='fetch-watchdog', daemon=True)
+            _watchdog.start()
+
+
+gauge('tolls_supervised_fetches', 'Supervised fetches running in this process', func=lambda: len(_jobs))
@@ -0,0 +1,182 @@
+"""
+Per-stage timing for toll fetches
+
+Each fetch (extract_toll_info / extract_toll_info_nj) runs inside track_fetch(), and the
+code along the way marks the end of each named stage with lap(), e.g.
+
+    lap('driver_install')   # chromedriver located
+    lap('browser_start')    # Chrome running
+    lap('results_wait')     # waited for results to render
+
+A stage's time is the time since the previous lap, so stages never overlap and add up
+to the fetch total. The result dictionary gets a `timings` field:
+
+    {'total': 31.42, 'stages': {'driver_install': 0.41, 'browser_start': 1.87, ...}}
+
+and every finished fetch is passed to the timing sinks - callables taking
+(site, timings, result). FETCH_TIMING_SINKS picks the built-in ones (comma-separated):
+
+    log           One line per fetch on stdout (default)
+    jsonl         Append to FETCH_TIMINGS_LOG (default: logs/fetch_timings.jsonl)
+    module:func   Any importable callable
+
+More sinks can be added at runtime with add_timing_sink().
+"""
+import importlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FETCH_TIMING_SINKS = os.getenv('FETCH_TIMING_SINKS', 'log')
+FETCH_TIMINGS_LOG = os.getenv('FETCH_TIMINGS_LOG',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'fetch_timings.jsonl'))
+
+_local = threading.local()
+_sinks = []
+_sinks_lock = threading.Lock()
+_sinks_loaded = False
+
+
+class FetchTimer:
+    """Stage durations for one fetch"""
+
+    def __init__(self, site: str):
+        self.site = site
+        self.stages = {}
+        self.total = None
+        self.attached = False
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def lap(self, stage: str):
+        """End the current stage (time since the previous lap is added to `stage`)"""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def finish(self) -> Dict:
+        if self.total is None:
+            self.total = time.perf_counter() - self._start
+        return self.as_dict()
+
+    def attach(self, result: Dict) -> Dict:
+        """Finish the fetch, add `timings` to its result and notify the sinks"""
+        timings = self.finish()
+        if isinstance(result, dict):
+            result['timings'] = timings
+        self.attached = True
+        emit_timings(self.site, timings, result)
+        return result
+
+    def as_dict(self) -> Dict:
+        total = self.total if self.total is not None else time.perf_counter() - self._start
+        return {
+            'total': round(total, 3),
+            'stages': {stage: round(seconds, 3) for stage, seconds in self.stages.items()}
+        }
+
+
+def lap(stage: str):
+    """End a stage of the fetch running on this thread (no-op outside track_fetch)"""
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.lap(stage)
+
+
+def current_timer() -> Optional[FetchTimer]:
+    return getattr(_local, 'timer', None)
+
+
+@contextmanager
+def track_fetch(site: str):
+    """
+    Time a fetch on this thread
+
+    Use the yielded timer's attach() on the result to add `timings` and notify the
+    sinks; a fetch that raises is still reported (with result None).
+
+    Args:
+        site: 'NY' or 'NJ'
+    """
+    timer = FetchTimer(site)
+    previous = getattr(_local, 'timer', None)
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+        if not timer.attached:
+            emit_timings(site, timer.finish(), None)
+
+
+def format_timings(timings: Dict) -> str:
+    """One-line summary, e.g. '31.4s (driver_install 0.4s, browser_start 1.9s, ...)'"""
+    stages = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in timings.get('stages', {}).items())
+    return f"{timings.get('total', 0):.1f}s ({stages})" if stages else f"{timings.get('total', 0):.1f}s"
+
+
+def log_sink(site: str, timings: Dict, result: Optional[Dict]):
+    outcome = 'ok' if result and result.get('success') else 'failed'
+    print(f"⏱️  {site} fetch {outcome} in {format_timings(timings)}")
+
+
+def jsonl_sink(site: str, timings: Dict, result: Optional[Dict]):
+    record = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'site': site,
+        'success': bool(result and result.get('success')),
+        'fetch_method': (result or {}).get('fetch_method', 'browser'),
+        **timings
+    }
+    os.makedirs(os.path.dirname(FETCH_TIMINGS_LOG), exist_ok=True)
+    with open(FETCH_TIMINGS_LOG, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+BUILTIN_SINKS = {'log': log_sink, 'jsonl': jsonl_sink}
+
+
+def _load_configured_sinks():
+    """Resolve FETCH_TIMING_SINKS once (called with _sinks_lock held)"""
+    global _sinks_loaded
+    if _sinks_loaded:
+        return
+    _sinks_loaded = True
+    for name in (name.strip() for name in FETCH_TIMING_SINKS.split(',')):
+        if not name or name == 'none':
+            continue
+        if name in BUILTIN_SINKS:
+            _sinks.append(BUILTIN_SINKS[name])
+            continue
+        try:
+            module_name, func_name = name.split(':', 1)
+            _sinks.append(getattr(importlib.import_module(module_name), func_name))
+        except Exception as e:
+            print(f"⚠️  Could not load timing sink '{name}': {str(e)}")
+
+
+def add_timing_sink(sink: Callable[[str, Dict, Optional[Dict]], None]):
+    """Register a callable(site, timings, result) called after every fetch"""
+    with _sinks_lock:
+        _load_configured_sinks()
+        if sink not in _sinks:
+            _sinks.append(sink)
+
+
+def emit_timings(site: str, timings: Dict, result: Optional[Dict]):
+    """Pass a finished fetch's timings to every sink"""
+    with _sinks_lock:
+        _load_configured_sinks()
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(site, timings, result)
+        except Exception as e:
+            print(f"⚠️  Timing sink {getattr(sink, '__name__', sink)} failed: {str(e)}")
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the E-ZPass NY and NJ sites (offline benchmarking and regression runs)
+
+Serves the recorded pages in fixtures/ezpass - NY homepage, pay-toll form and results,
+NJ homepage, violation modal and results, plus error and blocked pages - with
+configurable latency and failure injection. Point the scrapers at it with:
+
+    EZPASS_NY_BASE_URL=http://127.0.0.1:8765/ny
+    EZPASS_NJ_BASE_URL=http://127.0.0.1:8765/nj
+
+Results are deterministic per account/violation + plate. Lookup numbers starting with
+ZERO return no balance, NOTFOUND a "no records found" page, INVALID an invalid-number page,
+ERROR an error page (HTTP 500) and BLOCK the blocked page (HTTP 403).
+
+Settings (environment, or POST JSON to /_fixture/config while running):
+    FIXTURE_LATENCY_MS          Delay added to every page (default: 0)
+    FIXTURE_JITTER_MS           Random extra delay up to this much (default: 0)
+    FIXTURE_RESULTS_LATENCY_MS  Extra delay for results pages - the search backend (default: 0)
+    FIXTURE_FAILURE_RATE        Fraction of requests answered with the error page (default: 0)
+    FIXTURE_BLOCK_RATE          Fraction of requests answered with the blocked page (default: 0)
+    FIXTURE_SEED                Random seed for jitter and injected failures (default: unset)
+
+GET /_fixture/stats returns request counters; POST /_fixture/reset clears them.
+
+Usage:
+    python fixture_server.py [port]
+"""
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlsplit
+from jinja2 import Environment, FileSystemLoader
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'ezpass')
+FIXTURE_PORT = int(os.getenv('FIXTURE_PORT', '8765'))
+
+DEFAULT_SETTINGS = {
+    'latency_ms': float(os.getenv('FIXTURE_LATENCY_MS', '0')),
+    'jitter_ms': float(os.getenv('FIXTURE_JITTER_MS', '0')),
+    'results_latency_ms': float(os.getenv('FIXTURE_RESULTS_LATENCY_MS', '0')),
+    'failure_rate': float(os.getenv('FIXTURE_FAILURE_RATE', '0')),
+    'block_rate': float(os.getenv('FIXTURE_BLOCK_RATE', '0'))
+}
+
+FACILITIES = ['Verrazzano-Narrows Bridge', 'Throgs Neck Bridge', 'Henry Hudson Bridge',
+              'Robert F. Kennedy Bridge', 'Queens Midtown Tunnel', 'Garden State Parkway']
+
+# (method, path) -> (template, page kind)
+ROUTES = {
+    ('GET', '/ny'): ('ny_home.html', 'page'),
+    ('GET', '/ny/tbm/pay-toll'): ('ny_pay_toll.html', 'page'),
+    ('POST', '/ny/tbm/search'): ('ny_results.html', 'results'),
+    ('GET', '/nj/en/home/index.shtml'): ('nj_home.html', 'page'),
+    ('GET', '/nj/en/violations/modal.shtml'): ('nj_violation_modal.html', 'page'),
+    ('POST', '/nj/en/violations/view.shtml'): ('nj_results.html', 'results')
+}
+
+_templates = Environment(loader=FileSystemLoader(FIXTURES_DIR), autoescape=True)
+
+
+def fixture_bills(lookup_number: str, plate_number: str):
+    """
+    Deterministic toll bills for a lookup
+
+    Returns:
+        List of bill dictionaries (number, facility, issued, amount); empty for ZERO lookups
+    """
+    if lookup_number.upper().startswith('ZERO'):
+        return []
+    digest = hashlib.sha256(f"{lookup_number.upper()}|{plate_number.upper()}".encode()).digest()
+    bills = []
+    for i in range(1 + digest[0] % 4):
+        bills.append({
+            'number': f"T{int.from_bytes(digest[4 + i * 4:8 + i * 4], 'big') % 10 ** 9:09d}",
+            'facility': FACILITIES[digest[20 + i] % len(FACILITIES)],
+            'issued': f"2026-{1 + digest[24 + i] % 12:02d}-{1 + digest[28 + i] % 28:02d}",
+            'amount': round(2 + (digest[1 + i] * 7 % 6000) / 100, 2)
+        })
+    return bills
+
+
+def expected_balance(lookup_number: str, plate_number: str) -> float:
+    """Balance the fixture server reports for a lookup (for checking scraper results)"""
+    return round(sum(bill['amount'] for bill in fixture_bills(lookup_number, plate_number)), 2)
+
+
+class FixtureState:
+    """Settings and request counters shared by the handler threads"""
+
+    def __init__(self, settings: Dict = None, seed: str = None):
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+        seed = seed if seed is not None else os.getenv('FIXTURE_SEED')
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def update(self, settings: Dict):
+        with self.lock:
+            for key, value in settings.items():
+                if key in DEFAULT_SETTINGS:
+                    self.settings[key] = float(value)
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def plan(self, kind: str) -> Tuple[float, str]:
+        """
+        Decide the delay and injected outcome for one request
+
+        Returns:
+            Tuple of (delay in seconds, 'ok' / 'error' / 'blocked')
+        """
+        with self.lock:
+            settings = self.settings
+            delay_ms = settings['latency_ms'] + self.random.uniform(0, settings['jitter_ms'])
+            if kind == 'results':
+                delay_ms += settings['results_latency_ms']
+            roll = self.random.random()
+        if roll < settings['block_rate']:
+            return delay_ms / 1000, 'blocked'
+        if roll < settings['block_rate'] + settings['failure_rate']:
+            return delay_ms / 1000, 'error'
+        return delay_ms / 1000, 'ok'
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server_version = 'EZPassFixture/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _send(self, status: int, body: str, content_type: str = 'text/html; charset=utf-8'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _render(self, template: str, status: int = 200, **context):
+        self._send(status, _templates.get_template(template).render(**context))
+
+    def _handle(self, method: str):
+        state = self.server.state
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/') or '/'
+
+        if path.startswith('/_fixture/'):
+            return self._control(method, path)
+
+        route = ROUTES.get((method, path))
+        if not route:
+            state.count('not_found')
+            return self._render('error.html', 404)
+        template, kind = route
+
+        form = parse_qs(url.query)
+        if method == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            form.update(parse_qs(self.rfile.read(length).decode('utf-8', 'replace')))
+        form = {key: values[0].strip() for key, values in form.items()}
+
+        delay, outcome = state.plan(kind)
+        if delay > 0:
+            time.sleep(delay)
+
+        site = path.split('/')[1]
+        lookup_number = form.get('accountNumber') or form.get('notice_number') or ''
+        if outcome == 'ok' and kind == 'results':
+            if lookup_number.upper().startswith('BLOCK'):
+                outcome = 'blocked'
+            elif lookup_number.upper().startswith('ERROR'):
+                outcome = 'error'
+            elif lookup_number.upper().startswith(('NOTFOUND', 'INVALID')):
+                outcome = 'not_found' if lookup_number.upper().startswith('NOTFOUND') else 'invalid'
+
+        state.count(f"{site}_{kind}_{outcome}")
+        if outcome == 'blocked':
+            return self._render('blocked.html', 403)
+        if outcome == 'error':
+            return self._render('error.html', 500)
+        if outcome == 'not_found':
+            return self._render('lookup_error.html', title='Search Results',
+                                message='No records found for the number and plate entered.')
+        if outcome == 'invalid':
+            return self._render('lookup_error.html', title='Search Results',
+                                message='Invalid account or toll bill number. Please enter a valid number.')
+
+        bills = fixture_bills(lookup_number, form.get('plateNumber') or form.get('tag_number') or '')
+        self._render(
+            template,
+            base=f"http://{self.headers.get('Host')}/{site}",
+            csrf=hashlib.sha1(f"{time.time()}".encode()).hexdigest(),
+            account_number=lookup_number,
+            plate_number=form.get('plateNumber') or form.get('tag_number') or '',
+            bills=bills,
+            total=round(sum(bill['amount'] for bill in bills), 2),
+            violations=sum(1 for bill in bills if bill['amount'] > 50)
+        )
+
+    def _control(self, method: str, path: str):
+        state = self.server.state
+        if path == '/_fixture/config':
+            if method == 'POST':
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    state.update(json.loads(self.rfile.read(length) or b'{}'))
+                except (ValueError, TypeError) as e:
+                    return self._send(400, json.dumps({'error': str(e)}), 'application/json')
+            return self._send(200, json.dumps(state.settings), 'application/json')
+        if path == '/_fixture/stats':
+            return self._send(200, json.dumps(state.stats), 'application/json')
+        if path == '/_fixture/reset' and method == 'POST':
+            state.reset()
+            return self._send(200, json.dumps({'reset': True}), 'application/json')
+        self._send(404, json.dumps({'error': 'unknown fixture endpoint'}), 'application/json')
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = FIXTURE_PORT, settings: Dict = None, seed: str = None):
+        super().__init__((host, port), FixtureHandler)
+        self.state = FixtureState(settings, seed)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def site_env(self) -> Dict[str, str]:
+        """Environment variables that point the scrapers at this server"""
+        return {'EZPASS_NY_BASE_URL': f"{self.base_url}/ny", 'EZPASS_NJ_BASE_URL': f"{self.base_url}/nj"}
+
+
+def start_fixture_server(port: int = 0, settings: Dict = None, seed: str = None) -> FixtureServer:
+    """
+    Start the fixture server on a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        settings: Latency/failure settings overriding the FIXTURE_* environment
+        seed: Random seed for jitter and injected failures
+
+    Returns:
+        The running FixtureServer (call shutdown() to stop it)
+    """
+    server = FixtureServer(port=port, settings=settings, seed=seed)
+    threading.Thread(target=server.serve_forever, name='fixture-server', daemon=True).start()
+    return server
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else FIXTURE_PORT
+    server = FixtureServer(port=port)
+    print(f"🧪 E-ZPass fixture server on {server.base_url}")
+    for key, value in server.site_env().items():
+        print(f"   {key}={value}")
+    print(f"   Settings: {json.dumps(server.state.settings)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopping fixture server")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Fast form filling for the Selenium scrapers
+
+Typing into the lookup forms with send_keys and fixed sleeps between actions cost
+several seconds per lookup. fill_field() sets a field's value in one script call
+instead: it uses the native value setter (so framework-controlled inputs see the
+change) and fires the input and change events the sites' scripts listen for, then
+checks the value stuck and the field passes validation. Only if it didn't does it fall
+back to typing the value key by key with short human-like pauses. Disabled and
+read-only fields are left alone (typed into like a user would) unless the caller asks
+to unlock them.
+
+Fills are counted in tolls_form_fill_total{site,method}: `script`, `typed` (fallback
+worked) or `failed`.
+"""
+import random
+import re
+import time
+from selenium.common.exceptions import WebDriverException
+from metrics import counter
+
+FORM_FILLS = counter('tolls_form_fill_total', 'Form fields filled, by how the value was entered', ('site', 'method'))
+
+# Pause between keystrokes when typing is needed (seconds)
+_KEY_DELAY = (0.02, 0.08)
+
+_FILL_SCRIPT = """
+const el = arguments[0], value = arguments[1], unlock = arguments[2];
+if (unlock) {
+    el.removeAttribute('readonly');
+    el.removeAttribute('disabled');
+} else if (el.disabled || el.readOnly) {
+    return null;
+}
+el.focus();
+const proto = Object.getPrototypeOf(el);
+const descriptor = Object.getOwnPropertyDescriptor(proto, 'value');
+if (descriptor && descriptor.set) {
+    descriptor.set.call(el, value);
+} else {
+    el.value = value;
+}
+el.dispatchEvent(new Event('input', {bubbles: true}));
+el.dispatchEvent(new Event('change', {bubbles: true}));
+return [el.value, el.checkValidity ? el.checkValidity() : true, el.getAttribute('aria-invalid') === 'true'];
+"""
+
+
+def _normalize(value) -> str:
+    """Compare values ignoring case, spaces and the separators input masks add"""
+    return re.sub(r'[^0-9A-Z]', '', str(value or '').upper())
+
+
+def field_value(element) -> str:
+    try:
+        return element.get_attribute('value') or ''
+    except WebDriverException:
+        return ''
+
+
+def _accepted(value, expected: str, valid: bool = True, aria_invalid: bool = False) -> bool:
+    return _normalize(value) == _normalize(expected) and valid and not aria_invalid
+
+
+def type_value(element, value: str):
+    """Clear a field and type a value key by key with short pauses"""
+    element.click()
+    element.clear()
+    for char in value:
+        element.send_keys(char)
+        time.sleep(random.uniform(*_KEY_DELAY))
+
+
+def fill_field(driver, element, value: str, site: str = '', unlock: bool = False) -> bool:
+    """
+    Set a form field's value and fire its input/change events
+
+    Args:
+        driver: WebDriver the element belongs to
+        element: Input element
+        value: Value to enter
+        site: 'NY' or 'NJ' (for the metric)
+        unlock: Remove the field's readonly/disabled attributes first (for fields the
+                site only enables after its own scripts run)
+
+    Returns:
+        True if the field ended up holding the value
+    """
+    try:
+        filled = driver.execute_script(_FILL_SCRIPT, element, value, unlock)
+        if filled is None:
+            print("⚠️  Field is disabled or read-only - typing it instead")
+        else:
+            entered, valid, aria_invalid = filled
+            if _accepted(entered, value, valid, aria_invalid):
+                FORM_FILLS.inc(site=site, method='script')
+                return True
+            print(f"⚠️  Field rejected scripted value ({entered!r}) - typing it instead")
+    except WebDriverException as e:
+        print(f"⚠️  Could not set field by script ({str(e).strip()}) - typing it instead")
+
+    try:
+        type_value(element, value)
+    except WebDriverException as e:
+        print(f"⚠️  Could not type into field: {str(e).strip()}")
+    if _accepted(field_value(element), value):
+        FORM_FILLS.inc(site=site, method='typed')
+        return True
+    FORM_FILLS.inc(site=site, method='failed')
+    return False
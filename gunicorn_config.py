@@ -9,6 +9,7 @@ bind = "0.0.0.0:5000"
 backlog = 2048
 
 # Worker processes
+# Browsers are capped host-wide across all workers and scripts (BROWSER_HOST_SLOTS, see browser_slots.py)
 workers = multiprocessing.cpu_count() * 2 + 1
 worker_class = "sync"
 worker_connections = 1000
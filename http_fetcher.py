@@ -0,0 +1,472 @@
+"""
+HTTP-only fetch path for E-ZPass lookups that don't need a browser
+
+When the pay-toll search (NY) or the violation lookup (NJ) is a plain HTML form, the
+lookup is one GET for the form and one submit for the results, made over a pooled
+requests session. The response goes through the same extraction code the Selenium
+scrapers use (toll_extraction).
+
+The Selenium flows record the form they submitted (action, method, field names) in
+FORM_CAPTURE_FILE; this fetcher replays that form, refreshing hidden fields such as
+CSRF tokens from the freshly loaded page. Without a capture it looks for the form by
+field names.
+
+If the site needs JavaScript (no form or no results in the HTML) or blocks the request,
+BrowserRequired is raised and callers fall back to Selenium. A site that needed the
+browser is not tried over HTTP again for HTTP_FETCH_RECHECK seconds.
+
+HTTP_FETCH modes:
+    auto  try HTTP first, fall back to Selenium (default)
+    off   always use Selenium
+    only  HTTP only, never start a browser (fixture testing)
+"""
+import json
+import os
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from browser import USER_AGENT
+from ezpass_sites import NY_PAY_TOLL_URL, NJ_HOME_URL
+from toll_extraction import extract_ny_financials, extract_nj_violation_info
+from fetch_timing import lap
+from page_outcome import PageOutcome, OUTCOME_MESSAGES, classify_text
+
+load_dotenv()
+
+HTTP_FETCH = os.getenv('HTTP_FETCH', 'auto').lower()
+HTTP_FETCH_TIMEOUT = int(os.getenv('HTTP_FETCH_TIMEOUT', '20'))
+HTTP_FETCH_RECHECK = int(os.getenv('HTTP_FETCH_RECHECK', '3600'))
+
+FORM_CAPTURE_FILE = os.getenv('FORM_CAPTURE_FILE',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'form_captures.json'))
+
+# Statuses that mean the response is a bot check rather than the site (block pages
+# served with 200 are recognised from their visible text, see page_outcome)
+BLOCKED_STATUSES = (401, 403, 429, 503)
+
+# Tags whose content isn't visible text / tags that start a new line of text
+_HIDDEN_TAGS = {'script', 'style', 'head', 'title', 'noscript', 'template'}
+_BLOCK_TAGS = {'div', 'p', 'br', 'tr', 'li', 'ul', 'ol', 'table', 'section', 'article', 'form',
+               'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'footer', 'label', 'dt', 'dd'}
+
+
+class BrowserRequired(Exception):
+    """The lookup can't be done over plain HTTP (needs JavaScript or was blocked)"""
+
+
+class PageParser(HTMLParser):
+    """Collect the visible text, table rows, forms, links and iframes of an HTML page"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ''
+        self.forms = []
+        self.links = []
+        self.iframes = []
+        self.table_rows = []
+        self._text = []
+        self._hidden_depth = 0
+        self._in_title = False
+        self._form = None
+        self._row = None
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        if tag in _HIDDEN_TAGS:
+            self._hidden_depth += 1
+            self._in_title = tag == 'title'
+        if tag in _BLOCK_TAGS:
+            self._text.append('\n')
+        if tag in ('td', 'th'):
+            self._text.append(' ')
+            if self._row is not None:
+                self._row.append(' ')
+
+        if tag == 'form':
+            self._form = {'action': attrs.get('action', ''), 'method': (attrs.get('method') or 'get').lower(),
+                          'id': attrs.get('id', ''), 'inputs': []}
+            self.forms.append(self._form)
+        elif tag in ('input', 'select', 'textarea') or (tag == 'button' and attrs.get('name')):
+            field = {'tag': tag, 'name': attrs.get('name', ''), 'type': attrs.get('type', 'text').lower(),
+                     'value': attrs.get('value', ''), 'id': attrs.get('id', ''),
+                     'placeholder': attrs.get('placeholder', '')}
+            if self._form is not None:
+                self._form['inputs'].append(field)
+        elif tag == 'tr':
+            self._row = []
+        elif tag == 'a':
+            self._link = {'href': attrs.get('href', ''), 'text': ''}
+            self.links.append(self._link)
+        elif tag == 'iframe' and attrs.get('src'):
+            self.iframes.append(attrs['src'])
+
+    def handle_endtag(self, tag):
+        if tag in _HIDDEN_TAGS and self._hidden_depth:
+            self._hidden_depth -= 1
+            self._in_title = False
+        if tag in _BLOCK_TAGS:
+            self._text.append('\n')
+        if tag == 'form':
+            self._form = None
+        elif tag == 'tr' and self._row is not None:
+            self.table_rows.append(' '.join(''.join(self._row).split()))
+            self._row = None
+        elif tag == 'a':
+            self._link = None
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data.strip()
+        if self._hidden_depth:
+            return
+        self._text.append(data)
+        if self._row is not None:
+            self._row.append(data)
+        if self._link is not None:
+            self._link['text'] += data.strip()
+
+    @property
+    def text(self) -> str:
+        """Visible text, one line per block element (like Selenium's element.text)"""
+        lines = (' '.join(line.split()) for line in ''.join(self._text).split('\n'))
+        return '\n'.join(line for line in lines if line)
+
+
+def parse_page(html: str) -> PageParser:
+    parser = PageParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def load_form_capture(site: str) -> Optional[Dict]:
+    """Return the form the Selenium flow last submitted for a site ('NY' or 'NJ')"""
+    try:
+        with open(FORM_CAPTURE_FILE, 'r') as f:
+            return json.load(f).get(site)
+    except (OSError, ValueError):
+        return None
+
+
+def save_form_capture(site: str, capture: Dict):
+    """Record the form submitted by the Selenium flow so the HTTP path can replay it"""
+    try:
+        try:
+            with open(FORM_CAPTURE_FILE, 'r') as f:
+                captures = json.load(f)
+        except (OSError, ValueError):
+            captures = {}
+        if captures.get(site) == capture:
+            return
+        captures[site] = capture
+        tmp_path = f"{FORM_CAPTURE_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(captures, f, indent=2)
+        os.replace(tmp_path, FORM_CAPTURE_FILE)
+    except Exception as e:
+        print(f"⚠️  Could not save form capture: {str(e)}")
+
+
+_CAPTURE_SCRIPT = """
+const first = arguments[0], second = arguments[1];
+const form = first.form || first.closest('form');
+if (!form) { return null; }
+const fields = {};
+for (const el of form.elements) {
+    if (el.name && el !== first && el !== second && !['submit', 'button'].includes(el.type)) {
+        fields[el.name] = '';
+    }
+}
+return {page_url: window.location.href, action: form.getAttribute('action') || '',
+        method: (form.getAttribute('method') || 'get').toLowerCase(),
+        first_field: first.name || '', second_field: second.name || '', fields: Object.keys(fields)};
+"""
+
+
+def capture_form_from_driver(site: str, driver, first_input, second_input):
+    """
+    Record the form that holds the lookup inputs in the Selenium flow
+
+    Only the form's address, method and field names are kept - never the values.
+
+    Args:
+        site: 'NY' or 'NJ'
+        driver: Selenium WebDriver
+        first_input: Account (NY) or violation number (NJ) input element
+        second_input: Plate number input element
+    """
+    try:
+        capture = driver.execute_script(_CAPTURE_SCRIPT, first_input, second_input)
+        if capture and capture.get('first_field') and capture.get('second_field'):
+            save_form_capture(site, capture)
+    except Exception as e:
+        print(f"⚠️  Could not capture form for HTTP fetch: {str(e)}")
+
+
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """Return this thread's pooled HTTP session (keeps connections and cookies alive)"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9'
+        })
+        _local.session = session
+    return session
+
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    """Make a request and raise BrowserRequired if the site blocked it"""
+    try:
+        response = get_session().request(method, url, timeout=HTTP_FETCH_TIMEOUT, **kwargs)
+    except requests.RequestException as e:
+        raise Exception(f"HTTP request failed: {str(e)}")
+
+    if response.status_code in BLOCKED_STATUSES:
+        raise BrowserRequired(f"Site returned HTTP {response.status_code}")
+    if classify_text(parse_page(response.text).text) == PageOutcome.BLOCKED:
+        raise BrowserRequired("Site answered with a bot check")
+    if response.status_code >= 400:
+        raise Exception(f"Site returned HTTP {response.status_code}")
+    return response
+
+
+def _field_matches(field: Dict, keywords) -> bool:
+    combined = f"{field['name']} {field['id']} {field['placeholder']}".lower()
+    return any(keyword in combined for keyword in keywords)
+
+
+def _find_form(page: PageParser, capture: Optional[Dict], first_keywords, second_keywords):
+    """
+    Find the lookup form and the names of its two lookup fields
+
+    Returns:
+        Tuple of (form, first_field_name, second_field_name)
+    """
+    if capture:
+        for form in page.forms:
+            names = {field['name'] for field in form['inputs']}
+            if capture['first_field'] in names and capture['second_field'] in names:
+                return form, capture['first_field'], capture['second_field']
+
+    for form in page.forms:
+        text_fields = [field for field in form['inputs']
+                       if field['tag'] == 'input' and field['type'] in ('text', 'tel', 'search') and field['name']]
+        first = next((f for f in text_fields if _field_matches(f, first_keywords)), None)
+        second = next((f for f in text_fields if f is not first and _field_matches(f, second_keywords)), None)
+        if first and second:
+            return form, first['name'], second['name']
+
+    raise BrowserRequired("Lookup form is not in the static HTML (page is rendered by JavaScript)")
+
+
+def _submit_form(page_url: str, form: Dict, values: Dict) -> requests.Response:
+    """Submit a parsed form with its hidden/default fields plus the given values"""
+    data = {}
+    button_sent = False
+    for field in form['inputs']:
+        if not field['name'] or field['type'] in ('checkbox', 'radio', 'file', 'reset'):
+            continue
+        if field['tag'] == 'button' or field['type'] in ('submit', 'button', 'image'):
+            # Only the first named submit button is sent, like a browser click
+            if not button_sent:
+                button_sent = True
+                data[field['name']] = field['value']
+            continue
+        data[field['name']] = field['value']
+    data.update(values)
+
+    action = urljoin(page_url, form['action'] or page_url)
+    if form['method'] == 'post':
+        return _request('POST', action, data=data, headers={'Referer': page_url})
+    return _request('GET', action, params=data, headers={'Referer': page_url})
+
+
+def fetch_ny(account_number: str, plate_number: str) -> Dict:
+    """
+    Look up an E-ZPass NY account over plain HTTP
+
+    Returns:
+        Result dictionary in the same shape as extract_toll_info
+
+    Raises:
+        BrowserRequired: If the lookup needs the Selenium flow
+    """
+    print(f"🌐 HTTP fetch (NY): {account_number} / {plate_number}")
+    form_response = _request('GET', NY_PAY_TOLL_URL)
+    form_page = parse_page(form_response.text)
+    form, account_field, plate_field = _find_form(
+        form_page, load_form_capture('NY'),
+        ('account', 'toll bill', 'tollbill', 'violation', 'invoice'), ('plate', 'tag', 'license')
+    )
+    lap('http_form')
+
+    response = _submit_form(form_response.url, form, {account_field: account_number, plate_field: plate_number})
+    page = parse_page(response.text)
+    lap('http_submit')
+    outcome = classify_text(page.text, 'NY')
+    if outcome in (PageOutcome.NOT_FOUND, PageOutcome.INVALID_INPUT):
+        return {
+            'success': False,
+            'error': OUTCOME_MESSAGES[outcome],
+            'outcome': outcome.value,
+            'account_number': account_number,
+            'plate_number': plate_number,
+            'fetch_method': 'http'
+        }
+    if outcome != PageOutcome.OK:
+        # Redisplayed form, error or maintenance page, or results rendered by JavaScript
+        raise BrowserRequired(f"Results are not in the HTML response (page outcome: {outcome.value})")
+
+    page_text = page.text
+    extracted = extract_ny_financials(page_text, page.table_rows,
+                                      lambda: [line for line in page_text.split('\n') if '$' in line])
+    lap('extract')
+    final_balance = extracted['final_balance']
+
+    return {
+        'success': True,
+        'outcome': outcome.value,
+        'account_number': account_number,
+        'plate_number': plate_number,
+        'total_balance_due': round(extracted['total_balance_due'], 2),
+        'balance_amount': round(final_balance, 2),
+        'ny_balance_amount': round(final_balance, 2),
+        'nj_balance_amount': 0.0,
+        'toll_charges_total': round(extracted['toll_charges_total'], 2),
+        'toll_bill_numbers': extracted['toll_bill_numbers'],
+        'violation_count': extracted['violation_count'],
+        'violations': extracted['violations'][:10],
+        'toll_entries': extracted['toll_entries'][:10],
+        'sources': ['NY'],
+        'source': 'NY',
+        'page_title': page.title,
+        'url': response.url,
+        'raw_page_text': page_text[:500],
+        'fetch_method': 'http'
+    }
+
+
+def fetch_nj(violation_number: str, plate_number: str, account_number: str = None) -> Dict:
+    """
+    Look up an E-ZPass NJ violation over plain HTTP
+
+    Returns:
+        Result dictionary in the same shape as extract_toll_info_nj
+
+    Raises:
+        BrowserRequired: If the lookup needs the Selenium flow
+    """
+    print(f"🌐 HTTP fetch (NJ): {violation_number} / {plate_number}")
+    capture = load_form_capture('NJ')
+    keywords = (('notice', 'invoice', 'violation'), ('tag', 'plate', 'license'))
+
+    # The captured form page, or the page behind the homepage's Invoice/Violations link
+    if capture and capture.get('page_url'):
+        form_response = _request('GET', capture['page_url'])
+    else:
+        home_response = _request('GET', NJ_HOME_URL)
+        home = parse_page(home_response.text)
+        link = next((l for l in home.links
+                     if ('invoice' in l['text'].lower() or 'violation' in l['text'].lower())
+                     and l['href'] and not l['href'].startswith(('#', 'javascript:'))), None)
+        if not link:
+            raise BrowserRequired("Violation lookup is opened by JavaScript")
+        form_response = _request('GET', urljoin(home_response.url, link['href']))
+
+    form_page = parse_page(form_response.text)
+    if not form_page.forms and form_page.iframes:
+        # The lookup form lives in an iframe
+        form_response = _request('GET', urljoin(form_response.url, form_page.iframes[0]))
+        form_page = parse_page(form_response.text)
+
+    form, violation_field, plate_field = _find_form(form_page, capture, *keywords)
+    lap('http_form')
+    response = _submit_form(form_response.url, form, {violation_field: violation_number, plate_field: plate_number})
+    page = parse_page(response.text)
+    lap('http_submit')
+    outcome = classify_text(page.text, 'NJ')
+    if outcome in (PageOutcome.NOT_FOUND, PageOutcome.INVALID_INPUT):
+        return {
+            'success': False,
+            'error': OUTCOME_MESSAGES[outcome],
+            'outcome': outcome.value,
+            'account_number': account_number or '',
+            'plate_number': plate_number,
+            'violation_number': violation_number,
+            'balance_amount': 0,
+            'violation_count': 0,
+            'toll_bill_numbers': [],
+            'violations': [],
+            'source': 'NJ E-ZPass',
+            'fetch_method': 'http'
+        }
+    if outcome != PageOutcome.OK:
+        # Redisplayed form, error or maintenance page, or results rendered by JavaScript
+        raise BrowserRequired(f"Results are not in the HTML response (page outcome: {outcome.value})")
+
+    extracted = extract_nj_violation_info(page.text, violation_number)
+    lap('extract')
+    return {
+        'success': True,
+        'outcome': outcome.value,
+        'account_number': account_number or '',
+        'plate_number': plate_number,
+        'violation_number': violation_number,
+        'balance_amount': extracted['balance_amount'],
+        'violation_count': extracted['violation_count'],
+        'toll_bill_numbers': extracted['toll_bill_numbers'],
+        'violations': [],
+        'source': 'NJ E-ZPass',
+        'fetch_method': 'http'
+    }
+
+
+_browser_required_until = {}
+
+
+def try_http_fetch(site: str, **lookup) -> Optional[Dict]:
+    """
+    Try a lookup over plain HTTP
+
+    Args:
+        site: 'NY' (account_number, plate_number) or 'NJ' (violation_number, plate_number)
+        **lookup: Lookup fields
+
+    Returns:
+        Result dictionary, or None if the caller should use Selenium
+    """
+    if HTTP_FETCH == 'off':
+        return None
+    if HTTP_FETCH != 'only' and time.time() < _browser_required_until.get(site, 0):
+        return None
+
+    fetch = fetch_ny if site == 'NY' else fetch_nj
+    try:
+        return fetch(**lookup)
+    except BrowserRequired as e:
+        print(f"🌐 HTTP fetch not possible for {site}: {str(e)}")
+        if HTTP_FETCH == 'only':
+            return {'success': False, 'error': str(e), 'fetch_method': 'http', **lookup}
+        _browser_required_until[site] = time.time() + HTTP_FETCH_RECHECK
+        print("   Falling back to browser")
+        return None
+    except Exception as e:
+        print(f"⚠️  HTTP fetch failed for {site}: {str(e)}")
+        if HTTP_FETCH == 'only':
+            return {'success': False, 'error': str(e), 'fetch_method': 'http', **lookup}
+        return None
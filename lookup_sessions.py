@@ -0,0 +1,218 @@
+"""
+Warm lookup sessions for batch runs
+
+Every Selenium lookup normally starts from the site's homepage: NY loads the homepage
+and then the Pay Toll page before it can search, NJ loads the homepage and opens the
+violation modal. In a batch (auto_fetch) those page loads are repeated for every
+account. Inside batch_sessions(), lookups instead borrow a session - a scraper whose
+browser (or tab, in tab mode) is parked on the search form:
+
+    - After a lookup the scraper returns to the form (see return_to_form on the
+      scrapers): it stays put if the results rendered next to the form, otherwise it
+      goes back in the history. The next account costs one form fill and submit
+    - A session that can't get back to the form does a fresh homepage load on its next
+      lookup. One whose lookup failed (anything but a result, not-found or invalid-input
+      answer), whose browser died or grew past BROWSER_RSS_LIMIT_MB is closed
+    - Open sessions across both sites are capped at BROWSER_CONCURRENCY x BROWSER_TABS;
+      a site that needs a session while all are open closes an idle one of the other site
+    - A lookup past its deadline kills its session's browser (or closes its tab)
+    - Every session is closed when the batch ends. Parked browsers keep their host-wide
+      browser slots (see browser_slots) until then
+
+Sessions are counted in tolls_lookup_sessions_total{site,result}: `new` (browser
+launched), `warm` (lookup started on the parked form) and `reload` (fresh page load).
+"""
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from runtime_config import lookup_concurrency, resolve_browser_mode
+from browser import launch_chrome, quit_chrome, browser_bloated, browser_process_group
+from tab_scheduler import tab_mode_enabled, tab_scheduler
+from fetch_supervisor import deadline_wait, detached, on_deadline, kill_process_group
+from memory_guard import BROWSER_RECYCLES
+from metrics import counter
+
+# Answers after which the page is still a normal search page
+_KEEP_OUTCOMES = ('not_found', 'invalid_input')
+
+LOOKUP_SESSIONS = counter('tolls_lookup_sessions_total', 'Lookups run in batch sessions, by how the search form was reached',
+                          ('site', 'result'))
+
+
+class LookupSession:
+    """A scraper whose browser (or tab) stays open between lookups"""
+
+    def __init__(self, site: str, mode: str, automation, tab=None):
+        self.site = site
+        self.mode = mode
+        self.automation = automation
+        self.tab = tab
+        self.broken = False
+
+    @property
+    def driver(self):
+        return self.tab or self.automation.driver
+
+    def alive(self) -> bool:
+        if self.tab and (self.tab.closed or self.tab.browser.retiring):
+            return False
+        try:
+            self.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def bloated(self) -> bool:
+        return browser_bloated(self.tab.browser.driver if self.tab else self.driver)
+
+    def cancel(self):
+        """Stop the lookup running in this session (called by the fetch watchdog on its deadline)"""
+        self.broken = True
+        if self.tab:
+            self.tab.cancel()
+            return
+        pgid = browser_process_group(self.driver)
+        if pgid:
+            kill_process_group(pgid)
+
+    def close(self):
+        if self.tab:
+            tab_scheduler().checkin(self.tab)
+        else:
+            quit_chrome(self.driver)
+
+
+class SessionPool:
+    """Idle sessions of one batch, handed out per site"""
+
+    def __init__(self, max_sessions: int = None):
+        self.max_sessions = max_sessions or lookup_concurrency()
+        self.idle = []
+        self.open = 0
+        self._condition = threading.Condition()
+
+    def checkout(self, site: str, create: Callable, headless: Optional[bool] = None) -> LookupSession:
+        """
+        Get a session for one lookup (an idle one of this site, or a new one)
+
+        Args:
+            site: 'NY' or 'NJ'
+            create: Scraper class (called with the session's driver)
+            headless: Browser mode override (as for launch_chrome)
+
+        Raises:
+            DeadlineExceeded: If the caller's fetch deadline passed while every session was busy
+        """
+        mode = resolve_browser_mode(headless)
+        while True:
+            spare = None
+            with self._condition:
+                session = next((s for s in self.idle if s.site == site and s.mode == mode), None)
+                if session:
+                    self.idle.remove(session)
+                    LOOKUP_SESSIONS.inc(site=site, result='warm' if session.automation.form_ready else 'reload')
+                    return session
+                if self.open < self.max_sessions:
+                    self.open += 1
+                    break
+                if self.idle:
+                    # Make room: the longest-idle session (of another site or mode)
+                    spare = self.idle.pop(0)
+                    self.open -= 1
+                else:
+                    deadline_wait(self._condition, f"a {site} lookup session")
+            if spare:
+                spare.close()
+
+        try:
+            # Not part of the caller's fetch: the session outlives it
+            if tab_mode_enabled():
+                tab = tab_scheduler().checkout(headless)
+                session = LookupSession(site, mode, create(tab), tab)
+            else:
+                with detached():
+                    driver = launch_chrome(headless)
+                session = LookupSession(site, mode, create(driver))
+        except Exception:
+            with self._condition:
+                self.open -= 1
+                self._condition.notify_all()
+            raise
+        LOOKUP_SESSIONS.inc(site=site, result='new')
+        return session
+
+    def checkin(self, session: LookupSession, result: Optional[Dict]):
+        """Park a session on the search form for the next lookup, or close it"""
+        keep = (not session.broken and result is not None
+                and (result.get('success') or result.get('outcome') in _KEEP_OUTCOMES) and session.alive())
+        if keep and session.bloated():
+            BROWSER_RECYCLES.inc()
+            keep = False
+        if keep:
+            session.automation.form_ready = session.automation.return_to_form()
+        with self._condition:
+            if keep:
+                self.idle.append(session)
+            else:
+                self.open -= 1
+            self._condition.notify_all()
+        if not keep:
+            session.close()
+
+    def close_all(self):
+        with self._condition:
+            sessions, self.idle = self.idle, []
+            self.open -= len(sessions)
+            self._condition.notify_all()
+        for session in sessions:
+            session.close()
+        if sessions:
+            print(f"🧹 Closed {len(sessions)} lookup session(s)")
+
+
+_pool = None
+
+
+@contextmanager
+def batch_sessions(enabled: bool = True):
+    """Reuse lookup sessions for every lookup in this process until the block ends"""
+    global _pool
+    if not enabled:
+        yield None
+        return
+    pool = SessionPool()
+    _pool = pool
+    try:
+        yield pool
+    finally:
+        _pool = None
+        pool.close_all()
+
+
+def sessions_active() -> bool:
+    """True inside batch_sessions()"""
+    return _pool is not None
+
+
+def run_in_session(site: str, create: Callable, lookup: Callable, headless: Optional[bool] = None) -> Dict:
+    """
+    Run a Selenium lookup on a batch session's scraper
+
+    Args:
+        site: 'NY' or 'NJ'
+        create: Scraper class (called with the session's driver)
+        lookup: Takes the scraper and returns the result dictionary
+        headless: Browser mode override (as for launch_chrome)
+
+    Returns:
+        The lookup's result
+    """
+    pool = _pool
+    session = pool.checkout(site, create, headless)
+    on_deadline(session.cancel)
+    result = None
+    try:
+        result = lookup(session.automation)
+        return result
+    finally:
+        pool.checkin(session, result)
@@ -0,0 +1,135 @@
+"""
+Memory admission control and RSS tracking for Chrome
+
+Launching another browser when the host is nearly out of memory makes it swap and slows
+every fetch in flight, and Chrome's memory grows with each page it loads. This module:
+
+    - holds back new launches while available host memory is below BROWSER_MIN_FREE_MB,
+      waiting up to BROWSER_MEMORY_WAIT seconds (or until the current fetch's deadline)
+      before refusing with InsufficientMemory
+    - measures each running browser's RSS (chromedriver plus all its Chrome processes)
+      so a reused browser over BROWSER_RSS_LIMIT_MB is retired (see lookup_sessions and
+      tab_scheduler)
+    - exports tolls_browser_rss_bytes{slot} and tolls_host_memory_available_bytes
+
+Settings (environment):
+    BROWSER_MIN_FREE_MB    Free-memory watermark for launching a browser (default: 1024)
+    BROWSER_MEMORY_WAIT    Seconds a launch waits for memory before it is refused (default: 120)
+    BROWSER_RSS_LIMIT_MB   RSS at which a browser is recycled (default: 1024)
+"""
+import os
+import threading
+import time
+from typing import Dict
+import psutil
+from dotenv import load_dotenv
+from metrics import counter, gauge
+from fetch_supervisor import time_left
+
+load_dotenv()
+
+BROWSER_MIN_FREE_MB = float(os.getenv('BROWSER_MIN_FREE_MB', '1024'))
+BROWSER_MEMORY_WAIT = float(os.getenv('BROWSER_MEMORY_WAIT', '120'))
+BROWSER_RSS_LIMIT_MB = float(os.getenv('BROWSER_RSS_LIMIT_MB', '1024'))
+
+MB = 1024 * 1024
+
+# Seconds between checks while waiting for memory
+_POLL_INTERVAL = 1.0
+
+BROWSER_LAUNCHES_HELD = counter('tolls_browser_launches_held_total',
+                                'Browser launches that waited for (held) or gave up on (refused) free memory',
+                                ('result',))
+BROWSER_RECYCLES = counter('tolls_browser_recycles_total', 'Browsers restarted for exceeding BROWSER_RSS_LIMIT_MB')
+
+# Running browsers: chromedriver pid -> session label (the browser's slot)
+_browsers = {}
+_browsers_lock = threading.Lock()
+
+
+class InsufficientMemory(Exception):
+    """Free memory stayed below the watermark for the whole wait"""
+
+
+def available_memory() -> int:
+    """Memory available to new processes on this host (bytes)"""
+    return psutil.virtual_memory().available
+
+
+def process_tree_rss(pid: int) -> int:
+    """RSS of a process and all its descendants (bytes; 0 if it is gone)"""
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return 0
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total
+
+
+def admit_browser(timeout: float = None):
+    """
+    Wait until the host has enough free memory to launch a browser
+
+    Args:
+        timeout: Seconds to wait (default: BROWSER_MEMORY_WAIT, capped at the current fetch's deadline)
+
+    Raises:
+        InsufficientMemory: If free memory stayed below BROWSER_MIN_FREE_MB
+    """
+    watermark = BROWSER_MIN_FREE_MB * MB
+    if available_memory() >= watermark:
+        return
+    timeout = time_left(BROWSER_MEMORY_WAIT) if timeout is None else timeout
+    print(f"⏳ Only {available_memory() / MB:.0f}MB free (need {BROWSER_MIN_FREE_MB:.0f}MB) - "
+          f"holding browser launch for up to {timeout:.0f}s")
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(_POLL_INTERVAL)
+        if available_memory() >= watermark:
+            BROWSER_LAUNCHES_HELD.inc(result='held')
+            return
+    BROWSER_LAUNCHES_HELD.inc(result='refused')
+    raise InsufficientMemory(f"Not launching a browser: {available_memory() / MB:.0f}MB free, "
+                             f"below the {BROWSER_MIN_FREE_MB:.0f}MB watermark for {timeout:.0f}s")
+
+
+def track_browser(pid: int, label: str):
+    """Start measuring a browser (pid of its chromedriver)"""
+    with _browsers_lock:
+        _browsers[pid] = label
+
+
+def untrack_browser(pid: int):
+    with _browsers_lock:
+        _browsers.pop(pid, None)
+
+
+def browser_rss(pid: int) -> int:
+    """RSS of a browser: chromedriver plus its Chrome processes (bytes)"""
+    return process_tree_rss(pid)
+
+
+def over_rss_limit(pid: int) -> bool:
+    """True if a browser has grown past BROWSER_RSS_LIMIT_MB"""
+    rss = browser_rss(pid)
+    if rss > BROWSER_RSS_LIMIT_MB * MB:
+        print(f"♻️  Browser using {rss / MB:.0f}MB (limit {BROWSER_RSS_LIMIT_MB:.0f}MB)")
+        return True
+    return False
+
+
+def browser_memory() -> Dict[str, int]:
+    """RSS per running browser, keyed by session label"""
+    with _browsers_lock:
+        browsers = list(_browsers.items())
+    return {label: browser_rss(pid) for pid, label in browsers}
+
+
+gauge('tolls_browser_rss_bytes', 'Resident memory per running browser session', ('slot',), func=browser_memory)
+gauge('tolls_host_memory_available_bytes', 'Memory available for new processes on this host', func=available_memory)
@@ -0,0 +1,288 @@
+"""
+In-process metrics in the Prometheus text exposition format
+
+app.py serves them at /metrics; long-running workers call start_metrics_server() to
+expose the same page on their own port, and one-shot jobs can write_textfile() for a
+node_exporter textfile collector. No client library is needed.
+
+Metrics:
+    tolls_fetch_total{source,outcome,method}          Toll fetches
+    tolls_fetch_duration_seconds{source,outcome}      Fetch latency
+    tolls_fetch_stage_seconds{source,stage}           Time per fetch stage (see fetch_timing)
+    tolls_active_browsers                             Chrome instances running in this process
+    tolls_fetch_queue_depth                           Email requests waiting for or being fetched
+    tolls_email_outbox_messages{state}                Email outbox rows by state
+    tolls_imap_poll_duration_seconds                  IMAP unread-email checks
+    tolls_emails_total{outcome}                       Email deliveries (sent / retry / failed)
+    tolls_smtp_send_duration_seconds{outcome}         SMTP send latency
+    tolls_account_store_duration_seconds{operation}   accounts_config.json reads and writes
+
+Other modules register their own metrics with counter()/gauge()/histogram() (e.g.
+tolls_selector_cache_total in selector_cache).
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from fetch_timing import add_timing_sink
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FETCH_BUCKETS = (1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base class: a named metric with optional labels"""
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, Dict, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down
+
+    Pass `func` to compute the value when the metrics are rendered; it returns a number,
+    or a dict of label-value tuples to numbers for labelled gauges.
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 func: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.func is None:
+            yield from super().samples()
+            return
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"⚠️  Could not collect {self.name}: {str(e)}")
+            return
+        if isinstance(value, dict):
+            for key, item in value.items():
+                key = key if isinstance(key, tuple) else (key,)
+                yield self.name, dict(zip(self.labelnames, key)), item
+        else:
+            yield self.name, {}, value
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, counts[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Tuple[str, ...] = (), func: Callable = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, func))
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+FETCHES = counter('tolls_fetch_total', 'Toll fetches by source, outcome and fetch method',
+                  ('source', 'outcome', 'method'))
+FETCH_DURATION = histogram('tolls_fetch_duration_seconds', 'Toll fetch latency', ('source', 'outcome'),
+                           FETCH_BUCKETS)
+FETCH_STAGE_DURATION = histogram('tolls_fetch_stage_seconds', 'Time spent in each fetch stage',
+                                 ('source', 'stage'), (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 10, 15, 20, 30, 60))
+FETCH_QUEUE_DEPTH = gauge('tolls_fetch_queue_depth', 'Email requests waiting for or being fetched')
+IMAP_POLL_DURATION = histogram('tolls_imap_poll_duration_seconds', 'Duration of IMAP unread-email checks',
+                               (), (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+EMAILS = counter('tolls_emails_total', 'Email deliveries by outcome (sent, retry, failed)', ('outcome',))
+SMTP_SEND_DURATION = histogram('tolls_smtp_send_duration_seconds', 'SMTP send latency', ('outcome',),
+                               (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+ACCOUNT_STORE_DURATION = histogram('tolls_account_store_duration_seconds',
+                                   'accounts_config.json read and write time', ('operation',),
+                                   (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5))
+
+
+def record_fetch(site: str, timings: Dict, result: Optional[Dict]):
+    """Timing sink that feeds the fetch metrics"""
+    outcome = 'success' if result and result.get('success') else 'failure'
+    method = (result or {}).get('fetch_method', 'browser')
+    FETCHES.inc(source=site, outcome=outcome, method=method)
+    FETCH_DURATION.observe(timings.get('total', 0), source=site, outcome=outcome)
+    for stage, seconds in timings.get('stages', {}).items():
+        FETCH_STAGE_DURATION.observe(seconds, source=site, stage=stage)
+
+
+add_timing_sink(record_fetch)
+
+
+def render_metrics() -> str:
+    """All metrics in the text exposition format"""
+    return REGISTRY.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics on a background thread (for workers without a web server)
+
+    Args:
+        port: Port to listen on (0 or less disables the endpoint)
+        host: Interface to bind (default: METRICS_HOST or 127.0.0.1)
+
+    Returns:
+        The server, or None if disabled or the port is unavailable
+    """
+    if port <= 0:
+        return None
+    host = host or os.getenv('METRICS_HOST', '127.0.0.1')
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️  Could not start metrics endpoint on {host}:{port}: {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    print(f"📈 Metrics available at http://{host}:{port}/metrics")
+    return server
+
+
+def write_textfile(path: str):
+    """Write the metrics to a file atomically (node_exporter textfile collector)"""
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(render_metrics())
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️  Could not write metrics file {path}: {str(e)}")
@@ -0,0 +1,134 @@
+"""
+Change-only notifications: remember what was last emailed per recipient and account
+
+auto_fetch uses this to skip emails when nothing material (balances, violation count,
+bill numbers) changed since the last email to that recipient. A heartbeat email is
+still sent every NOTIFY_HEARTBEAT_HOURS so users know the checks are running.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Skip emails whose content hasn't changed since the last one (set to false to always send)
+CHANGE_ONLY_NOTIFICATIONS = os.getenv('CHANGE_ONLY_NOTIFICATIONS', 'true').lower() in ('1', 'true', 'yes')
+
+# Send an unchanged result again after this many hours (0 = never)
+NOTIFY_HEARTBEAT_HOURS = float(os.getenv('NOTIFY_HEARTBEAT_HOURS', '168'))
+
+NOTIFICATION_STATE_FILE = os.getenv('NOTIFICATION_STATE_FILE',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 'notification_state.json'))
+
+
+def _normalize(value) -> str:
+    return str(value or '').strip().upper().replace(' ', '').replace('-', '')
+
+
+def _amount(value) -> str:
+    try:
+        return f"{float(value or 0):.2f}"
+    except (ValueError, TypeError):
+        return '0.00'
+
+
+def account_key(toll_data: Dict) -> str:
+    """Identify an account by its NY account number, NJ violation number and plate"""
+    violation = toll_data.get('violation_number') or toll_data.get('nj_violation_number')
+    return '|'.join(_normalize(v) for v in (toll_data.get('account_number'), violation, toll_data.get('plate_number')))
+
+
+def content_hash(toll_data: Dict) -> str:
+    """
+    Hash the parts of a result that make an email worth sending
+
+    Args:
+        toll_data: Dictionary containing toll information
+
+    Returns:
+        str: SHA-256 of balances, violation count and bill numbers
+    """
+    material = {
+        'balance': _amount(toll_data.get('balance_amount')),
+        'ny_balance': _amount(toll_data.get('ny_balance_amount')),
+        'nj_balance': _amount(toll_data.get('nj_balance_amount')),
+        'violations': int(toll_data.get('violation_count') or 0),
+        'bills': sorted(str(bill) for bill in (toll_data.get('toll_bill_numbers') or []))
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class NotificationState:
+    def __init__(self, path: str = None, heartbeat_hours: float = None):
+        """
+        Initialize the state store
+
+        Args:
+            path: JSON file holding the state (default: NOTIFICATION_STATE_FILE)
+            heartbeat_hours: Resend unchanged results after this many hours (default: NOTIFY_HEARTBEAT_HOURS)
+        """
+        self.path = path or NOTIFICATION_STATE_FILE
+        self.heartbeat_hours = NOTIFY_HEARTBEAT_HOURS if heartbeat_hours is None else heartbeat_hours
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️  Could not read notification state ({str(e)}), starting fresh")
+            return {}
+
+    def _save(self):
+        """Write the state atomically (a crash never leaves a half-written file)"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def check(self, recipient_email: str, toll_data: Dict) -> Tuple[bool, str]:
+        """
+        Decide whether a result should be emailed
+
+        Args:
+            recipient_email: Email address the result would go to
+            toll_data: Dictionary containing toll information
+
+        Returns:
+            Tuple of (should_send, reason) where reason is 'new', 'changed', 'heartbeat' or 'unchanged'
+        """
+        with self._lock:
+            entry = self._state.get(recipient_email.strip().lower(), {}).get(account_key(toll_data))
+        if entry is None:
+            return True, 'new'
+        if entry.get('hash') != content_hash(toll_data):
+            return True, 'changed'
+        if self.heartbeat_hours and time.time() - entry.get('sent_at', 0) >= self.heartbeat_hours * 3600:
+            return True, 'heartbeat'
+        return False, 'unchanged'
+
+    def record(self, recipient_email: str, toll_results: List[Dict]):
+        """
+        Remember what was emailed to a recipient
+
+        Args:
+            recipient_email: Email address the results were sent (queued) to
+            toll_results: Toll information dictionaries included in the email
+        """
+        now = time.time()
+        with self._lock:
+            recipient_state = self._state.setdefault(recipient_email.strip().lower(), {})
+            for toll_data in toll_results:
+                recipient_state[account_key(toll_data)] = {'hash': content_hash(toll_data), 'sent_at': now}
+            try:
+                self._save()
+            except Exception as e:
+                print(f"⚠️  Could not save notification state: {str(e)}")
@@ -0,0 +1,156 @@
+"""
+Terminal-state detection for E-ZPass result pages
+
+Instead of sleeping a fixed time after submitting a lookup, the scrapers poll the page
+with wait_for_outcome() and stop as soon as it shows a known outcome:
+
+    OK             Results are on the page (and have stopped changing)
+    BLOCKED        Anti-bot interstitial, access denied or a Chrome network error page
+    NOT_FOUND      "No records found" for the account/violation and plate
+    INVALID_INPUT  The site rejected the account/violation or plate number
+    SITE_ERROR     The site's own error page ("temporarily unavailable", HTTP 5xx); generic
+                   phrases like "something went wrong" only count if no results are shown
+    UNKNOWN        Nothing recognisable before the timeout (extraction runs as before)
+
+Failed lookups return in about a second instead of after the full wait.
+"""
+import re
+import time
+from enum import Enum
+from typing import Callable, Optional, Tuple
+from selenium.webdriver.common.by import By
+
+
+class PageOutcome(Enum):
+    OK = 'ok'
+    BLOCKED = 'blocked'
+    NOT_FOUND = 'not_found'
+    INVALID_INPUT = 'invalid_input'
+    SITE_ERROR = 'site_error'
+    UNKNOWN = 'unknown'
+
+    @property
+    def is_failure(self) -> bool:
+        return self not in (PageOutcome.OK, PageOutcome.UNKNOWN)
+
+
+# Checked in this order - a block page can mention "not found", so BLOCKED goes first.
+# Phrases are matched as whole words ("captcha" is not the reCAPTCHA badge on a normal page)
+FAILURE_MARKERS = [
+    (PageOutcome.BLOCKED, re.compile(
+        r"\b(?:access denied|request unsuccessful|captcha|are you a robot|pardon our interruption|"
+        r"automated traffic|unusual traffic|incapsula|err_[a-z_]+|this site can.t be reached|"
+        r"checking your browser|verify you are (?:a )?human)\b")),
+    (PageOutcome.INVALID_INPUT, re.compile(
+        r"\b(?:invalid (?:account|toll bill|violation|invoice|notice|plate|license|tag)|"
+        r"please enter a valid|is not a valid|does not match our records|format is incorrect)\b")),
+    (PageOutcome.NOT_FOUND, re.compile(
+        r"\b(?:no records? (?:were )?found|no results (?:were )?found|no matching (?:records|accounts|invoices)|"
+        r"could not (?:find|locate) (?:an? |any )?(?:account|record|invoice|violation|toll bill))\b")),
+    (PageOutcome.SITE_ERROR, re.compile(
+        r"\b(?:temporarily unavailable|service unavailable|internal server error)\b")),
+]
+
+# Generic error phrases that also show up in banners and help text next to real results:
+# only an error page if no results are on it
+GENERIC_ERROR_MARKERS = re.compile(r"\b(?:something went wrong|unexpected error|please try again later)\b")
+
+# Results are on the page
+RESULTS_MARKERS = {
+    'NY': re.compile(r"(?:balance|amount|total)[^$\n]{0,40}\$\s*\d|no open toll bills"),
+    'NJ': re.compile(r"amount\s+due|balance\s+due|total\s+due|paid in full|nothing is owed")
+}
+
+OUTCOME_MESSAGES = {
+    PageOutcome.BLOCKED: "The site blocked the automated request",
+    PageOutcome.NOT_FOUND: "No records found for this number and plate",
+    PageOutcome.INVALID_INPUT: "The site rejected the number or plate as invalid",
+    PageOutcome.SITE_ERROR: "The site returned an error page"
+}
+
+
+def classify_text(text: str, site: str = None, url: str = '', has_results: bool = False) -> PageOutcome:
+    """
+    Classify page text (and URL) into a PageOutcome
+
+    Args:
+        text: Visible page text
+        site: 'NY' or 'NJ' (picks the results markers; None checks failures only)
+        url: Current page URL (Chrome error pages use chrome-error://)
+        has_results: The caller already knows the page is usable (skips the generic error phrases)
+
+    Returns:
+        PageOutcome (UNKNOWN if nothing matched)
+    """
+    if url.startswith('chrome-error://'):
+        return PageOutcome.BLOCKED
+    lowered = (text or '').lower()
+    for outcome, pattern in FAILURE_MARKERS:
+        if pattern.search(lowered):
+            return outcome
+    results = RESULTS_MARKERS.get(site)
+    if results and results.search(lowered):
+        return PageOutcome.OK
+    if not has_results and GENERIC_ERROR_MARKERS.search(lowered):
+        return PageOutcome.SITE_ERROR
+    return PageOutcome.UNKNOWN
+
+
+def page_text(driver) -> str:
+    """Visible text of the current page (empty while it is loading)"""
+    try:
+        return driver.find_element(By.TAG_NAME, 'body').text
+    except Exception:
+        return ''
+
+
+def wait_for_outcome(driver, site: str, timeout: float, stale_text: str = None,
+                     ready: Optional[Callable[[], bool]] = None, poll: float = 0.5) -> Tuple[PageOutcome, str]:
+    """
+    Poll the page until it shows a terminal outcome or the timeout passes
+
+    OK is only returned once the text has stayed the same for one poll, so results
+    that render in pieces are complete before extraction.
+
+    Args:
+        driver: Selenium WebDriver
+        site: 'NY' or 'NJ'
+        timeout: Maximum seconds to wait (the old fixed sleep)
+        stale_text: Page text from before the submit - ignored until the page changes
+        ready: Optional check that counts as OK instead of the results markers
+               (e.g. "the lookup form is visible")
+        poll: Seconds between checks
+
+    Returns:
+        Tuple of (PageOutcome, page text when it was decided)
+    """
+    deadline = time.monotonic() + timeout
+    previous = None
+    text = ''
+    while True:
+        text = page_text(driver)
+        try:
+            url = driver.current_url or ''
+        except Exception:
+            url = ''
+
+        if stale_text is None or text != stale_text:
+            is_ready = False
+            if ready:
+                try:
+                    is_ready = bool(ready())
+                except Exception:
+                    pass
+            outcome = classify_text(text, None if ready else site, url, has_results=is_ready)
+            if outcome.is_failure:
+                print(f"🛑 Page outcome: {outcome.value} (stopped waiting early)")
+                return outcome, text
+            if is_ready:
+                return PageOutcome.OK, text
+            if not ready and outcome == PageOutcome.OK and text == previous:
+                return outcome, text
+        previous = text
+
+        if time.monotonic() >= deadline:
+            return PageOutcome.UNKNOWN, text
+        time.sleep(min(poll, max(0.0, deadline - time.monotonic())))
@@ -0,0 +1,138 @@
+"""
+De-duplication of repeated email toll requests
+
+Customers often send the same account/plate two or three times. Requests with the
+same normalized (account, violation, plate, reply-to) within a time window are
+answered from the first run's result instead of re-running add_account, a full
+scrape and another email.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How long (seconds) a successful result answers repeated requests (default: 15 minutes)
+EMAIL_DEDUP_WINDOW = int(os.getenv('EMAIL_DEDUP_WINDOW', '900'))
+
+
+def _normalize_id(value) -> str:
+    """Normalize an account/violation/plate value for comparison"""
+    if not value:
+        return ''
+    return str(value).strip().upper().replace(' ', '').replace('-', '')
+
+
+def request_key(email_data: Dict) -> Tuple[str, str, str, str]:
+    """
+    Build the de-duplication key for a parsed email request
+
+    Returns:
+        Tuple of (account, violation, plate, reply-to) in normalized form
+    """
+    account = _normalize_id(email_data.get('account_number'))
+    violation = _normalize_id(email_data.get('violation_number') or email_data.get('nj_violation_number'))
+    plate = _normalize_id(email_data.get('plate_number') or email_data.get('nj_plate_number'))
+    reply_to = (email_data.get('email') or email_data.get('sender_email') or '').strip().lower()
+    return (account, violation, plate, reply_to)
+
+
+def _default_reusable(result) -> bool:
+    return bool(result and result.get('success'))
+
+
+class _Entry:
+    def __init__(self, email_data: Dict):
+        self.email_data = email_data
+        self.done = threading.Event()
+        self.result = None
+        self.completed_at = None
+
+
+class RequestDeduplicator:
+    def __init__(self, window_seconds: int = None,
+                 reusable: Callable[[object], bool] = _default_reusable):
+        """
+        Initialize the de-duplicator
+
+        Args:
+            window_seconds: How long a result answers repeated requests (default: EMAIL_DEDUP_WINDOW)
+            reusable: Function deciding whether a result may answer duplicates (default: result['success'])
+        """
+        self.window_seconds = EMAIL_DEDUP_WINDOW if window_seconds is None else window_seconds
+        self.reusable = reusable
+        self.suppressed = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        """Drop completed entries that fell out of the window"""
+        expired = [key for key, entry in self._entries.items()
+                   if entry.completed_at is not None and now - entry.completed_at > self.window_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def run(self, email_data: Dict, handler: Callable[[Dict], object]) -> Tuple[object, Optional[Dict]]:
+        """
+        Run handler for a request unless an identical request was already answered
+
+        If an identical request is still in flight, this waits for it and reuses its
+        result. If the first run did not produce a reusable result, the request is
+        run normally so a failed lookup can be retried.
+
+        Args:
+            email_data: Parsed email request
+            handler: Function that processes the request and returns its result
+
+        Returns:
+            Tuple of (result, first_request). first_request is None if handler ran
+            for this request, otherwise the email data whose result was reused.
+        """
+        key = request_key(email_data)
+
+        while True:
+            with self._lock:
+                now = time.time()
+                self._expire(now)
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = _Entry(email_data)
+                    self._entries[key] = entry
+                    break
+
+            # Wait for the in-flight (or just finished) identical request
+            entry.done.wait()
+            if self.reusable(entry.result):
+                with self._lock:
+                    self.suppressed += 1
+                return entry.result, entry.email_data
+
+            # The first run failed - forget it and run this request ourselves
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+
+        try:
+            result = handler(email_data)
+        except Exception:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry.done.set()
+            raise
+
+        entry.result = result
+        entry.completed_at = time.time()
+        entry.done.set()
+        return result, None
+
+    def stats(self) -> Dict:
+        """Return suppression statistics"""
+        with self._lock:
+            return {
+                'suppressed': self.suppressed,
+                'tracked_requests': len(self._entries),
+                'window_seconds': self.window_seconds
+            }
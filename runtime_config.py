@@ -0,0 +1,131 @@
+"""
+Runtime configuration for browser automation
+
+Loaded once per process from an optional JSON file (RUNTIME_CONFIG_FILE, default:
+runtime_config.json next to this file) and then environment variables, which win:
+
+    BROWSER_MODE          headless-new (default), headless-old or visible (debugging only)
+    BROWSER_WINDOW_SIZE   Viewport as WIDTH,HEIGHT (default: 1920,1080)
+    BROWSER_CONCURRENCY   Browsers a process may run at once (default: 3)
+    BROWSER_TABS          Lookups one browser runs at once in separate tabs (default: 1 -
+                          one browser per lookup; see tab_scheduler)
+
+Example runtime_config.json:
+    {"browser_mode": "headless-new", "window_size": "1920,1080", "browser_concurrency": 3, "browser_tabs": 1}
+"""
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BROWSER_MODES = ('headless-new', 'headless-old', 'visible')
+
+DEFAULTS = {
+    'browser_mode': 'headless-new',
+    'window_size': '1920,1080',
+    'browser_concurrency': 3,
+    'browser_tabs': 1
+}
+
+_ENV_VARS = {
+    'browser_mode': 'BROWSER_MODE',
+    'window_size': 'BROWSER_WINDOW_SIZE',
+    'browser_concurrency': 'BROWSER_CONCURRENCY',
+    'browser_tabs': 'BROWSER_TABS'
+}
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def load_runtime_config(path: str = None) -> Dict:
+    """
+    Load the runtime configuration (defaults, then the JSON file, then environment variables)
+
+    Args:
+        path: JSON config file (default: RUNTIME_CONFIG_FILE or runtime_config.json)
+
+    Returns:
+        Dictionary with browser_mode, window_size, browser_concurrency and browser_tabs
+    """
+    config = dict(DEFAULTS)
+
+    path = path or os.getenv('RUNTIME_CONFIG_FILE',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runtime_config.json'))
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                config.update({key: value for key, value in json.load(f).items() if key in DEFAULTS})
+        except Exception as e:
+            print(f"⚠️  Could not read runtime config {path}: {str(e)}")
+
+    for key, env_var in _ENV_VARS.items():
+        if os.getenv(env_var):
+            config[key] = os.getenv(env_var)
+
+    # Validate
+    config['browser_mode'] = str(config['browser_mode']).strip().lower()
+    if config['browser_mode'] not in BROWSER_MODES:
+        print(f"⚠️  Unknown browser mode '{config['browser_mode']}', using {DEFAULTS['browser_mode']}")
+        config['browser_mode'] = DEFAULTS['browser_mode']
+
+    try:
+        config['browser_concurrency'] = max(1, int(config['browser_concurrency']))
+    except (ValueError, TypeError):
+        config['browser_concurrency'] = DEFAULTS['browser_concurrency']
+
+    try:
+        config['browser_tabs'] = max(1, int(config['browser_tabs']))
+    except (ValueError, TypeError):
+        config['browser_tabs'] = DEFAULTS['browser_tabs']
+
+    try:
+        parse_window_size(config['window_size'])
+    except ValueError:
+        print(f"⚠️  Invalid window size '{config['window_size']}', using {DEFAULTS['window_size']}")
+        config['window_size'] = DEFAULTS['window_size']
+
+    return config
+
+
+def get_runtime_config() -> Dict:
+    """Return the process-wide runtime configuration (loaded on first use)"""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = load_runtime_config()
+        return _config
+
+
+def lookup_concurrency() -> int:
+    """Lookups a process may run at once (browsers x tabs per browser)"""
+    config = get_runtime_config()
+    return config['browser_concurrency'] * config['browser_tabs']
+
+
+def parse_window_size(window_size: str) -> Tuple[int, int]:
+    """Parse 'WIDTH,HEIGHT' (or 'WIDTHxHEIGHT') into a tuple of ints"""
+    width, height = str(window_size).lower().replace('x', ',').split(',')
+    return int(width), int(height)
+
+
+def resolve_browser_mode(headless: Optional[bool] = None) -> str:
+    """
+    Decide the browser mode for one call
+
+    Args:
+        headless: Per-call override - None uses the configured mode, True forces a
+                  headless mode, False forces a visible window (debugging)
+
+    Returns:
+        str: One of BROWSER_MODES
+    """
+    mode = get_runtime_config()['browser_mode']
+    if headless is None:
+        return mode
+    if headless:
+        return mode if mode != 'visible' else 'headless-new'
+    return 'visible'
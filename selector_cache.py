@@ -0,0 +1,116 @@
+"""
+Learned selector cache for form-field discovery
+
+The scrapers try a list of locator strategies for each field (account input, plate
+input, submit button, ...), each with its own WebDriverWait timeout, so every strategy
+that misses costs seconds on every lookup. This cache remembers which strategy last
+worked per site and field, and candidates() tries that one first with a near-zero
+timeout before falling back to the full list:
+
+    for strategy, timeout in selector_cache.candidates('NY', 'account_input', account_selectors, 3):
+        ...
+        selector_cache.record('NY', 'account_input', strategy)
+
+Winners are persisted to SELECTOR_CACHE_FILE (default: selector_cache.json).
+SELECTOR_CACHE_FAST_TIMEOUT sets the timeout for the cached strategy (default: 0.5s).
+"""
+import json
+import os
+import threading
+from typing import Iterator, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+from metrics import counter
+
+load_dotenv()
+
+SELECTOR_CACHE_FILE = os.getenv('SELECTOR_CACHE_FILE',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'selector_cache.json'))
+SELECTOR_CACHE_FAST_TIMEOUT = float(os.getenv('SELECTOR_CACHE_FAST_TIMEOUT', '0.5'))
+
+SELECTOR_CACHE_LOOKUPS = counter('tolls_selector_cache_total',
+                                 'Selector cache lookups (hit = cached strategy found the field first try)',
+                                 ('site', 'field', 'result'))
+
+
+def _as_list(strategy) -> List:
+    """JSON form of a strategy (tuples become lists)"""
+    return [_as_list(part) if isinstance(part, (tuple, list)) else part for part in strategy]
+
+
+class SelectorCache:
+    """Per-site record of the locator strategy that last found each field"""
+
+    def __init__(self, path: str = None):
+        self.path = path or SELECTOR_CACHE_FILE
+        self._lock = threading.Lock()
+        self._winners = None
+        # (site, field) of the lookup in progress on this thread and whether its cached strategy missed
+        self._local = threading.local()
+
+    def _load(self):
+        if self._winners is None:
+            try:
+                with open(self.path, 'r') as f:
+                    self._winners = json.load(f)
+            except (OSError, ValueError):
+                self._winners = {}
+        return self._winners
+
+    def _save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._winners, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️  Could not save selector cache: {str(e)}")
+
+    def get(self, site: str, field: str) -> Optional[List]:
+        """Strategy that last found a field (as a list), or None"""
+        with self._lock:
+            return self._load().get(site, {}).get(field)
+
+    def candidates(self, site: str, field: str, strategies: Sequence, timeout: float) -> Iterator[Tuple[object, float]]:
+        """
+        Strategies to try, in order, with the timeout for each
+
+        The cached winner (if it is still in `strategies`) comes first with a near-zero
+        timeout; then every strategy in its usual order with the normal timeout, so a
+        miss costs no more than before.
+
+        Args:
+            site: 'NY' or 'NJ'
+            field: Field name, e.g. 'account_input'
+            strategies: Locator strategies in their usual order
+            timeout: Normal timeout per strategy
+
+        Yields:
+            Tuple of (strategy, timeout)
+        """
+        cached = self.get(site, field)
+        winner = next((strategy for strategy in strategies if _as_list(strategy) == cached), None)
+        self._local.lookup = (site, field, winner is None)
+        if winner is not None:
+            yield winner, min(SELECTOR_CACHE_FAST_TIMEOUT, timeout)
+            self._local.lookup = (site, field, True)
+            SELECTOR_CACHE_LOOKUPS.inc(site=site, field=field, result='miss')
+            print(f"🔎 Cached selector for {site} {field} missed, trying all {len(strategies)} strategies")
+        for strategy in strategies:
+            yield strategy, timeout
+
+    def record(self, site: str, field: str, strategy):
+        """Remember the strategy that found a field"""
+        strategy = _as_list(strategy)
+        lookup = getattr(self._local, 'lookup', None)
+        self._local.lookup = None
+        with self._lock:
+            winners = self._load()
+            if winners.get(site, {}).get(field) == strategy:
+                if lookup == (site, field, False):
+                    SELECTOR_CACHE_LOOKUPS.inc(site=site, field=field, result='hit')
+                return
+            winners.setdefault(site, {})[field] = strategy
+            self._save()
+
+
+selector_cache = SelectorCache()
@@ -143,10 +143,10 @@ function fetchAllAccounts() {
         
         // Show email summary
         if (data.results) {
-            const emailsSent = data.results.filter(r => r.email_sent).length;
+            const emailsSent = data.results.filter(r => r.email_sent || r.email_queued).length;
             if (emailsSent > 0) {
                 setTimeout(() => {
-                    alert(`✅ ${emailsSent} email(s) sent successfully!\n\nCheck inboxes for toll information.`);
+                    alert(`✅ ${emailsSent} email(s) on their way!\n\nCheck inboxes for toll information.`);
                 }, 500);
             }
         }
@@ -234,7 +234,7 @@ function displayMultiResults(data) {
                             <span class="info-value">${violations}</span>
                         </div>
                     ` : ''}
-                    ${result.email_sent ? `
+                    ${result.email_sent || result.email_queued ? `
                         <div class="info-row" style="margin-top: 10px; padding-top: 10px; border-top: 1px solid #e2e8f0;">
                             <span class="info-label" style="color: #10b981;">✓ Email Sent</span>
                         </div>
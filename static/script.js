@@ -33,7 +33,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify({
                     account_number: accountNumber,
                     plate_number: plateNumber,
-                    headless: false,
                     email: email
                 })
             });
@@ -43,12 +42,12 @@ document.addEventListener('DOMContentLoaded', function() {
             if (data.success) {
                 displayResults(data);
                 
-                // Show email confirmation if email was sent
-                if (data.email_sent) {
+                // Show email confirmation if email was sent or queued
+                if (data.email_sent || data.email_queued) {
                     const emailInput = document.getElementById('email');
                     if (emailInput && emailInput.value.trim()) {
                         setTimeout(() => {
-                            alert(`✅ Email sent successfully to ${emailInput.value.trim()}!\n\nCheck your inbox for your toll information.`);
+                            alert(`✅ Email on its way to ${emailInput.value.trim()}!\n\nCheck your inbox for your toll information.`);
                         }, 500);
                     }
                 }
@@ -134,6 +133,23 @@ document.addEventListener('DOMContentLoaded', function() {
         const now = new Date();
         document.getElementById('lastUpdated').textContent = now.toLocaleString();
         
+        // Display where the fetch spent its time (slowest stage, full breakdown on hover)
+        const fetchTimeDisplay = document.getElementById('fetchTimeDisplay');
+        if (fetchTimeDisplay) {
+            const timings = data.timings;
+            if (timings && timings.total !== undefined) {
+                const stages = Object.entries(timings.stages || {});
+                const slowest = stages.reduce((max, stage) => (!max || stage[1] > max[1]) ? stage : max, null);
+                fetchTimeDisplay.textContent = slowest
+                    ? `${timings.total.toFixed(1)}s (slowest: ${slowest[0]} ${slowest[1].toFixed(1)}s)`
+                    : `${timings.total.toFixed(1)}s`;
+                fetchTimeDisplay.title = stages.map(([stage, seconds]) => `${stage}: ${seconds.toFixed(2)}s`).join('\n');
+            } else {
+                fetchTimeDisplay.textContent = '--';
+                fetchTimeDisplay.title = '';
+            }
+        }
+        
         // Show results section
         resultsSection.style.display = 'grid';
         resultsSection.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
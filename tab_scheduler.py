@@ -0,0 +1,386 @@
+"""
+Several lookups at once in one Chrome, one tab each
+
+A Chrome instance costs hundreds of MB and seconds to start, while a lookup spends most
+of its time waiting for the toll site. With BROWSER_TABS > 1 the scrapers share
+browsers instead of launching one per lookup:
+
+    - Up to BROWSER_CONCURRENCY browsers per process, each running up to BROWSER_TABS
+      lookups. New tabs go to the busiest browser with room, so spare browsers go idle
+      and are closed after BROWSER_TAB_IDLE seconds
+    - Every lookup gets its own tab in a fresh browser context (CDP
+      Target.createBrowserContext, like an incognito window), so lookups in the same
+      browser never see each other's cookies, storage or form state. The context is
+      disposed when the lookup ends. If chromedriver can't drive a context tab, the
+      browser falls back to plain tabs and runs one lookup at a time
+    - A lookup drives its tab through a TabDriver, a WebDriver sharing the browser's
+      chromedriver session. chromedriver addresses one window at a time, so each
+      command takes the browser's lock and switches to the tab (and back into its
+      frame) first; lookups in one browser interleave command by command
+    - Shared browsers are launched outside the lookup's deadline, so they don't die with
+      the lookup that happened to start them. A lookup past its deadline has its tab
+      closed instead; if its browser is stuck in a command, the browser is killed
+    - A browser that crashed or grew past BROWSER_RSS_LIMIT_MB gets no new tabs and is
+      closed once its last lookup ends
+
+Settings (environment):
+    BROWSER_TABS       Lookups per browser (default: 1 - tab mode off; see runtime_config)
+    BROWSER_TAB_IDLE   Seconds an unused shared browser stays open (default: 300)
+"""
+import atexit
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+from selenium.common.exceptions import NoSuchWindowException, WebDriverException
+from selenium.webdriver.chrome.webdriver import WebDriver as ChromeWebDriver
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.mobile import Mobile
+from selenium.webdriver.remote.switch_to import SwitchTo
+from runtime_config import get_runtime_config, resolve_browser_mode
+from browser import launch_chrome, quit_chrome, browser_bloated, browser_process_group
+from fetch_supervisor import deadline_wait, detached, on_deadline, kill_process_group
+from memory_guard import BROWSER_RECYCLES
+from metrics import gauge
+
+load_dotenv()
+
+BROWSER_TAB_IDLE = float(os.getenv('BROWSER_TAB_IDLE', '300'))
+
+# Seconds a cancelled lookup waits for its browser's lock before killing the browser
+_CANCEL_LOCK_WAIT = 5.0
+
+_HIDE_WEBDRIVER = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+
+
+class SharedBrowser:
+    """One Chrome whose tabs run separate lookups"""
+
+    def __init__(self, driver, mode: str, capacity: int):
+        self.driver = driver
+        self.mode = mode
+        self.capacity = capacity
+        self.lock = threading.RLock()
+        # Blank first tab: chromedriver always has a window to return to
+        self.anchor = driver.current_window_handle
+        self.active = self.anchor
+        self.tabs = 0
+        self.retiring = False
+        self.idle_since = time.monotonic()
+
+    def switch_to_tab(self, handle: str):
+        """Point chromedriver at a tab (caller holds self.lock)"""
+        self.driver.switch_to.window(handle)
+        self.active = handle
+
+    def alive(self) -> bool:
+        try:
+            with self.lock:
+                self.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+
+class TabDriver(ChromeWebDriver):
+    """
+    WebDriver for one tab of a SharedBrowser
+
+    Shares the browser's chromedriver session (WebDriver.__init__ is deliberately not
+    called). quit() and close() close the tab, never the browser.
+    """
+
+    def __init__(self, browser: SharedBrowser, handle: str, context_id: Optional[str]):
+        self.__dict__.update(browser.driver.__dict__)
+        self._switch_to = SwitchTo(self)
+        self._mobile = Mobile(self)
+        self.browser = browser
+        self.handle = handle
+        self.context_id = context_id
+        self.cancelled = False
+        self.closed = False
+        self._frames = []
+
+    @classmethod
+    def open(cls, browser: SharedBrowser) -> 'TabDriver':
+        """Open a tab in its own browser context (or a plain tab if contexts are unavailable)"""
+        driver = browser.driver
+        with browser.lock:
+            context_id = None
+            try:
+                context_id = driver.execute_cdp_cmd('Target.createBrowserContext', {})['browserContextId']
+                target_id = driver.execute_cdp_cmd('Target.createTarget', {
+                    'url': 'about:blank', 'browserContextId': context_id})['targetId']
+                # chromedriver's window handles are the tabs' target ids
+                handle = next((h for h in driver.window_handles if h.endswith(target_id)), None)
+                if handle is None:
+                    raise WebDriverException('chromedriver does not list the new context tab')
+            except WebDriverException as e:
+                if context_id:
+                    try:
+                        driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': context_id})
+                    except WebDriverException:
+                        pass
+                print(f"⚠️  Isolated browser contexts unavailable ({str(e).strip()}) - "
+                      f"running one lookup at a time in this browser")
+                context_id = None
+                browser.capacity = 1
+                driver.switch_to.new_window('tab')
+                handle = driver.current_window_handle
+                browser.active = handle
+
+            tab = cls(browser, handle, context_id)
+            tab.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': _HIDE_WEBDRIVER})
+            return tab
+
+    def execute(self, driver_command: str, params: dict = None) -> dict:
+        with self.browser.lock:
+            if self.cancelled or self.closed:
+                raise NoSuchWindowException('Tab was closed (lookup cancelled or finished)')
+            if self.browser.active != self.handle:
+                self.browser.switch_to_tab(self.handle)
+                for frame in self._frames:
+                    super().execute(Command.SWITCH_TO_FRAME, {'id': frame})
+            response = super().execute(driver_command, params)
+
+            # Remember the frame this tab is in; switching tabs resets it
+            if driver_command == Command.SWITCH_TO_FRAME:
+                frame = (params or {}).get('id')
+                self._frames = [] if frame is None else self._frames + [frame]
+            elif driver_command == Command.SWITCH_TO_PARENT_FRAME:
+                self._frames = self._frames[:-1]
+            return response
+
+    def close_tab(self):
+        """Close the tab and dispose its browser context (errors mark the browser for retirement)"""
+        browser = self.browser
+        with browser.lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                if self.context_id:
+                    browser.switch_to_tab(browser.anchor)
+                    browser.driver.execute_cdp_cmd('Target.disposeBrowserContext',
+                                                   {'browserContextId': self.context_id})
+                else:
+                    browser.switch_to_tab(self.handle)
+                    browser.driver.close()
+                    browser.switch_to_tab(browser.anchor)
+            except Exception as e:
+                print(f"⚠️  Could not close tab: {str(e).strip()}")
+                browser.retiring = True
+
+    def cancel(self):
+        """Stop the lookup in this tab (called by the fetch watchdog on its deadline)"""
+        self.cancelled = True
+        if self.browser.lock.acquire(timeout=_CANCEL_LOCK_WAIT):
+            try:
+                self.close_tab()
+            finally:
+                self.browser.lock.release()
+            return
+        # The browser is stuck inside a command; its other tabs are stuck too
+        print("⏰ Shared browser is not responding - killing it")
+        self.browser.retiring = True
+        pgid = browser_process_group(self.browser.driver)
+        if pgid:
+            kill_process_group(pgid)
+
+    def close(self):
+        self.close_tab()
+
+    def quit(self):
+        self.close_tab()
+
+
+class TabScheduler:
+    """Hands out tabs of shared browsers to lookups"""
+
+    def __init__(self, browsers: int = None, tabs: int = None, idle_timeout: float = None):
+        config = get_runtime_config()
+        self.max_browsers = browsers or config['browser_concurrency']
+        self.tabs_per_browser = tabs or config['browser_tabs']
+        self.idle_timeout = BROWSER_TAB_IDLE if idle_timeout is None else idle_timeout
+        self.browsers = []
+        self._launching = 0
+        self._condition = threading.Condition()
+        self._reaper = None
+
+    def _pick(self, mode: str) -> Optional[SharedBrowser]:
+        """Busiest browser in this mode with a free tab"""
+        candidates = [b for b in self.browsers if b.mode == mode and not b.retiring and b.tabs < b.capacity]
+        return max(candidates, key=lambda b: b.tabs) if candidates else None
+
+    def checkout(self, headless: Optional[bool] = None) -> TabDriver:
+        """
+        Get a tab for one lookup (waits while every browser is full)
+
+        Args:
+            headless: Browser mode override (as for launch_chrome)
+
+        Returns:
+            TabDriver; hand it back with checkin()
+
+        Raises:
+            DeadlineExceeded: If the caller's fetch deadline passed while every browser was full
+        """
+        mode = resolve_browser_mode(headless)
+        while True:
+            spare = None
+            with self._condition:
+                while True:
+                    browser = self._pick(mode)
+                    if browser or len(self.browsers) + self._launching < self.max_browsers:
+                        break
+                    # Full: an idle browser in another mode (or a dead one) makes room
+                    spare = next((b for b in self.browsers if b.tabs == 0), None)
+                    if spare:
+                        self.browsers.remove(spare)
+                        break
+                    deadline_wait(self._condition, 'a browser tab')
+                if spare is None:
+                    if browser:
+                        browser.tabs += 1
+                    else:
+                        self._launching += 1
+                    break
+            quit_chrome(spare.driver)
+
+        if browser is None:
+            browser = self._launch(headless, mode)
+        try:
+            return TabDriver.open(browser)
+        except Exception:
+            browser.retiring = True
+            self._release(browser)
+            raise
+
+    def _launch(self, headless: Optional[bool], mode: str) -> SharedBrowser:
+        """Start a shared browser with one tab reserved for the caller"""
+        try:
+            # Not part of the caller's fetch: the browser outlives it
+            with detached():
+                driver = launch_chrome(headless)
+        except Exception:
+            with self._condition:
+                self._launching -= 1
+                self._condition.notify_all()
+            raise
+        browser = SharedBrowser(driver, mode, self.tabs_per_browser)
+        browser.tabs = 1
+        with self._condition:
+            self._launching -= 1
+            self.browsers.append(browser)
+        print(f"🗂️  Shared browser started ({len(self.browsers)}/{self.max_browsers}, "
+              f"{self.tabs_per_browser} tab(s) each)")
+        self._start_reaper()
+        return browser
+
+    def checkin(self, tab: TabDriver):
+        """Close a lookup's tab and free its place in the browser"""
+        browser = tab.browser
+        tab.close_tab()
+        if not browser.retiring and not browser.alive():
+            browser.retiring = True
+        if not browser.retiring and browser_bloated(browser.driver):
+            BROWSER_RECYCLES.inc()
+            browser.retiring = True
+        self._release(browser)
+
+    def _release(self, browser: SharedBrowser):
+        with self._condition:
+            browser.tabs -= 1
+            browser.idle_since = time.monotonic()
+            retire = browser.retiring and browser.tabs <= 0 and browser in self.browsers
+            if retire:
+                self.browsers.remove(browser)
+            self._condition.notify_all()
+        if retire:
+            print("♻️  Closing shared browser")
+            quit_chrome(browser.driver)
+
+    def close_idle(self) -> int:
+        """Quit browsers unused for idle_timeout seconds; returns how many were closed"""
+        now = time.monotonic()
+        with self._condition:
+            idle = [b for b in self.browsers if b.tabs == 0 and now - b.idle_since >= self.idle_timeout]
+            for browser in idle:
+                self.browsers.remove(browser)
+            self._condition.notify_all()
+        for browser in idle:
+            quit_chrome(browser.driver)
+        if idle:
+            print(f"💤 Closed {len(idle)} idle shared browser(s)")
+        return len(idle)
+
+    def shutdown(self):
+        """Quit every shared browser"""
+        with self._condition:
+            browsers, self.browsers = self.browsers, []
+            self._condition.notify_all()
+        for browser in browsers:
+            quit_chrome(browser.driver)
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1.0, min(30.0, self.idle_timeout / 2)))
+            try:
+                self.close_idle()
+            except Exception as e:
+                print(f"⚠️  Shared browser reaper error: {str(e)}")
+
+    def _start_reaper(self):
+        with self._condition:
+            if self._reaper is None or not self._reaper.is_alive():
+                self._reaper = threading.Thread(target=self._reap_loop, name='tab-reaper', daemon=True)
+                self._reaper.start()
+
+    def tabs_in_use(self) -> int:
+        return sum(max(0, b.tabs) for b in list(self.browsers))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def tab_scheduler() -> TabScheduler:
+    """The process-wide tab scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TabScheduler()
+            atexit.register(_scheduler.shutdown)
+        return _scheduler
+
+
+def tab_mode_enabled() -> bool:
+    """True if lookups share browsers (BROWSER_TABS > 1)"""
+    return get_runtime_config()['browser_tabs'] > 1
+
+
+def run_in_tab(lookup: Callable[[TabDriver], Dict], headless: Optional[bool] = None) -> Dict:
+    """
+    Run a Selenium lookup in a tab of a shared browser
+
+    Args:
+        lookup: Takes the tab's driver and returns the result dictionary
+        headless: Browser mode override (as for launch_chrome)
+
+    Returns:
+        The lookup's result
+    """
+    scheduler = tab_scheduler()
+    tab = scheduler.checkout(headless)
+    on_deadline(tab.cancel)
+    try:
+        return lookup(tab)
+    finally:
+        scheduler.checkin(tab)
+
+
+gauge('tolls_shared_browsers', 'Shared browsers open in this process (tab mode)',
+      func=lambda: len(_scheduler.browsers) if _scheduler else 0)
+gauge('tolls_browser_tabs_in_use', 'Lookups running in tabs of shared browsers',
+      func=lambda: _scheduler.tabs_in_use() if _scheduler else 0)
@@ -0,0 +1,56 @@
+"""Tests for reading request emails without changing their read state"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_reader import EmailReader
+
+REQUEST = (b"From: Customer <customer@example.com>\r\n"
+           b"Subject: Toll request\r\n\r\n"
+           b'{"account_number": "12345678", "plate_number": "ABC1234"}\r\n')
+
+
+class FakeIMAP:
+    """Mailbox that sets \\Seen the way an IMAP server does"""
+
+    def __init__(self):
+        self.seen = set()
+
+    def select(self, folder):
+        return 'OK', [b'1']
+
+    def search(self, charset, criterion):
+        return 'OK', [b'' if b'1' in self.seen else b'1']
+
+    def fetch(self, email_id, parts):
+        if 'PEEK' not in parts.upper():
+            self.seen.add(email_id)
+        return 'OK', [(b'1 (BODY[] {%d}' % len(REQUEST), REQUEST), b')']
+
+    def store(self, email_id, command, flags):
+        if command == '+FLAGS' and '\\Seen' in flags:
+            self.seen.add(email_id.encode() if isinstance(email_id, str) else email_id)
+        return 'OK', [b'']
+
+
+def make_reader():
+    reader = EmailReader()
+    reader.connection = FakeIMAP()
+    return reader
+
+
+def test_fetching_requests_does_not_mark_them_read():
+    reader = make_reader()
+    emails = reader.get_unread_emails()
+    assert [e['account_number'] for e in emails] == ['12345678']
+    assert reader.connection.seen == set()
+    # Still unread: a deferred request is picked up again on the next check
+    assert len(reader.get_unread_emails()) == 1
+
+
+def test_mark_as_read_sets_seen():
+    reader = make_reader()
+    email_id = reader.get_unread_emails()[0]['email_id']
+    assert reader.mark_as_read(email_id)
+    assert reader.get_unread_emails() == []
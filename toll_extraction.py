@@ -0,0 +1,353 @@
+"""
+Toll data extraction from E-ZPass NY and NJ result pages
+
+These functions work on page text only, so the Selenium scrapers and the HTTP-only
+fetcher share the same extraction logic.
+"""
+import re
+from typing import Callable, Dict, List, Optional
+
+
+def extract_ny_financials(page_text: str, table_rows: List[str],
+                          balance_texts: Optional[Callable[[], List[str]]] = None) -> Dict:
+    """
+    Extract balance, toll bills and violations from an E-ZPass NY results page
+    
+    Args:
+        page_text: Visible text of the page body
+        table_rows: Text of every table row on the page
+        balance_texts: Optional function returning texts of elements mentioning Balance/Due/$
+                       (only called if no amount was found any other way)
+        
+    Returns:
+        Dictionary with total_balance_due, balance_amount, final_balance, toll_charges_total,
+        toll_bill_numbers, violation_count, violations and toll_entries
+    """
+    print("Extracting financial information...")
+    
+    all_dollar_amounts = []
+    violations = []
+    violation_count = 0
+    toll_entries = []
+    
+    # Find all dollar amounts on the page
+    dollar_pattern = r'\$[\s]*([\d,]+\.?\d*)'
+    all_matches = re.findall(dollar_pattern, page_text)
+    for match in all_matches:
+        try:
+            amount = float(match.replace(',', ''))
+            all_dollar_amounts.append(amount)
+        except:
+            pass
+    
+    # Extract from tables - more comprehensive
+    try:
+        for row_text in table_rows:
+            row_text = row_text.strip()
+            row_lower = row_text.lower()
+    
+            if not row_text:
+                continue
+    
+            # Look for balance/total amounts
+            if '$' in row_text and ('balance' in row_lower or 'total' in row_lower or 'due' in row_lower or 'amount due' in row_lower):
+                # Extract amount
+                matches = re.findall(dollar_pattern, row_text)
+                if matches:
+                    try:
+                        amount = float(matches[0].replace(',', ''))
+                        all_dollar_amounts.append(amount)
+                    except:
+                        pass
+    
+            # Look for toll charges
+            if '$' in row_text and ('toll' in row_lower or 'charge' in row_lower or 'invoice' in row_lower or 'fee' in row_lower):
+                toll_entries.append(row_text)
+                matches = re.findall(dollar_pattern, row_text)
+                for match in matches:
+                    try:
+                        amount = float(match.replace(',', ''))
+                        all_dollar_amounts.append(amount)
+                    except:
+                        pass
+    
+            # Look for violations
+            if 'violation' in row_lower:
+                violations.append(row_text)
+                # Try to extract violation number
+                violation_num_match = re.search(r'violation[s]?\s*#?\s*:?\s*(\d+)', row_lower)
+                if violation_num_match:
+                    violation_count = max(violation_count, int(violation_num_match.group(1)))
+    except Exception as e:
+        print(f"Error extracting from tables: {str(e)}")
+    
+    # Look for violation count in page text
+    if 'violation' in page_text.lower():
+        violation_patterns = [
+            r'violation[s]?\s*:?\s*(\d+)',
+            r'(\d+)\s*violation[s]?',
+            r'violation\s*count[:\s]*(\d+)',
+            r'total\s*violation[s]?\s*:?\s*(\d+)'
+        ]
+        for pattern in violation_patterns:
+            match = re.search(pattern, page_text, re.IGNORECASE)
+            if match:
+                violation_count = max(violation_count, int(match.group(1)))
+    
+    # Calculate total balance due - look for specific "due" or "total" amounts first
+    total_balance_due = 0.0
+    balance_amount = 0.0
+    toll_charges_total = 0.0
+    
+    # First, look for explicit "Total Due", "Amount Due", "Balance Due" text
+    due_patterns = [
+        r'total\s+(?:amount\s+)?due[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'amount\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'balance\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'total\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'outstanding\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)'
+    ]
+    
+    for pattern in due_patterns:
+        match = re.search(pattern, page_text, re.IGNORECASE)
+        if match:
+            try:
+                total_balance_due = float(match.group(1).replace(',', ''))
+                print(f"Found explicit balance due: ${total_balance_due:.2f}")
+                break
+            except:
+                pass
+    
+    # Extract toll bill numbers and sum toll charges
+    toll_bill_numbers = []
+    for entry in toll_entries:
+        # Extract bill numbers from toll entries
+        # Look for patterns like "Bill #12345", "Invoice: ABC123", "Toll Bill: 123456", etc.
+        bill_patterns = [
+            r'(?:bill|invoice|toll\s*bill)[\s#:]*([A-Z0-9-]+)',
+            r'\b([A-Z]{2,}\d{4,}|\d{6,})\b',  # Alphanumeric codes or long numbers
+            r'bill\s*(?:number|#)?\s*:?\s*([A-Z0-9-]+)',
+        ]
+    
+        for pattern in bill_patterns:
+            bill_match = re.search(pattern, entry, re.IGNORECASE)
+            if bill_match and bill_match.group(1):
+                bill_num = bill_match.group(1).strip()
+                if bill_num not in toll_bill_numbers:
+                    toll_bill_numbers.append(bill_num)
+                break
+    
+        # Sum toll charges
+        matches = re.findall(dollar_pattern, entry)
+        for match in matches:
+            try:
+                amount = float(match.replace(',', ''))
+                toll_charges_total += amount
+            except:
+                pass
+    
+    # If no explicit "due" found, calculate from components
+    if total_balance_due == 0:
+        # Look for account balance separately
+        balance_patterns = [
+            r'account\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)',
+            r'balance[:\s]*\$?\s*([\d,]+\.?\d*)',
+        ]
+    
+        for pattern in balance_patterns:
+            match = re.search(pattern, page_text, re.IGNORECASE)
+            if match:
+                try:
+                    balance_amount = float(match.group(1).replace(',', ''))
+                    print(f"Found account balance: ${balance_amount:.2f}")
+                    break
+                except:
+                    pass
+    
+        # If still no balance found, use the largest amount found
+        if balance_amount == 0 and all_dollar_amounts:
+            # Filter out very small amounts (likely not the balance)
+            significant_amounts = [a for a in all_dollar_amounts if a > 1.0]
+            if significant_amounts:
+                balance_amount = max(significant_amounts)
+                print(f"Using largest amount found as balance: ${balance_amount:.2f}")
+    
+        # Use balance_amount as total_balance_due
+        # Don't add toll_charges_total because it's likely already included in balance_amount
+        # The toll_charges_total is extracted from individual entries, which may duplicate the balance
+        total_balance_due = balance_amount
+        if toll_charges_total > 0 and toll_charges_total != balance_amount:
+            # Only add if they're different (toll_charges might be separate pending charges)
+            # But if they're the same, it's likely the same amount being counted twice
+            print(f"⚠️  Note: balance_amount (${balance_amount:.2f}) and toll_charges_total (${toll_charges_total:.2f}) are different")
+            # Use the larger of the two, as toll_charges might be additional pending charges
+            total_balance_due = max(balance_amount, toll_charges_total)
+        else:
+            print(f"ℹ️  Using balance_amount (${balance_amount:.2f}) as total_balance_due (toll_charges likely included)")
+    else:
+        # If we found explicit total_balance_due, check for separate account balance
+        # Account balance is more reliable than "Total Balance Due" which might include pending charges
+        balance_patterns = [
+            r'account\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)',
+        ]
+    
+        for pattern in balance_patterns:
+            match = re.search(pattern, page_text, re.IGNORECASE)
+            if match:
+                try:
+                    account_balance = float(match.group(1).replace(',', ''))
+                    print(f"Found account balance: ${account_balance:.2f}")
+                    # Prioritize account balance if it's reasonable (not 0 and not way larger than total_balance_due)
+                    # Account balance is usually the actual balance due
+                    if account_balance > 0 and account_balance <= total_balance_due * 1.5:
+                        balance_amount = account_balance
+                        print(f"✅ Using account balance (${account_balance:.2f}) as it's more reliable than total_balance_due (${total_balance_due:.2f})")
+                    else:
+                        # Account balance seems wrong, use total_balance_due
+                        balance_amount = total_balance_due
+                        print(f"⚠️  Account balance (${account_balance:.2f}) seems incorrect, using total_balance_due (${total_balance_due:.2f})")
+                    break
+                except:
+                    pass
+    
+        # If balance_amount not found separately, use total_balance_due
+        if balance_amount == 0:
+            # If we have total_balance_due, use it as balance_amount
+            balance_amount = total_balance_due
+            print(f"Using total_balance_due as balance_amount: ${balance_amount:.2f}")
+    
+    # If no amounts found, try to find any text with "balance" or "due"
+    if total_balance_due == 0:
+        try:
+            # Look for balance/due text elements
+            for text in (balance_texts() if balance_texts else []):
+                if '$' in text:
+                    matches = re.findall(dollar_pattern, text)
+                    for match in matches:
+                        try:
+                            amount = float(match.replace(',', ''))
+                            if amount > total_balance_due:
+                                total_balance_due = amount
+                        except:
+                            pass
+        except:
+            pass
+    
+    # Determine final balance
+    # Priority: explicit total_balance_due > balance_amount > largest amount on page
+    if total_balance_due > 0:
+        # If we found explicit total_balance_due, use it
+        # But if balance_amount is different and smaller, it might be the actual account balance
+        # Check if they're close (within 10%) - if so, use the explicit total_balance_due
+        if balance_amount > 0:
+            diff_percent = abs(total_balance_due - balance_amount) / max(total_balance_due, balance_amount) * 100
+            if diff_percent < 10:  # Within 10% of each other
+                # They're likely the same amount, use the explicit total_balance_due
+                final_balance = total_balance_due
+                print(f"ℹ️  Using explicit total_balance_due (${total_balance_due:.2f}) - balance_amount (${balance_amount:.2f}) is similar")
+            else:
+                # They're different - use the explicit total_balance_due (it's the "total due")
+                final_balance = total_balance_due
+                print(f"ℹ️  Using explicit total_balance_due (${total_balance_due:.2f}) - differs from balance_amount (${balance_amount:.2f})")
+        else:
+            final_balance = total_balance_due
+    elif balance_amount > 0:
+        final_balance = balance_amount
+    else:
+        # Last resort: try to find any large amount on the page
+        if all_dollar_amounts:
+            significant_amounts = [a for a in all_dollar_amounts if a > 10.0]  # Filter small amounts
+            if significant_amounts:
+                final_balance = max(significant_amounts)
+                print(f"Using largest significant amount found: ${final_balance:.2f}")
+            else:
+                final_balance = 0.0
+        else:
+            final_balance = 0.0
+    
+    return {
+        'total_balance_due': total_balance_due,
+        'balance_amount': balance_amount,
+        'final_balance': final_balance,
+        'toll_charges_total': toll_charges_total,
+        'toll_bill_numbers': toll_bill_numbers,
+        'violation_count': violation_count,
+        'violations': violations,
+        'toll_entries': toll_entries
+    }
+
+
+def extract_nj_violation_info(page_text: str, violation_number: str = None) -> Dict:
+    """
+    Extract the amount due and violation numbers from an E-ZPass NJ violation results page
+    
+    Args:
+        page_text: Visible text of the page body
+        violation_number: Violation number that was looked up
+        
+    Returns:
+        Dictionary with balance_amount, violation_count and toll_bill_numbers
+    """
+    # Extract ONLY total amount due (not individual amounts)
+    balance_amount = 0.0
+    violation_count = 0
+    toll_bill_numbers = []
+    
+    # Look specifically for "total amount due" patterns (priority order)
+    total_amount_due_patterns = [
+        r'total\s+amount\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'amount\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'total\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'balance\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'total\s+balance\s+due[:\s]*\$?\s*([\d,]+\.?\d*)',
+        r'outstanding\s+balance[:\s]*\$?\s*([\d,]+\.?\d*)',
+    ]
+    
+    # Try to find "total amount due" first
+    for pattern in total_amount_due_patterns:
+        matches = re.findall(pattern, page_text, re.IGNORECASE)
+        for match in matches:
+            try:
+                amount = float(match.replace(',', ''))
+                if amount > 0:
+                    balance_amount = amount
+                    print(f"✓ Found total amount due: ${balance_amount:.2f}")
+                    break
+            except:
+                pass
+        if balance_amount > 0:
+            break
+    
+    # Only extract violation number if there's an amount due
+    if balance_amount > 0:
+        # Extract violation/invoice number
+        if violation_number:
+            toll_bill_numbers.append(violation_number)
+            violation_count = 1  # Set to 1 if amount due exists
+            print(f"✓ Extracted violation number: {violation_number}")
+    
+        # Also try to find additional violation numbers on the page if amount due exists
+        violation_patterns = [
+            r'violation\s*(?:number|#)?\s*[:\s]*([A-Z0-9-]+)',
+            r'invoice\s*(?:number|#)?\s*[:\s]*([A-Z0-9-]+)',
+            r'toll\s*bill\s*(?:number|#)?\s*[:\s]*([A-Z0-9-]+)',
+            r'bill\s*(?:number|#)?\s*[:\s]*([A-Z0-9-]+)',
+        ]
+    
+        for pattern in violation_patterns:
+            matches = re.findall(pattern, page_text, re.IGNORECASE)
+            for match in matches:
+                violation_num = match.strip().upper()
+                if violation_num and violation_num not in toll_bill_numbers:
+                    toll_bill_numbers.append(violation_num)
+                    print(f"✓ Found additional violation/invoice number: {violation_num}")
+    else:
+        print("ℹ️  No total amount due found (balance = $0.00)")
+        violation_count = 0
+        toll_bill_numbers = []
+    
+    return {
+        'balance_amount': balance_amount,
+        'violation_count': violation_count,
+        'toll_bill_numbers': toll_bill_numbers
+    }